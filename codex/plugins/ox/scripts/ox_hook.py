@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Single entry point for every ox hook.
+
+Usage:
+  python3 -S ox_hook.py --event PreToolUse
+  python3 -S ox_hook.py --event PostToolUse --project-dir $CLAUDE_PROJECT_DIR
+  python3 -S ox_hook.py --event Stop --runtime codex
+
+The hook input is read once and routed by tool name, and for guards by file
+extension, to the scripts that apply; anything else exits before a script is
+imported. Scripts are imported rather than run directly, so Python reuses
+their cached bytecode from __pycache__, and -S skips site-packages setup
+since they only use the standard library.
+
+With OX_HOOKS_TRACE set, each run appends Chrome trace-event spans to that
+file (see hook_trace.py); the tracer is only imported when it is set.
+"""
+
+import json
+import os
+import sys
+import time
+
+# PreToolUse guards by tool name, with the file extensions each applies to
+# (None for every file).
+PRE_TOOL_GUARDS: dict[str, list[tuple[str, tuple[str, ...] | None]]] = {
+    "Bash": [("ban_redundant_cd", None)],
+    "Edit": [("ban_lint_suppressions", (".py", ".pyi"))],
+    "Write": [("ban_lint_suppressions", (".py", ".pyi"))],
+}
+# Tools whose edits trigger fast checks on PostToolUse.
+EDIT_TOOLS = frozenset({"Edit", "MultiEdit", "Write", "apply_patch"})
+CHECK_ACTIONS = {"PostToolUse": "fast", "Stop": "slow"}
+EVENTS = ("PreToolUse", *CHECK_ACTIONS)
+OPTIONS = ("--event", "--project-dir", "--runtime")
+TRACE_ENV = "OX_HOOKS_TRACE"
+USAGE = "Usage: ox_hook.py --event {PreToolUse,PostToolUse,Stop} [--project-dir DIR] [--runtime {claude,codex}]"
+
+
+def parse_args(argv: list[str]) -> dict[str, str]:
+    """Parse ``--option value`` pairs; argparse alone costs more than most hooks."""
+    options = {}
+    args = iter(argv)
+    for flag in args:
+        value = next(args, None)
+        if flag not in OPTIONS or value is None:
+            raise ValueError(f"unexpected argument {flag!r}")
+        options[flag.removeprefix("--")] = value
+    if options.get("event") not in EVENTS:
+        raise ValueError("--event must be one of " + ", ".join(EVENTS))
+    return options
+
+
+def record_span(name: str, started_us: int, **args: object) -> None:
+    """Record a span ending now when tracing; hook_trace is only imported by dispatch_traced."""
+    tracer = sys.modules.get("hook_trace")
+    if tracer:
+        tracer.add_span(name, started_us, tracer.now_us(), **args)
+
+
+def run_guards(stdin_data: str) -> int:
+    """Run the PreToolUse guards that apply to this tool call; return the highest exit code."""
+    try:
+        input_data = json.loads(stdin_data)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        return 1
+    guards = PRE_TOOL_GUARDS.get(input_data.get("tool_name", ""), [])
+    if not guards:
+        return 0
+    tool_input = input_data.get("tool_input")
+    file_path = tool_input.get("file_path") if isinstance(tool_input, dict) else None
+    extension = os.path.splitext(file_path)[1] if isinstance(file_path, str) else ""
+    code = 0
+    for name, extensions in guards:
+        if extensions is None or extension in extensions:
+            started_us = time.time_ns() // 1000
+            guard_code = __import__(name).run(input_data)
+            record_span(name, started_us, exit_code=guard_code)
+            code = max(code, guard_code)
+    return code
+
+
+def run_checks(event: str, options: dict[str, str], stdin_data: str) -> None:
+    """Hand PostToolUse and Stop to run_if_changed.py, skipping tools that edit nothing."""
+    if event == "PostToolUse":
+        try:
+            tool_name = json.loads(stdin_data).get("tool_name")
+        except (json.JSONDecodeError, AttributeError):
+            tool_name = None
+        if isinstance(tool_name, str) and tool_name and tool_name not in EDIT_TOOLS:
+            sys.exit(0)
+
+    started_us = time.time_ns() // 1000
+    import run_if_changed
+
+    record_span("import run_if_changed", started_us)
+    argv = ["--action", CHECK_ACTIONS[event]]
+    for option in ("project-dir", "runtime"):
+        if option in options:
+            argv += [f"--{option}", options[option]]
+    run_if_changed.main(argv, stdin_data)
+
+
+def dispatch(options: dict[str, str], stdin_data: str) -> None:
+    """Run the scripts for the hook event. Always exits."""
+    if options["event"] == "PreToolUse":
+        sys.exit(run_guards(stdin_data))
+    run_checks(options["event"], options, stdin_data)
+    sys.exit(0)
+
+
+def dispatch_traced(trace_path: str, options: dict[str, str], stdin_data: str, entered_us: int) -> None:
+    """Dispatch under a trace: interpreter start, then the hook event with its scripts nested inside."""
+    import hook_trace
+
+    try:
+        hook_input = json.loads(stdin_data)
+    except json.JSONDecodeError:
+        hook_input = None
+    event = options["event"]
+    ids = hook_trace.hook_ids(hook_input if isinstance(hook_input, dict) else None)
+    with hook_trace.trace(trace_path, f"ox_hook.py --event {event}", event=event, **ids):
+        process_start_us = hook_trace.process_start_us()
+        if process_start_us is not None:
+            hook_trace.add_span("interpreter start", process_start_us, entered_us)
+        with hook_trace.span(event):
+            dispatch(options, stdin_data)
+
+
+def main() -> None:
+    entered_us = time.time_ns() // 1000
+    try:
+        options = parse_args(sys.argv[1:])
+    except ValueError as e:
+        print(f"{USAGE}\nError: {e}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        stdin_data = sys.stdin.read()
+    except (OSError, UnicodeDecodeError):
+        stdin_data = ""
+
+    trace_path = os.environ.get(TRACE_ENV)
+    if trace_path:
+        dispatch_traced(trace_path, options, stdin_data, entered_us)
+    dispatch(options, stdin_data)
+
+
+if __name__ == "__main__":
+    main()
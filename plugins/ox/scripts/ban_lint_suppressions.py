@@ -28,29 +28,39 @@ def validate_write(tool_input: dict) -> list[str]:
     return check_for_suppressions(content)
 
 
-try:
-    input_data = json.load(sys.stdin)
-except json.JSONDecodeError as e:
-    print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-    sys.exit(1)
-
-tool_name = input_data.get("tool_name", "")
-tool_input = input_data.get("tool_input", {})
-
-issues = []
-if tool_name == "Edit":
-    issues = validate_edit(tool_input)
-elif tool_name == "Write":
-    issues = validate_write(tool_input)
-
-if issues:
-    print("\n".join(issues), file=sys.stderr)
-    print(
-        "\nStop and explain to the user why you think this lint/type checker suppression is necessary.",
-        file=sys.stderr,
-    )
-    # Exit code 2 blocks tool call and shows stderr to Claude
-    sys.exit(2)
-
-# If we reach here, no suppressions found
-sys.exit(0)
+def run(input_data: dict) -> int:
+    """Check one PreToolUse input and return the hook exit code."""
+    tool_name = input_data.get("tool_name", "")
+    tool_input = input_data.get("tool_input", {})
+
+    issues = []
+    if tool_name == "Edit":
+        issues = validate_edit(tool_input)
+    elif tool_name == "Write":
+        issues = validate_write(tool_input)
+
+    if issues:
+        print("\n".join(issues), file=sys.stderr)
+        print(
+            "\nStop and explain to the user why you think this lint/type checker suppression is necessary.",
+            file=sys.stderr,
+        )
+        # Exit code 2 blocks tool call and shows stderr to Claude
+        return 2
+
+    # If we reach here, no suppressions found
+    return 0
+
+
+def main() -> None:
+    try:
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(run(input_data))
+
+
+if __name__ == "__main__":
+    main()
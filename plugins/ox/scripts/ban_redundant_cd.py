@@ -36,27 +36,37 @@ Command should be: {clean_command}
     return ""
 
 
-try:
-    input_data = json.load(sys.stdin)
-except json.JSONDecodeError as e:
-    print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-    sys.exit(1)
-
-tool_name = input_data.get("tool_name", "")
-tool_input = input_data.get("tool_input", {})
-cwd = input_data.get("cwd", "")
-command = tool_input.get("command", "")
-
-if tool_name != "Bash":
-    # Only applies to Bash commands
-    sys.exit(0)
-
-error_message = validate_bash_command(command, cwd)
-
-if error_message:
-    print(error_message, file=sys.stderr)
-    # Exit code 2 blocks tool call and shows stderr to Claude
-    sys.exit(2)
-
-# If we reach here, the command is allowed
-sys.exit(0)
+def run(input_data: dict) -> int:
+    """Check one PreToolUse input and return the hook exit code."""
+    tool_name = input_data.get("tool_name", "")
+    tool_input = input_data.get("tool_input", {})
+    cwd = input_data.get("cwd", "")
+    command = tool_input.get("command", "")
+
+    if tool_name != "Bash":
+        # Only applies to Bash commands
+        return 0
+
+    error_message = validate_bash_command(command, cwd)
+
+    if error_message:
+        print(error_message, file=sys.stderr)
+        # Exit code 2 blocks tool call and shows stderr to Claude
+        return 2
+
+    # If we reach here, the command is allowed
+    return 0
+
+
+def main() -> None:
+    try:
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(run(input_data))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Opt-in Chrome trace-event export for ox hooks.
+
+With OX_HOOKS_TRACE=/path/to/trace.json set, every hook appends its spans to
+that file in the Chrome trace-event JSON array format, readable by
+chrome://tracing and https://ui.perfetto.dev. The closing ``]`` is optional
+in that format, so the array is left open and concurrent hooks keep
+appending to it.
+
+A trace is collected per thread, since the hook daemon serves concurrent
+requests, and written in one locked append when it ends. Without an
+active trace ``span`` is a no-op.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+TRACE_ENV = "OX_HOOKS_TRACE"
+
+_local = threading.local()
+
+
+class _Trace:
+    """Spans of one hook invocation, buffered until the trace ends."""
+
+    def __init__(self, path: str, process_name: str, args: dict) -> None:
+        self.path = path
+        self.process_name = process_name
+        self.args = args
+        self.events: list[dict] = []
+
+
+def now_us() -> int:
+    """Wall-clock microseconds, so spans from separate hook processes line up."""
+    return time.time_ns() // 1000
+
+
+def hook_ids(hook_input: dict | None) -> dict[str, object]:
+    """Session and tool ids of a hook invocation, attached to each of its spans."""
+    if not hook_input:
+        return {}
+    return {key: hook_input.get(key) for key in ("session_id", "tool_use_id", "tool_name")}
+
+
+@contextlib.contextmanager
+def trace(path: str | None, process_name: str, **args: object) -> Iterator[None]:
+    """Trace the enclosed block to ``path``; ``args`` are attached to every span.
+
+    Does nothing when ``path`` is empty or a trace is already active on this
+    thread, so nested entry points add their spans to the outer trace.
+    """
+    if not path or active_path() is not None:
+        yield
+        return
+    _local.trace = _Trace(path, process_name, {key: value for key, value in args.items() if value})
+    try:
+        yield
+    finally:
+        _finish()
+
+
+def active_path() -> str | None:
+    """Trace file of this thread's active trace, if any."""
+    current = getattr(_local, "trace", None)
+    return current.path if current else None
+
+
+def add_span(name: str, start_us: int, end_us: int, *, tid: int | None = None, **args: object) -> None:
+    """Record a span measured elsewhere, e.g. on a worker thread."""
+    current = getattr(_local, "trace", None)
+    if current is None:
+        return
+    current.events.append(
+        {
+            "name": name,
+            "cat": "ox",
+            "ph": "X",
+            "ts": start_us,
+            "dur": max(end_us - start_us, 0),
+            "pid": os.getpid(),
+            "tid": tid if tid is not None else threading.get_native_id(),
+            "args": {**current.args, **args},
+        }
+    )
+
+
+@contextlib.contextmanager
+def span(name: str, **args: object) -> Iterator[None]:
+    """Record the enclosed block as a span of the active trace."""
+    if getattr(_local, "trace", None) is None:
+        yield
+        return
+    started = now_us()
+    try:
+        yield
+    finally:
+        add_span(name, started, now_us(), **args)
+
+
+def process_start_us() -> int | None:
+    """Wall-clock time this process was created, from /proc (Linux, clock-tick resolution)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22.
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        uptime_ns = time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+        ticks_per_s = os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return now_us() - (uptime_ns - start_ticks * 1_000_000_000 // ticks_per_s) // 1000
+
+
+def _finish() -> None:
+    """Append this thread's spans to its trace file; write errors never fail a hook."""
+    current = getattr(_local, "trace", None)
+    _local.trace = None
+    if current is None or not current.events:
+        return
+    name_event = {
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": current.process_name},
+    }
+    data = "".join(json.dumps(event) + ",\n" for event in [name_event, *current.events])
+    with contextlib.suppress(OSError), open(current.path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if os.fstat(f.fileno()).st_size == 0:
+            data = "[\n" + data
+        f.write(data)
@@ -9,15 +9,45 @@ Usage:
   python run_if_changed.py --project-dir $CLAUDE_PROJECT_DIR --action fast
   python run_if_changed.py --project-dir $CLAUDE_PROJECT_DIR --action slow
   python run_if_changed.py --runtime codex --action slow
+  python run_if_changed.py --project-dir $CLAUDE_PROJECT_DIR --action serve
+
+With ``--action serve`` the script runs as a long-lived per-project daemon on
+a Unix socket. Hook invocations forward to it when it is running and fall
+back to running in-process otherwise.
+
+With OX_HOOKS_TRACE set, spans for config loading, git status, edit
+classification and each check are appended to that file (see hook_trace.py).
 """
 
+# Imports only some runs need (ast, socket, tempfile, thread pools, ...) are
+# deferred to the functions that use them to keep hook startup short.
+from __future__ import annotations
+
 import argparse
 import contextlib
+import fcntl
+import hashlib
+import io
 import json
+import math
 import os
+import re
+import resource
+import shlex
+import signal
+import stat
 import subprocess
 import sys
-from typing import TextIO
+import threading
+import time
+import tokenize
+from collections.abc import Callable, Iterator
+
+import hook_trace
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import BinaryIO, TextIO
 
 # https://docs.anthropic.com/en/docs/claude-code/hooks#simple%3A-exit-code
 BLOCKING_ERROR_CODE = 2
@@ -28,9 +58,66 @@ MAX_CODEX_FEEDBACK_CHARS = 20000
 
 CONFIG_PATH = ".claude/ox-hooks.json"
 DEFAULT_FAST_EVERY = 5
-
-
-def _emit(runtime: str, message: str, *, file: TextIO = sys.stdout) -> None:
+# "fast_every": "auto" derives the throttle from the measured fast-check cost.
+FAST_EVERY_AUTO = "auto"
+DEFAULT_FAST_BUDGET_MS = 500
+MAX_ADAPTIVE_FAST_EVERY = 10
+# Weight of the newest sample in the fast-check cost estimate.
+FAST_COST_SMOOTHING = 0.3
+DEFAULT_MAX_PARALLEL = 1
+DEFAULT_DAEMON_IDLE_TIMEOUT_S = 4 * 60 * 60
+FAST_SCOPE_CHANGED = "changed"
+FAST_SCOPE_EDITED = "edited"
+FILE_PLACEHOLDER = "{file}"
+FILES_PLACEHOLDER = "{files}"
+# Filled with the test files affected by the change (Python impact analysis).
+TESTS_PLACEHOLDER = "{tests}"
+# Roots a Python module path is resolved from, relative to the check directory.
+IMPACT_SOURCE_ROOTS = ("", "src/")
+# Linux caps a single argv string (the ``sh -c`` command) at MAX_ARG_STRLEN.
+MAX_SINGLE_ARG_BYTES = 128 * 1024
+
+# Detached fast check runs (async mode and trailing debounce) store their
+# outcome under this session state key.
+BACKGROUND_RESULT_KEY = "background_fast"
+# Files edited since the last fast check ran; throttled and debounced edits
+# are checked together by the next run.
+PENDING_EDITS_KEY = "pending_edits"
+# Set on the empty state handed to updates when the state file cannot be
+# opened, so the throttle runs the check instead of counting every edit as
+# the first.
+STATE_UNAVAILABLE_KEY = "state_unavailable"
+BACKGROUND_WAIT_S = 30
+BACKGROUND_STALE_MS = 10 * 60 * 1000
+# State of sessions that never reached Stop is pruned after this long.
+SESSION_STATE_TTL_S = 24 * 60 * 60
+
+# Hooks are killed by the host at their hooks.json timeout (30s PostToolUse,
+# 120s Stop). Stop checks a little earlier so partial output can be reported.
+DEFAULT_DEADLINE_S = {"fast": 25.0, "slow": 110.0}
+KILL_GRACE_S = 2.0
+# Check output beyond this many bytes keeps only its head and tail in memory;
+# the full log is streamed to disk.
+DEFAULT_OUTPUT_BUDGET_BYTES = 64 * 1024
+MIN_OUTPUT_BUDGET_BYTES = 4 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+# The timing ledger rotates to ledger.jsonl.1 past this size.
+LEDGER_MAX_BYTES = 4 * 1024 * 1024
+STATS_PERCENTILES = (50, 95, 99)
+
+_active_processes: set[subprocess.Popen] = set()
+_active_processes_lock = threading.Lock()
+
+# Populated only inside the hook daemon (--action serve).
+_daemon_sessions: dict[str, dict] | None = None
+_daemon_lock = threading.Lock()
+# Set inside a daemon started with --watch.
+_change_watcher: _ChangeWatcher | None = None
+_config_cache: dict[str, tuple[int, dict]] = {}
+_matcher_cache: tuple[list[dict], dict] | None = None
+
+
+def _emit(runtime: str, message: str, *, file: TextIO | None = None) -> None:
     """Print hook output only for runtimes that accept plain text logs."""
     if runtime == RUNTIME_CLAUDE:
         print(message, file=file)
@@ -64,41 +151,402 @@ def _codex_project_dir(hook_input: dict | None) -> str:
     return _git_root_or_cwd(os.getcwd())
 
 
+def _fair_share(texts: list[str], budget: int) -> list[str]:
+    """Trim texts to fit a shared character budget, giving each an equal share.
+
+    Texts shorter than their share pass their unused room on to the others.
+    Trimmed texts keep their tail, where tools print their summaries.
+    """
+    limits = [0] * len(texts)
+    remaining = budget
+    pending = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    while pending:
+        share = remaining // len(pending)
+        index = pending.pop(0)
+        limits[index] = min(len(texts[index]), share)
+        remaining -= limits[index]
+    return [
+        text[len(text) - limit :] if limit < len(text) else text for text, limit in zip(texts, limits, strict=True)
+    ]
+
+
 def _codex_failure_feedback(action: str, failure_outputs: list[str]) -> str:
     """Build the continuation prompt Codex receives when checks fail."""
     check_name = "Final checks" if action == "slow" else "Fast checks"
-    body = "\n\n".join(output.strip() for output in failure_outputs if output.strip())
-    if len(body) > MAX_CODEX_FEEDBACK_CHARS:
-        body = body[-MAX_CODEX_FEEDBACK_CHARS:]
+    outputs = [output.strip() for output in failure_outputs if output.strip()]
+    separators = 2 * max(len(outputs) - 1, 0)
+    body = "\n\n".join(_fair_share(outputs, MAX_CODEX_FEEDBACK_CHARS - separators))
     if body:
         return f"{check_name} failed. Fix these issues before finishing.\n\n{body}\n"
     return f"{check_name} failed. Re-run the configured checks and fix the failures before finishing.\n"
 
 
+# A parsed diagnostic: (file, line or None, message).
+Diagnostic = tuple[str, int | None, str]
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+_LOCATION_RE = re.compile(r"^(?P<file>[^\s:][^:]*):(?P<line>\d+):(?:(?P<col>\d+):?)? (?P<msg>.+)$")
+_RUFF_FULL_RE = re.compile(r"^(?P<code>[A-Z]+\d+) (?:\[\*\] )?(?P<msg>.+)$")
+_RUFF_ARROW_RE = re.compile(r"^\s*--> (?P<file>[^:]+):(?P<line>\d+):\d+$")
+_RUFF_REFORMAT_RE = re.compile(r"^Would reformat: (?P<file>.+)$")
+_PYTEST_SUMMARY_RE = re.compile(r"^(?:FAILED|ERROR) (?P<file>[^:\s]+)(?P<test>::\S+)?(?: - (?P<msg>.+))?$")
+_PYTEST_LOCATION_RE = re.compile(r"^(?P<file>[^\s:]+\.py):(?P<line>\d+): (?P<msg>\w+(?:Error|Exception|Failed)\b.*)$")
+_TSC_RE = re.compile(r"^(?P<file>.+?)\((?P<line>\d+),\d+\): (?P<msg>error TS\d+: .+)$")
+_TSC_PRETTY_RE = re.compile(r"^(?P<file>.+?):(?P<line>\d+):\d+ - (?P<msg>error TS\d+: .+)$")
+_ESLINT_PROBLEM_RE = re.compile(
+    r"^\s+(?P<line>\d+):\d+\s+(?P<level>error|warning)\s+(?P<msg>.+?)(?:\s{2,}(?P<rule>\S+))?$"
+)
+
+
+def _parse_ruff(output: str) -> list[Diagnostic]:
+    """Parse ``ruff check`` (full or concise format) and ``ruff format --check`` output."""
+    diagnostics: list[Diagnostic] = []
+    pending_message = None
+    for line in output.splitlines():
+        if match := _RUFF_REFORMAT_RE.match(line):
+            diagnostics.append((match["file"], None, "would be reformatted"))
+        elif match := _RUFF_FULL_RE.match(line):
+            pending_message = f"{match['code']} {match['msg']}"
+        elif (match := _RUFF_ARROW_RE.match(line)) and pending_message:
+            diagnostics.append((match["file"], int(match["line"]), pending_message))
+            pending_message = None
+        elif match := _LOCATION_RE.match(line):
+            diagnostics.append((match["file"], int(match["line"]), match["msg"]))
+    return diagnostics
+
+
+def _parse_pytest(output: str) -> list[Diagnostic]:
+    """Parse pytest's short test summary and failure location lines."""
+    diagnostics: list[Diagnostic] = []
+    for line in output.splitlines():
+        if match := _PYTEST_SUMMARY_RE.match(line):
+            test = (match["test"] or "").removeprefix("::")
+            message = " - ".join(part for part in (test, match["msg"]) if part)
+            diagnostics.append((match["file"], None, message or "failed"))
+        elif match := _PYTEST_LOCATION_RE.match(line):
+            diagnostics.append((match["file"], int(match["line"]), match["msg"]))
+    return diagnostics
+
+
+def _parse_tsc(output: str) -> list[Diagnostic]:
+    """Parse ``tsc`` diagnostics in plain or ``--pretty`` form."""
+    diagnostics: list[Diagnostic] = []
+    for line in output.splitlines():
+        if match := _TSC_RE.match(line.strip()) or _TSC_PRETTY_RE.match(line.strip()):
+            diagnostics.append((match["file"], int(match["line"]), match["msg"]))
+    return diagnostics
+
+
+def _parse_eslint(output: str) -> list[Diagnostic]:
+    """Parse eslint's default (stylish) output and the unix/compact formats."""
+    diagnostics: list[Diagnostic] = []
+    current_file = None
+    for line in output.splitlines():
+        if match := _ESLINT_PROBLEM_RE.match(line):
+            if current_file:
+                message = match["msg"] + (f" ({match['rule']})" if match["rule"] else "")
+                diagnostics.append((current_file, int(match["line"]), message))
+        elif match := _LOCATION_RE.match(line):
+            diagnostics.append((match["file"], int(match["line"]), match["msg"]))
+        elif line and not line[0].isspace() and not line.startswith("✖"):
+            current_file = line.strip()
+    return diagnostics
+
+
+# Failure parsers selectable per check with "parser" in ox-hooks.json.
+FAILURE_PARSERS: dict[str, Callable[[str], list[Diagnostic]]] = {
+    "ruff": _parse_ruff,
+    "pytest": _parse_pytest,
+    "tsc": _parse_tsc,
+    "eslint": _parse_eslint,
+}
+
+
+def summarize_failure(output: str, parser: str | None) -> str | None:
+    """Condense check output into deduplicated ``file:line: message`` lines.
+
+    Returns None when the check has no known parser or the parser found
+    nothing, so callers fall back to the raw output.
+    """
+    parse = FAILURE_PARSERS.get(parser or "")
+    if parse is None:
+        return None
+    seen: set[Diagnostic] = set()
+    lines = []
+    for diagnostic in parse(_ANSI_RE.sub("", output)):
+        if diagnostic in seen:
+            continue
+        seen.add(diagnostic)
+        file, line, message = diagnostic
+        location = f"{file}:{line}" if line is not None else file
+        lines.append(f"{location}: {message}")
+    if not lines:
+        return None
+    return "\n".join(lines) + "\n"
+
+
+def _state_dir() -> str:
+    """Directory holding per-session hook state files."""
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(_runtime_dir(), "ox-hooks")
+    # /tmp is shared by every user, so each one gets a directory of their own.
+    return os.path.join(_runtime_dir(), f"ox-hooks-{os.getuid()}")
+
+
+def _make_state_dirs(path: str) -> None:
+    """Create ``path`` inside the state directory, which must be private to this user.
+
+    Raises PermissionError when the state directory is a symlink, belongs to
+    another user or is open to others, e.g. planted in a shared /tmp.
+    """
+    root = _state_dir()
+    os.makedirs(root, mode=0o700, exist_ok=True)
+    st = os.lstat(root)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"State directory {root} is not private to this user")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+
 def _get_state_file_path(session_id: str) -> str:
-    """Return the path to the throttle state file for this session."""
-    return f"/tmp/ox-hooks-{session_id}.json"
+    """Return the path to the state file for this session."""
+    safe_id = re.sub(r"[^A-Za-z0-9._-]", "_", session_id)
+    return os.path.join(_state_dir(), f"{safe_id}.json")
 
 
-def _load_edit_count(state_file: str) -> int:
-    """Read the edit counter from the state file. Returns 0 on missing/corrupt."""
+@contextlib.contextmanager
+def _locked_state_file(state_file: str, *, exclusive: bool) -> Iterator[TextIO]:
+    """Open (creating if needed) and flock a state file for the duration of the block."""
+    _make_state_dirs(os.path.dirname(state_file))
+    fd = os.open(state_file, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    with open(fd, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield f
+
+
+def _read_state(f: TextIO) -> dict:
+    f.seek(0)
     try:
-        with open(state_file) as f:
-            data = json.load(f)
-        return int(data.get("edit_count", 0))
-    except (FileNotFoundError, json.JSONDecodeError, OSError, ValueError, TypeError):
-        return 0
+        data = json.load(f)
+    except (json.JSONDecodeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
 
+def _write_state(f: TextIO, state: dict) -> None:
+    f.seek(0)
+    f.truncate()
+    json.dump(state, f)
+    f.flush()
 
-def _save_edit_count(state_file: str, count: int) -> None:
-    """Write the edit counter to the state file. Silently catches errors."""
+
+def _load_state(state_file: str) -> dict:
+    """Read the session state file. Returns {} on missing/corrupt."""
+    if not os.path.exists(state_file):
+        return {}
     try:
-        with open(state_file, "w") as f:
-            json.dump({"edit_count": count}, f)
+        with _locked_state_file(state_file, exclusive=False) as f:
+            return _read_state(f)
+    except OSError:
+        return {}
+
+
+def _save_state(state_file: str, state: dict) -> None:
+    """Write the session state file. Silently catches errors."""
+    try:
+        with _locked_state_file(state_file, exclusive=True) as f:
+            _write_state(f, state)
     except OSError:
         pass
 
 
+def _load_session_state(session_id: str) -> dict:
+    """Return a copy of this session's throttle state.
+
+    Inside the hook daemon the state lives in memory; otherwise it is
+    persisted in the per-session state file.
+    """
+    if _daemon_sessions is not None:
+        with _daemon_lock:
+            return dict(_daemon_sessions.get(session_id, {}))
+    return _load_state(_get_state_file_path(session_id))
+
+
+def _update_session_state[T](session_id: str, update: Callable[[dict], T]) -> T:
+    """Apply ``update`` to this session's state in place and persist it atomically."""
+    if _daemon_sessions is not None:
+        with _daemon_lock:
+            return update(_daemon_sessions.setdefault(session_id, {}))
+    # Read-modify-write under an exclusive lock so concurrent hooks (parallel
+    # tool calls, background checks) never lose each other's updates.
+    try:
+        with _locked_state_file(_get_state_file_path(session_id), exclusive=True) as f:
+            state = _read_state(f)
+            result = update(state)
+            _write_state(f, state)
+            return result
+    except OSError:
+        return update({STATE_UNAVAILABLE_KEY: True})
+
+
+def _add_pending_edit(state: dict, edited_file: str | None) -> None:
+    """Remember a file edited since the last fast check ran."""
+    pending = state.get(PENDING_EDITS_KEY)
+    pending = pending if isinstance(pending, list) else []
+    if edited_file and edited_file not in pending:
+        pending.append(edited_file)
+    state[PENDING_EDITS_KEY] = pending
+
+
+def _take_pending_edits(session_id: str) -> set[str]:
+    """Return and forget the files edited since the last fast check ran."""
+
+    def take(state: dict) -> set[str]:
+        pending = state.pop(PENDING_EDITS_KEY, None)
+        return {path for path in pending if isinstance(path, str)} if isinstance(pending, list) else set()
+
+    return _update_session_state(session_id, take)
+
+
+def _record_edit(session_id: str, now_ms: int, edited_file: str | None = None) -> tuple[int | None, int | None]:
+    """Count an edit, stamp its time and remember the edited file.
+
+    Returns the new edit count and the time of the previous edit, if any. The
+    count is None when the session state cannot be stored.
+    """
+
+    def record(state: dict) -> tuple[int | None, int | None]:
+        if state.get(STATE_UNAVAILABLE_KEY):
+            return None, None
+        previous_ms = state.get("last_edit_ms")
+        try:
+            count = int(state.get("edit_count", 0)) + 1
+        except (ValueError, TypeError):
+            count = 1
+        state["edit_count"] = count
+        state["last_edit_ms"] = now_ms
+        _add_pending_edit(state, edited_file)
+        return count, previous_ms if isinstance(previous_ms, int) else None
+
+    return _update_session_state(session_id, record)
+
+
+def _clear_session_state(session_id: str) -> None:
+    """Drop state for a session once its stop checks have run."""
+    if _daemon_sessions is not None:
+        with _daemon_lock:
+            _daemon_sessions.pop(session_id, None)
+    with contextlib.suppress(OSError):
+        os.remove(_get_state_file_path(session_id))
+
+
+def _prune_session_states(max_age_s: float = SESSION_STATE_TTL_S) -> None:
+    """Remove state files of sessions that went idle without reaching Stop, and old check logs."""
+    cutoff = time.time() - max_age_s
+    for directory, suffix in ((_state_dir(), ".json"), (os.path.join(_state_dir(), "logs"), ".log")):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            with contextlib.suppress(OSError):
+                if entry.name.endswith(suffix) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+
+
+def _ledger_path() -> str:
+    """Timing ledger shared by every project and session of this user, kept across reboots."""
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(state_home, "ox-hooks", "ledger.jsonl")
+
+
+def _append_ledger(record: dict) -> None:
+    """Append one invocation record to the timing ledger, rotating it when it grows too large."""
+    path = _ledger_path()
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with contextlib.suppress(OSError):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.getsize(path) > LEDGER_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+        # A single O_APPEND write keeps concurrent hooks from interleaving lines.
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with open(fd, "a") as f:
+            f.write(line)
+
+
+def _read_ledger(project_dir: str) -> Iterator[dict]:
+    """Yield this project's ledger records, oldest first."""
+    path = _ledger_path()
+    for candidate in (f"{path}.1", path):
+        try:
+            with open(candidate) as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and record.get("project") == project_dir:
+                yield record
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def format_stats(records: list[dict]) -> str:
+    """Tabulate check durations per action and check, and hook durations per skip reason."""
+    checks: dict[tuple[str, str], list[dict]] = {}
+    skips: dict[tuple[str, str], list[float]] = {}
+    for record in records:
+        action = record.get("action", "?")
+        if record.get("skipped"):
+            skips.setdefault((action, record["skipped"]), []).append(record.get("duration", 0.0))
+        for check in record.get("checks", []):
+            if check.get("skipped"):
+                skips.setdefault((action, check["skipped"]), []).append(0.0)
+            else:
+                checks.setdefault((action, check.get("check", "?")), []).append(check)
+
+    headers = [f"p{p}" for p in STATS_PERCENTILES]
+    lines = [f"{'action':<6} {'check':<24} {'runs':>5} " + " ".join(f"{h:>8}" for h in headers) + "   fail  peak RSS"]
+    for (action, name), runs in sorted(checks.items()):
+        durations = [run.get("duration", 0.0) for run in runs]
+        failures = sum(1 for run in runs if run.get("exit_code") not in (0, None))
+        peak_mb = max(run.get("peak_rss_kb", 0) for run in runs) / 1024
+        percentiles = " ".join(f"{_percentile(durations, p):>7.2f}s" for p in STATS_PERCENTILES)
+        lines.append(f"{action:<6} {name:<24} {len(runs):>5} {percentiles} {failures:>6} {peak_mb:>6.0f} MB")
+    if skips:
+        lines.append("")
+        lines.append(f"{'action':<6} {'skipped':<24} {'runs':>5} " + " ".join(f"{h:>8}" for h in headers))
+        for (action, reason), durations in sorted(skips.items()):
+            percentiles = " ".join(f"{_percentile(durations, p):>7.2f}s" for p in STATS_PERCENTILES)
+            lines.append(f"{action:<6} {reason:<24} {len(durations):>5} {percentiles}")
+    return "\n".join(lines) + "\n"
+
+
+def _load_config(config_file: str) -> dict | None:
+    """Read ox-hooks.json, reusing the parsed config while its mtime is unchanged.
+
+    Returns None when the file does not exist.
+    """
+    try:
+        mtime = os.stat(config_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _config_cache.get(config_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(config_file) as f:
+        config = json.load(f)
+    _config_cache[config_file] = (mtime, config)
+    return config
+
+
 def should_skip_throttled(edit_count: int, fast_every: int) -> bool:
     """Decide whether to skip the fast check based on edit count.
 
@@ -110,108 +558,1000 @@ def should_skip_throttled(edit_count: int, fast_every: int) -> bool:
     return edit_count % fast_every != 0
 
 
-def _is_python_import_only(old_string: str, new_string: str) -> bool:
-    """Check if edit only adds/modifies Python import statements."""
+def adaptive_fast_every(cost_ms: float | None, budget_ms: float) -> int:
+    """Edits per fast check that keep its amortized cost within the per-edit budget.
 
-    def get_non_import_lines(text: str) -> list[str]:
-        lines = []
-        in_paren_import = False
-        backslash_continuation = False
+    Runs on every edit until a cost has been measured.
+    """
+    if cost_ms is None:
+        return 1
+    return min(max(math.ceil(cost_ms / budget_ms), 1), MAX_ADAPTIVE_FAST_EVERY)
 
-        for line in text.split("\n"):
-            stripped = line.strip()
 
-            # Handle backslash continuation from previous line
-            if backslash_continuation:
-                backslash_continuation = stripped.endswith("\\")
-                continue
+def should_skip_adaptive(edit_count: int, last_run_edit: int | None, fast_every: int) -> bool:
+    """Skip until ``fast_every`` edits have passed since the last fast check ran."""
+    return last_run_edit is not None and edit_count - last_run_edit < fast_every
 
-            # Handle parenthesized import block
-            if in_paren_import:
-                if ")" in stripped:
-                    in_paren_import = False
-                continue
 
-            # Check if this is an import statement
-            if stripped.startswith(("import ", "from ")):
-                # Multi-line parenthesized import
-                if " import " in stripped and "(" in stripped and ")" not in stripped:
-                    in_paren_import = True
-                # Backslash continuation
-                elif stripped.endswith("\\"):
-                    backslash_continuation = True
+def _record_adaptive_edit(session_id: str, fast_every: int, edited_file: str | None = None) -> tuple[int, bool]:
+    """Count an edit and decide whether the adaptive throttle skips it.
+
+    Returns the new edit count and True when the fast check is skipped.
+    """
+
+    def record(state: dict) -> tuple[int, bool]:
+        try:
+            count = int(state.get("edit_count", 0)) + 1
+        except (ValueError, TypeError):
+            count = 1
+        last_run_edit = state.get("last_fast_edit")
+        skip = should_skip_adaptive(count, last_run_edit if isinstance(last_run_edit, int) else None, fast_every)
+        state["edit_count"] = count
+        state["last_edit_ms"] = time.time_ns() // 1_000_000
+        _add_pending_edit(state, edited_file)
+        if not skip:
+            state["last_fast_edit"] = count
+        return count, skip
+
+    return _update_session_state(session_id, record)
+
+
+def _fast_cost_path(project_dir: str) -> str:
+    """Per-project fast-check cost estimate, kept across sessions."""
+    digest = hashlib.sha256(os.path.realpath(project_dir).encode()).hexdigest()[:16]
+    return os.path.join(_state_dir(), "costs", f"{digest}.json")
+
+
+def _load_fast_cost_ms(project_dir: str) -> float | None:
+    cost = _load_state(_fast_cost_path(project_dir)).get("fast_cost_ms")
+    return float(cost) if isinstance(cost, int | float) else None
+
+
+def _record_fast_cost(project_dir: str, duration_ms: float) -> None:
+    """Fold one fast run's wall time into the smoothed cost estimate."""
+    with contextlib.suppress(OSError), _locked_state_file(_fast_cost_path(project_dir), exclusive=True) as f:
+        state = _read_state(f)
+        previous = state.get("fast_cost_ms")
+        if isinstance(previous, int | float):
+            duration_ms = FAST_COST_SMOOTHING * duration_ms + (1 - FAST_COST_SMOOTHING) * previous
+        state["fast_cost_ms"] = round(duration_ms, 1)
+        _write_state(f, state)
+
+
+def should_skip_debounced(now_ms: int, last_edit_ms: int | None, debounce_ms: int) -> bool:
+    """Decide whether to skip the fast check because an edit burst is ongoing.
+
+    The first edit after ``debounce_ms`` of quiet runs immediately; edits that
+    follow it within the window are skipped and covered by a trailing check.
+    Returns True when the check should be *skipped*.
+    """
+    if debounce_ms <= 0 or last_edit_ms is None:
+        return False
+    return now_ms - last_edit_ms < debounce_ms
+
+
+def _spawn_detached(argv: list[str], stdin_data: str, extra_args: list[str]) -> None:
+    """Re-launch this hook as a detached process with extra arguments."""
+    env = None
+    trace_path = hook_trace.active_path()
+    if trace_path:
+        # The daemon may have been started without OX_HOOKS_TRACE.
+        env = {**os.environ, hook_trace.TRACE_ENV: trace_path}
+    with contextlib.suppress(OSError):
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), *argv, *extra_args],
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True,
+        )
+        if process.stdin:
+            process.stdin.write(stdin_data)
+            process.stdin.close()
+
+
+def _start_background_check(session_id: str, argv: list[str], stdin_data: str) -> None:
+    """Mark a background fast check as running and launch it."""
+
+    def mark_running(state: dict) -> None:
+        state[BACKGROUND_RESULT_KEY] = {"status": "running", "started_ms": time.time_ns() // 1_000_000}
+
+    _update_session_state(session_id, mark_running)
+    _spawn_detached(argv, stdin_data, ["--background"])
+
+
+def _record_background_result(session_id: str, failure_outputs: list[str]) -> None:
+    """Store the outcome of a detached fast check for the next hook to collect."""
+
+    def record(state: dict) -> None:
+        state[BACKGROUND_RESULT_KEY] = {
+            "status": "failed" if failure_outputs else "passed",
+            "failures": failure_outputs,
+        }
+
+    if session_id:
+        _update_session_state(session_id, record)
+
+
+def _collect_background_result(session_id: str, wait_s: float) -> list[str]:
+    """Take the last finished background fast check out of the session state.
+
+    Waits up to ``wait_s`` for one that is still running. Returns its failure
+    outputs, or [] when it passed, is still running, or there is none.
+    """
+    deadline = time.monotonic() + wait_s
+    while True:
+        result = _load_session_state(session_id).get(BACKGROUND_RESULT_KEY)
+        if not isinstance(result, dict):
+            return []
+        if result.get("status") != "running":
+            break
+        started_ms = result.get("started_ms", 0)
+        if time.time_ns() // 1_000_000 - started_ms > BACKGROUND_STALE_MS:
+            break  # The background run died without recording a result.
+        if time.monotonic() >= deadline:
+            return []
+        time.sleep(0.1)
+
+    def take(state: dict) -> None:
+        if state.get(BACKGROUND_RESULT_KEY) == result:
+            del state[BACKGROUND_RESULT_KEY]
+
+    _update_session_state(session_id, take)
+    failures = result.get("failures") if result.get("status") == "failed" else None
+    return [str(failure) for failure in failures] if isinstance(failures, list) else []
+
+
+def _report_background_failures(runtime: str, failure_outputs: list[str]) -> None:
+    """Print failures collected from a background fast check."""
+    if runtime == RUNTIME_CODEX:
+        print(_codex_failure_feedback("fast", failure_outputs), end="", file=sys.stderr)
+        return
+    for failure in failure_outputs:
+        print(failure, file=sys.stderr)
+    print("Background fast check failed. You must fix the issues.", file=sys.stderr)
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    """Length of the common prefix of a and b, found with C-level slice comparisons."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a.startswith(b[lo:mid], lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: str, b: str, limit: int) -> int:
+    """Length of the common suffix of a and b, at most limit."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a.endswith(b[len(b) - mid : len(b) - lo], 0, len(a) - lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _edit_bounds(old: str, new: str) -> tuple[int, int]:
+    """Return (start, tail): the whole-line prefix and suffix lengths shared by old and new."""
+    start = old.rfind("\n", 0, _common_prefix_len(old, new)) + 1
+    tail = _common_suffix_len(old, new, min(len(old), len(new)) - start)
+    suffix_start = len(old) - tail
+    if tail and suffix_start > 0 and old[suffix_start - 1] != "\n":
+        newline = old.find("\n", suffix_start)
+        tail = len(old) - newline - 1 if newline != -1 else 0
+    return start, tail
+
+
+# Edits are classified on the statements around the change rather than the
+# whole text, so an edit to a large file costs about as much as one to a small
+# file. A window longer than this is not classified, and the check runs.
+CLASSIFY_MAX_LINES = 200
+
+# A window starts at a line that opens a statement outside any bracket: one
+# matching the language's boundary pattern, not inside a multi-line string or
+# comment (``balanced`` over the text before it).
+Boundary = tuple[re.Pattern[str], Callable[[str, int], bool]]
+
+_PY_BOUNDARY: Boundary = (
+    re.compile(r"[ \t]*(?:(?:async[ \t]+)?def[ \t]|class[ \t]|import[ \t]|from[ \t]|@\w)"),
+    lambda text, end: text.count('"""', 0, end) % 2 == 0 and text.count("'''", 0, end) % 2 == 0,
+)
+_C_BOUNDARY: Boundary = (
+    re.compile(
+        r"[ \t]*(?:(?:export|import|function|async|class|const|let|var|interface|type|enum|func|fn|pub|impl"
+        r"|struct|use|mod|trait|package|public|private|protected|static|fun|object)\b|@\w|\#include\b)"
+    ),
+    lambda text, end: text.count("`", 0, end) % 2 == 0 and text.count("/*", 0, end) == text.count("*/", 0, end),
+)
+# Line-based formats carry no state across lines: every line is a boundary.
+_LINE_BOUNDARY: Boundary = (re.compile(""), lambda text, end: True)
+
+
+def _indent_len(text: str, pos: int) -> int:
+    """Width of the indentation of the line starting at pos."""
+    end = pos
+    while end < len(text) and text[end] in " \t":
+        end += 1
+    return end - pos
+
+
+def _edit_window(old: str, new: str, boundary: Boundary) -> tuple[str, str, bool] | None:
+    """Old and new text of the whole statements around an edit, and whether they run to the end of the text.
+
+    The window starts at the last boundary line at or before the first changed
+    line and ends before the first line after the change that is a boundary
+    at no deeper indentation, or is less indented than the start. Everything
+    outside it is shared by old and new. Returns None when the window would
+    exceed CLASSIFY_MAX_LINES.
+    """
+    pattern, balanced = boundary
+    start, tail = _edit_bounds(old, new)
+    pos, lines = start, 0
+    while pos > 0 and not (
+        pattern.match(old, pos) and (pos < start or pattern.match(new, pos)) and balanced(old, pos)
+    ):
+        lines += 1
+        if lines > CLASSIFY_MAX_LINES:
+            return None
+        pos = old.rfind("\n", 0, pos - 1) + 1
+    if old.count("\n", pos, len(old) - tail) + new.count("\n", pos, len(new) - tail) > 2 * CLASSIFY_MAX_LINES:
+        return None
+    if not tail:
+        return old[pos:], new[pos:], True
+    indent = _indent_len(old, pos)
+    cut = len(old) - tail
+    for _ in range(CLASSIFY_MAX_LINES):
+        if cut >= len(old):
+            return old[pos:], new[pos:], True
+        width = _indent_len(old, cut)
+        code = old[cut + width : cut + width + 1] not in ("", "\n", "#", "/")
+        at_boundary = pattern.match(old, cut) and width <= indent
+        if (at_boundary or (code and width < indent)) and balanced(old, cut):
+            return old[pos:cut], new[pos : cut + len(new) - len(old)], False
+        newline = old.find("\n", cut)
+        cut = newline + 1 if newline != -1 else len(old)
+    return None
+
+
+def _compare_edit_window(
+    old: str, new: str, boundary: Boundary, compare: Callable[[str, str, bool], bool | None]
+) -> bool:
+    """Run ``compare`` on the window around an edit, then on the whole text if the window was inconclusive.
+
+    ``compare(old, new, at_end)`` returns None when text that stops short of
+    the end of the edit does not tokenize to a clean end. The whole text is
+    only tried when it is no longer than CLASSIFY_MAX_LINES.
+    """
+    window = _edit_window(old, new, boundary)
+    if window is None:
+        return False
+    old_window, new_window, at_end = window
+    try:
+        result = compare(old_window, new_window, at_end)
+    except ValueError:
+        result = None
+    if result is not None:
+        return result
+    if len(old_window) == len(old) or max(old.count("\n"), new.count("\n")) > CLASSIFY_MAX_LINES:
+        return False
+    try:
+        return bool(compare(old, new, True))
+    except ValueError:
+        return False
+
+
+def _content_lines(source: str, import_rows: set[int]) -> list[str]:
+    return [line for row, line in enumerate(source.split("\n"), 1) if row not in import_rows and line.strip()]
+
+
+_PY_IMPORT_CONTINUATION_RE = re.compile(r"[\w.,()\\\s]*(?:#.*)?")
+_PY_SKIPPED_TOKENS = frozenset({tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT})
+
+
+def _python_content_lines(source: str) -> tuple[list[str], bool]:
+    """Return the non-blank lines outside import statements, and whether tokenizing reached a clean end.
+
+    Import statements are found on the token stream, so imports inside strings
+    or comments do not count and comments inside a parenthesized import do.
+    An import still open at the end of the text runs to the end of it.
+    Raises ValueError when the text cannot be tokenized.
+    """
+    import_rows: set[int] = set()
+    statement: list[tokenize.TokenInfo] = []
+
+    def is_import(tokens: list[tokenize.TokenInfo]) -> bool:
+        first = tokens[0]
+        if first.type != tokenize.NAME:
+            return False
+        return first.string == "import" or (
+            first.string == "from" and any(t.type == tokenize.NAME and t.string == "import" for t in tokens)
+        )
+
+    def end_statement(end_row: int) -> None:
+        if not statement:
+            return
+        parts: list[list[tokenize.TokenInfo]] = [[]]
+        for token in statement:
+            if token.type == tokenize.OP and token.string == ";":
+                parts.append([])
+            else:
+                parts[-1].append(token)
+        if all(is_import(part) for part in parts if part):
+            import_rows.update(range(statement[0].start[0], end_row + 1))
+        statement.clear()
+
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                end_statement(token.start[0])
+            elif token.type not in _PY_SKIPPED_TOKENS:
+                statement.append(token)
+    except (tokenize.TokenError, SyntaxError) as e:
+        if "EOF" not in str(e.args[0]):
+            raise ValueError(e) from e
+        end_statement(source.count("\n") + 1)
+        return _content_lines(source, import_rows), False
+    return _content_lines(source, import_rows), True
+
+
+# Compiled on first use: the non-ASCII name class makes this the most
+# expensive pattern in the script, and most hook runs never lex JS.
+_JS_TOKEN_PATTERN = r"""
+    (?P<newline>\n)
+    | (?P<space>[^\S\n]+)
+    | (?P<comment>//[^\n]*|/\*[\s\S]*?\*/)
+    | (?P<string>"(?:\\[\s\S]|[^"\\\n])*"|'(?:\\[\s\S]|[^'\\\n])*')
+    | (?P<template>`(?:\\[\s\S]|\$\{[^{}`]*\}|[^\\`$]|\$(?!\{))*`)
+    | (?P<name>[\w$\u0080-\uffff]+|\#[\w$]+)
+    | (?P<punct>\?\.|\.\.\.|=>|[^\w\s"'`\\/]|/(?![/*]))
+    """
+_JS_REGEX_RE = re.compile(r"/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*")
+_JS_REGEX_AFTER_KEYWORDS = frozenset(
+    {
+        "return",
+        "typeof",
+        "instanceof",
+        "in",
+        "of",
+        "new",
+        "delete",
+        "void",
+        "throw",
+        "case",
+        "do",
+        "else",
+        "yield",
+        "await",
+    }
+)
+_JS_IMPORT_CONTINUATION_RE = re.compile(r"[\w$*,{}\s]*(?:(['\"])[^'\"\n]*\1[\s;]*)?(?://.*)?")
+
+# (kind, text, first row, last row)
+Token = tuple[str, str, int, int]
+
+
+def _lex(source: str) -> list[Token]:
+    """Split JS/TS (or other C-family) source into tokens, dropping whitespace.
+
+    Raises ValueError on unterminated literals.
+    """
+    token_re = re.compile(_JS_TOKEN_PATTERN, re.VERBOSE)
+    tokens: list[Token] = []
+    row = 1
+    pos = 0
+    previous: Token | None = None
+    while pos < len(source):
+        if source[pos] == "/" and not source.startswith(("//", "/*"), pos):
+            regex_allowed = previous is None or (
+                previous[1] in _JS_REGEX_AFTER_KEYWORDS
+                if previous[0] == "name"
+                else previous[0] == "punct" and previous[1] not in (")", "]", "}")
+            )
+            match = _JS_REGEX_RE.match(source, pos) if regex_allowed else None
+            if match:
+                previous = ("regex", match.group(), row, row)
+                tokens.append(previous)
+                pos = match.end()
                 continue
+        match = token_re.match(source, pos)
+        if match is None:
+            raise ValueError(f"unterminated literal on line {row}")
+        kind, text = match.lastgroup or "", match.group()
+        pos = match.end()
+        if kind == "newline":
+            row += 1
+        elif kind != "space":
+            token = (kind, text, row, row + text.count("\n"))
+            tokens.append(token)
+            row = token[3]
+            if kind != "comment":
+                previous = token
+    return tokens
+
+
+def _js_declaration_end(tokens: list[Token], start: int) -> int | None:
+    """Index of the last token of the import/export declaration at start, or None if it runs off the end."""
+
+    def after_specifier(end: int) -> int | None:
+        # Optional import attributes (`with { type: "json" }`) and semicolon.
+        if end + 2 < len(tokens) and tokens[end + 1][1] in ("with", "assert") and tokens[end + 2][1] == "{":
+            end = _matching_bracket(tokens, end + 2)
+            if end is None:
+                return None
+        if end + 1 < len(tokens) and tokens[end + 1][1] == ";":
+            end += 1
+        return end
+
+    depth = 0
+    assignment = False  # TS `import x = require("y")`
+    for index in range(start + 1, len(tokens)):
+        kind, text, _, last_row = tokens[index]
+        if kind == "punct" and text in "([{":
+            depth += 1
+            continue
+        if kind == "punct" and text in ")]}":
+            depth -= 1
+            # `export { a, b }` without a `from` clause ends at its closing brace.
+            closes_export_list = depth == 0 and text == "}" and tokens[start][1] == "export"
+            if closes_export_list and (index + 1 >= len(tokens) or tokens[index + 1][1] != "from"):
+                return after_specifier(index)
+        elif depth == 0:
+            if text == ";":
+                return index
+            if kind == "string" and tokens[index - 1][1] in ("from", "import"):
+                return after_specifier(index)
+            if text == "=":
+                assignment = True
+        # Without a semicolon, `import x = ...` ends with its line.
+        line_ends = index + 1 < len(tokens) and tokens[index + 1][2] > last_row
+        if assignment and depth == 0 and line_ends and text not in (".", "="):
+            return index
+    return None
+
+
+def _matching_bracket(tokens: list[Token], start: int) -> int | None:
+    """Index of the bracket closing the one at start, or None if it is never closed."""
+    opening = tokens[start][1]
+    closing = {"(": ")", "[": "]", "{": "}"}[opening]
+    depth = 0
+    for index in range(start, len(tokens)):
+        if tokens[index][0] == "punct" and tokens[index][1] in (opening, closing):
+            depth += 1 if tokens[index][1] == opening else -1
+            if depth == 0:
+                return index
+    return None
+
+
+def _js_starts_declaration(tokens: list[Token], index: int) -> bool:
+    """Whether the import/export keyword at index opens an import or re-export declaration."""
+    if tokens[index][1] not in ("import", "export"):
+        return False
+    following = [t[1] for t in tokens[index + 1 : index + 3]]
+    if tokens[index][1] == "import":
+        # `import(...)` and `import.meta` are expressions.
+        return not following or following[0] not in ("(", ".")
+    if following[:1] == ["type"]:
+        following = following[1:]
+    return following[:1] in (["{"], ["*"])
+
+
+def _declaration_content_lines(
+    source: str,
+    starts_declaration: Callable[[list[Token], int], bool],
+    declaration_end: Callable[[list[Token], int], int | None],
+) -> tuple[list[str], bool]:
+    """Return the non-blank lines outside import declarations, and whether the text ends cleanly.
+
+    Declarations are found on a token stream, so keywords inside strings and
+    comments are content. ``starts_declaration`` decides whether the keyword
+    at a top-level statement start opens a declaration and
+    ``declaration_end`` finds its last token (None if it runs off the end).
+    Raises ValueError when the text cannot be lexed.
+    """
+    tokens = [t for t in _lex(source) if t[0] != "comment"]
+    import_rows: set[int] = set()
+    complete = True
+    depth = 0
+    index = 0
+    while index < len(tokens):
+        kind, text, row, _ = tokens[index]
+        previous = tokens[index - 1] if index else None
+        at_statement_start = previous is None or (
+            previous[1] not in (".", "?.") and (previous[1] in (";", "}") or previous[3] < row)
+        )
+        if depth == 0 and kind == "name" and at_statement_start and starts_declaration(tokens, index):
+            end = declaration_end(tokens, index)
+            if end is None:
+                end = len(tokens) - 1
+                complete = False
+            owns_lines = (previous is None or previous[3] < row) and (
+                end + 1 >= len(tokens) or tokens[end + 1][2] > tokens[end][3]
+            )
+            if owns_lines:
+                import_rows.update(range(row, tokens[end][3] + 1))
+            index = end + 1
+            continue
+        if kind == "punct" and text in "([{":
+            depth += 1
+        elif kind == "punct" and text in ")]}":
+            depth = max(depth - 1, 0)
+        index += 1
+    return _content_lines(source, import_rows), complete and depth == 0
+
+
+def _js_content_lines(source: str) -> tuple[list[str], bool]:
+    """Lines outside JS/TS imports and re-exports; dynamic `import()` and `export const` are content."""
+    return _declaration_content_lines(source, _js_starts_declaration, _js_declaration_end)
+
+
+def _go_starts_declaration(tokens: list[Token], index: int) -> bool:
+    """`import "x"`, `import alias "x"` and `import ( ... )`."""
+    if tokens[index][1] != "import":
+        return False
+    following = tokens[index + 1 : index + 3]
+    if not following:
+        return True
+    first = following[0]
+    if first[1] == "(" or first[0] in ("string", "template"):
+        return True
+    # Named imports: `import alias "x"`, `import _ "x"` and `import . "x"`.
+    return (first[0] == "name" or first[1] == ".") and (
+        len(following) < 2 or following[1][0] in ("string", "template")
+    )
+
+
+def _go_declaration_end(tokens: list[Token], start: int) -> int | None:
+    if start + 1 < len(tokens) and tokens[start + 1][1] == "(":
+        return _matching_bracket(tokens, start + 1)
+    for index in range(start + 1, min(start + 3, len(tokens))):
+        if tokens[index][0] in ("string", "template"):
+            return index
+    return None
+
+
+def _go_content_lines(source: str) -> tuple[list[str], bool]:
+    return _declaration_content_lines(source, _go_starts_declaration, _go_declaration_end)
+
+
+def _rust_starts_declaration(tokens: list[Token], index: int) -> bool:
+    """`use ...;`, `pub use ...;`, `pub(crate) use ...;` and `extern crate ...;`."""
+    text = tokens[index][1]
+    following = tokens[index + 1][1] if index + 1 < len(tokens) else None
+    if text == "use":
+        return True
+    if text == "extern":
+        return following == "crate"
+    if text != "pub" or following is None:
+        return False
+    if following == "(":
+        close = _matching_bracket(tokens, index + 1)
+        following = tokens[close + 1][1] if close is not None and close + 1 < len(tokens) else None
+    return following == "use"
+
+
+def _statement_end(tokens: list[Token], start: int) -> int | None:
+    """Index of the first top-level `;` after start."""
+    depth = 0
+    for index in range(start + 1, len(tokens)):
+        kind, text = tokens[index][:2]
+        if kind == "punct" and text in "([{":
+            depth += 1
+        elif kind == "punct" and text in ")]}":
+            depth -= 1
+        elif depth == 0 and text == ";":
+            return index
+    return None
+
+
+def _rust_content_lines(source: str) -> tuple[list[str], bool]:
+    return _declaration_content_lines(source, _rust_starts_declaration, _statement_end)
+
+
+def _java_starts_declaration(tokens: list[Token], index: int) -> bool:
+    """Java `import [static] a.b.C;` and Kotlin `import a.b.C [as D]`."""
+    return tokens[index][1] == "import" and (index + 1 >= len(tokens) or tokens[index + 1][0] == "name")
+
+
+def _java_declaration_end(tokens: list[Token], start: int) -> int | None:
+    """Imports end at `;` (Java) or with their line (Kotlin)."""
+    for index in range(start + 1, len(tokens)):
+        if tokens[index][1] == ";":
+            return index
+        if index + 1 < len(tokens) and tokens[index + 1][2] > tokens[index][3]:
+            return index
+    return None
+
+
+def _java_content_lines(source: str) -> tuple[list[str], bool]:
+    return _declaration_content_lines(source, _java_starts_declaration, _java_declaration_end)
+
+
+def _is_import_only(
+    old_string: str,
+    new_string: str,
+    content_lines: Callable[[str], tuple[list[str], bool]],
+    keywords: tuple[str, ...],
+    continuation_re: re.Pattern[str],
+    boundary: Boundary,
+) -> bool:
+    """Compare the lines outside import statements before and after an edit.
+
+    Only the statements around the change are tokenized (see _edit_window).
+    Changed lines without any import keyword that differ in lines no import
+    could contain are rejected without tokenizing at all.
+    """
+    start, tail = _edit_bounds(old_string, new_string)
+    old_end, new_end = len(old_string) - tail, len(new_string) - tail
+    old_window, new_window = old_string[start:old_end], new_string[start:new_end]
+    if not any(k in old_window or k in new_window for k in keywords):
 
-            # Non-import line
-            if stripped:
-                lines.append(line)
+        def non_import_lines(window: str) -> list[str]:
+            return [line for line in window.split("\n") if line.strip() and not continuation_re.fullmatch(line)]
 
-        return lines
+        if non_import_lines(old_window) != non_import_lines(new_window):
+            return False
 
-    return get_non_import_lines(old_string) == get_non_import_lines(new_string)
+    def compare(old: str, new: str, at_end: bool) -> bool | None:
+        old_lines, old_complete = content_lines(old)
+        new_lines, new_complete = content_lines(new)
+        # An import left open at the end of an edited fragment runs to its end.
+        return old_lines == new_lines if at_end or (old_complete and new_complete) else None
+
+    return _compare_edit_window(old_string, new_string, boundary, compare)
+
+
+def _is_python_import_only(old_string: str, new_string: str) -> bool:
+    """Check if edit only adds/modifies Python import statements."""
+    return _is_import_only(
+        old_string, new_string, _python_content_lines, ("import",), _PY_IMPORT_CONTINUATION_RE, _PY_BOUNDARY
+    )
 
 
 def _is_js_import_only(old_string: str, new_string: str) -> bool:
-    """Check if edit only adds/modifies JS/TS import statements."""
+    """Check if edit only adds/modifies JS/TS import and re-export statements."""
+    return _is_import_only(
+        old_string, new_string, _js_content_lines, ("import", "export"), _JS_IMPORT_CONTINUATION_RE, _C_BOUNDARY
+    )
 
-    def get_non_import_lines(text: str) -> list[str]:
-        lines = []
-        in_import_block = False
-        in_export_block = False
 
-        for line in text.split("\n"):
-            stripped = line.strip()
+_GO_IMPORT_CONTINUATION_RE = re.compile(r"\s*(?:[\w.]+\s+)?(?:\"[^\"\n]*\"|`[^`\n]*`)?\s*\)?\s*(?://.*)?")
+_RUST_USE_CONTINUATION_RE = re.compile(r"[\w:{},*\s]*;?\s*(?://.*)?")
+_NO_CONTINUATION_RE = re.compile(r"\s*")
 
-            # Handle multi-line import block
-            if in_import_block:
-                if "from" in stripped or stripped.endswith(";"):
-                    in_import_block = False
-                continue
 
-            # Handle multi-line export block
-            if in_export_block:
-                if stripped.startswith("}") or stripped.endswith("};"):
-                    in_export_block = False
-                continue
+def _is_go_import_only(old_string: str, new_string: str) -> bool:
+    """Check if edit only adds/modifies Go import declarations."""
+    return _is_import_only(
+        old_string, new_string, _go_content_lines, ("import",), _GO_IMPORT_CONTINUATION_RE, _C_BOUNDARY
+    )
 
-            # Check if this starts an import
-            if stripped.startswith("import "):
-                if "{" in stripped and "}" not in stripped:
-                    in_import_block = True
-                continue
 
-            # Only treat re-export blocks as export-only (export { ... } or export type { ... })
-            if stripped.startswith(("export {", "export type {")):
-                if "}" not in stripped:
-                    in_export_block = True
-                continue
+def _is_rust_use_only(old_string: str, new_string: str) -> bool:
+    """Check if edit only adds/modifies Rust `use` and `extern crate` declarations."""
+    return _is_import_only(
+        old_string, new_string, _rust_content_lines, ("use", "crate"), _RUST_USE_CONTINUATION_RE, _C_BOUNDARY
+    )
+
 
-            # Non-import/export line
-            if stripped:
-                lines.append(line)
+def _is_java_import_only(old_string: str, new_string: str) -> bool:
+    """Check if edit only adds/modifies Java/Kotlin imports (always single-line)."""
+    return _is_import_only(old_string, new_string, _java_content_lines, ("import",), _NO_CONTINUATION_RE, _C_BOUNDARY)
+
+
+def _python_code_rows(source: str) -> list[tuple[object, ...]]:
+    """Per-line code tokens (with indentation) of Python source, ignoring comments."""
+    rows: dict[int, list[object]] = {}
+    skipped = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER}
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type not in skipped:
+                rows.setdefault(token.start[0], [token.start[1]]).append(token.string)
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise ValueError(e) from e
+    return [tuple(row) for row in rows.values()]
+
+
+def _c_code_rows(source: str) -> list[tuple[object, ...]]:
+    """Per-line code tokens of C-family source, ignoring comments and layout."""
+    rows: dict[int, list[object]] = {}
+    for kind, text, row, _ in _lex(source):
+        if kind != "comment":
+            rows.setdefault(row, []).append(text)
+    return [tuple(row) for row in rows.values()]
+
+
+_HASH_COMMENT_RE = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'[^']*')|(?:^|(?<=\s))#.*")
+
+
+def _hash_code_rows(source: str) -> list[tuple[object, ...]]:
+    """Non-blank lines of shell/YAML/TOML-style source with `#` comments removed."""
+    rows = []
+    for line in source.split("\n"):
+        code = _HASH_COMMENT_RE.sub(lambda m: m.group(1) or "", line).rstrip()
+        if code.strip():
+            rows.append((code,))
+    return rows
+
+
+def _python_layout_rows(source: str) -> list[tuple[object, ...]]:
+    """Per-line tokens of Python source after the line's indentation, with spacing in comments collapsed."""
+    rows: dict[int, list[object]] = {}
+    skipped = {tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER}
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type not in skipped:
+                text = " ".join(token.string.split()) if token.type == tokenize.COMMENT else token.string
+                rows.setdefault(token.start[0], [token.line[: token.start[1]]]).append(text)
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise ValueError(e) from e
+    return [tuple(row) for row in rows.values()]
+
+
+def _c_layout_rows(source: str) -> list[tuple[object, ...]]:
+    """Per-line tokens of C-family source after the line's indentation, with spacing in comments collapsed."""
+    lines = source.split("\n")
+    rows: dict[int, list[object]] = {}
+    for kind, text, row, _ in _lex(source):
+        line = lines[row - 1]
+        rows.setdefault(row, [line[: len(line) - len(line.lstrip())]]).append(
+            " ".join(text.split()) if kind == "comment" else text
+        )
+    return [tuple(row) for row in rows.values()]
 
-        return lines
 
-    return get_non_import_lines(old_string) == get_non_import_lines(new_string)
+_QUOTED_OR_SPACE_RE = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'[^']*')|\s+")
 
 
-def is_import_only_edit(hook_input: dict) -> bool:
-    """Check if this edit only modifies import statements.
+def _text_layout_rows(source: str) -> list[tuple[object, ...]]:
+    """Non-blank lines with their indentation, and other spacing collapsed outside quoted strings."""
+    rows = []
+    for line in source.split("\n"):
+        body = line.strip()
+        if body:
+            indent = line[: len(line) - len(line.lstrip())]
+            rows.append((indent, _QUOTED_OR_SPACE_RE.sub(lambda m: m.group(1) or " ", body)))
+    return rows
 
-    Routes to language-specific logic based on file extension.
+
+def _is_layout_only(
+    old_string: str,
+    new_string: str,
+    layout_rows: Callable[[str], list[tuple[object, ...]]],
+    boundary: Boundary,
+) -> bool:
+    """Compare the tokens on each line before and after an edit, ignoring blank lines and spacing between them."""
+    start, tail = _edit_bounds(old_string, new_string)
+    old_changed, new_changed = old_string[start : len(old_string) - tail], new_string[start : len(new_string) - tail]
+    if "".join(old_changed.split()) != "".join(new_changed.split()):
+        return False
+    return _compare_edit_window(
+        old_string, new_string, boundary, lambda old, new, _: layout_rows(old) == layout_rows(new)
+    )
+
+
+def _is_whitespace_only(old_string: str, new_string: str) -> bool:
+    """Check if edit only changes blank lines or spacing within lines; indentation and quoted text still count."""
+    return _is_layout_only(old_string, new_string, _text_layout_rows, _LINE_BOUNDARY)
+
+
+def _is_python_whitespace_only(old_string: str, new_string: str) -> bool:
+    return _is_layout_only(old_string, new_string, _python_layout_rows, _PY_BOUNDARY)
+
+
+def _is_c_whitespace_only(old_string: str, new_string: str) -> bool:
+    return _is_layout_only(old_string, new_string, _c_layout_rows, _C_BOUNDARY)
+
+
+def _is_comment_only(
+    old_string: str,
+    new_string: str,
+    code_rows: Callable[[str], list[tuple[object, ...]]],
+    markers: tuple[str, ...],
+    boundary: Boundary,
+) -> bool:
+    """Compare the code on each line before and after an edit, ignoring comments."""
+    start, tail = _edit_bounds(old_string, new_string)
+    changed = old_string[start : len(old_string) - tail] + new_string[start : len(new_string) - tail]
+    if not any(marker in changed for marker in markers):
+        return False
+    return _compare_edit_window(old_string, new_string, boundary, lambda old, new, _: code_rows(old) == code_rows(new))
+
+
+def _is_python_comment_only(old_string: str, new_string: str) -> bool:
+    return _is_comment_only(old_string, new_string, _python_code_rows, ("#",), _PY_BOUNDARY)
+
+
+def _is_c_comment_only(old_string: str, new_string: str) -> bool:
+    return _is_comment_only(old_string, new_string, _c_code_rows, ("//", "/*"), _C_BOUNDARY)
+
+
+def _is_hash_comment_only(old_string: str, new_string: str) -> bool:
+    return _is_comment_only(old_string, new_string, _hash_code_rows, ("#",), _LINE_BOUNDARY)
+
+
+EditClassifier = Callable[[str, str], bool]
+
+# Trivial-edit classifiers by file extension, tried in order; files with
+# other extensions use the language-independent ones. The name of the first
+# that matches is the skip reason reported to the agent and counted in the
+# session's stats.
+GENERIC_EDIT_CLASSIFIERS: list[tuple[str, EditClassifier]] = [("whitespace", _is_whitespace_only)]
+_C_WHITESPACE: tuple[str, EditClassifier] = ("whitespace", _is_c_whitespace_only)
+_LANGUAGE_CLASSIFIERS: list[tuple[tuple[str, ...], list[tuple[str, EditClassifier]]]] = [
+    (
+        (".py",),
+        [
+            ("whitespace", _is_python_whitespace_only),
+            ("import", _is_python_import_only),
+            ("comment", _is_python_comment_only),
+        ],
+    ),
+    (
+        (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts"),
+        [_C_WHITESPACE, ("import", _is_js_import_only), ("comment", _is_c_comment_only)],
+    ),
+    ((".go",), [_C_WHITESPACE, ("import", _is_go_import_only), ("comment", _is_c_comment_only)]),
+    ((".rs",), [_C_WHITESPACE, ("import", _is_rust_use_only), ("comment", _is_c_comment_only)]),
+    ((".java", ".kt", ".kts"), [_C_WHITESPACE, ("import", _is_java_import_only), ("comment", _is_c_comment_only)]),
+    ((".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift", ".scala"), [_C_WHITESPACE, ("comment", _is_c_comment_only)]),
+    (
+        (".sh", ".bash", ".rb", ".yaml", ".yml", ".toml"),
+        [*GENERIC_EDIT_CLASSIFIERS, ("comment", _is_hash_comment_only)],
+    ),
+]
+EDIT_CLASSIFIERS: dict[str, list[tuple[str, EditClassifier]]] = {
+    extension: list(classifiers) for extensions, classifiers in _LANGUAGE_CLASSIFIERS for extension in extensions
+}
+
+
+def _original_content(hook_input: dict) -> str | None:
+    """Content a Write replaced, from the tool response's originalFile.
+
+    Without it the replaced content is unknown: by PostToolUse the file on
+    disk already holds the new content, and the committed version may predate
+    uncommitted edits, so the Write is not treated as trivial.
+    """
+    tool_response = hook_input.get("tool_response")
+    if isinstance(tool_response, dict) and tool_response.get("type") != "create":
+        original = tool_response.get("originalFile")
+        if isinstance(original, str):
+            return original
+    return None
+
+
+def _edit_pairs(hook_input: dict) -> list[tuple[str, str]] | None:
+    """The (old, new) text pairs of an Edit, MultiEdit or Write.
+
+    Returns None when the hook input carries no edit or its old text cannot
+    be recovered.
     """
     tool_input = hook_input.get("tool_input", {})
-    file_path = tool_input.get("file_path", "")
-    old_string = tool_input.get("old_string", "")
-    new_string = tool_input.get("new_string", "")
+    if not isinstance(tool_input, dict):
+        return None
+    if "edits" in tool_input:
+        edits = tool_input["edits"]
+        if not isinstance(edits, list) or not edits:
+            return None
+        raw = [(e.get("old_string"), e.get("new_string")) if isinstance(e, dict) else (None, None) for e in edits]
+    elif "content" in tool_input:
+        raw = [(_original_content(hook_input), tool_input["content"])]
+    else:
+        raw = [(tool_input.get("old_string"), tool_input.get("new_string"))]
+    pairs = [(old, new) for old, new in raw if isinstance(old, str) and isinstance(new, str)]
+    return pairs if len(pairs) == len(raw) else None
+
+
+def classify_trivial_edit(hook_input: dict) -> str | None:
+    """Name the kind of trivial edit (import, whitespace, comment) whose fast check can be skipped.
+
+    A MultiEdit batch is trivial when every edit in it is; mixed kinds are
+    named together (``comment/import``). A Write is compared against the
+    content it replaced. Returns None when the edit is not trivial or its old
+    text is unknown. Classifiers are routed by the file extension.
+    """
+    pairs = _edit_pairs(hook_input)
+    if pairs is None:
+        return None
+    extension = os.path.splitext(hook_input["tool_input"].get("file_path", ""))[1]
+    classifiers = EDIT_CLASSIFIERS.get(extension, GENERIC_EDIT_CLASSIFIERS)
+    kinds = set()
+    for old, new in pairs:
+        kind = next((kind for kind, classifier in classifiers if classifier(old, new)), None)
+        if kind is None:
+            return None
+        kinds.add(kind)
+    return "/".join(sorted(kinds))
+
+
+def _record_trivial_skip(session_id: str, kind: str) -> None:
+    """Count a skipped fast check by its trivial-edit kind."""
+
+    def record(state: dict) -> None:
+        skips = state.setdefault("trivial_skips", {})
+        skips[kind] = skips.get(kind, 0) + 1
+
+    _update_session_state(session_id, record)
+
+
+def _format_trivial_skips(session_id: str) -> str | None:
+    """Summarize the fast checks skipped for trivial edits this session."""
+    skips = _load_session_state(session_id).get("trivial_skips")
+    if not isinstance(skips, dict) or not skips:
+        return None
+    total = sum(skips.values())
+    kinds = ", ".join(f"{count} {kind}" for kind, count in sorted(skips.items()))
+    return f"Skipped {total} fast check{'s' if total != 1 else ''} for trivial edits ({kinds})"
 
-    if file_path.endswith(".py"):
-        return _is_python_import_only(old_string, new_string)
 
-    if any(file_path.endswith(ext) for ext in (".ts", ".tsx", ".js", ".jsx")):
-        return _is_js_import_only(old_string, new_string)
+def _team_index_path() -> str:
+    """Cached leadSessionId -> team index, kept out of the per-session state files."""
+    return os.path.join(_state_dir(), "index", "teams.json")
 
-    return False
+
+def _read_team_lead(config_path: str) -> str | None:
+    """Return a team config's leadSessionId, or None if it is missing or unreadable."""
+    try:
+        with open(config_path) as f:
+            lead = json.load(f).get("leadSessionId")
+    except (json.JSONDecodeError, OSError, AttributeError):
+        return None
+    return lead if isinstance(lead, str) else None
+
+
+def _team_config_stamp(config_path: str) -> list[int] | None:
+    """A config's [mtime_ns, size], or None if it does not exist yet."""
+    try:
+        config_stat = os.stat(config_path)
+    except OSError:
+        return None
+    return [config_stat.st_mtime_ns, config_stat.st_size]
+
+
+def _refresh_team_index(teams_dir: str, cached: dict) -> dict[str, dict]:
+    """Index teams by name, re-reading only configs whose mtime or size changed.
+
+    Team directories without a config yet are indexed with a None stamp so
+    the read path can notice when the config appears.
+    """
+    teams: dict[str, dict] = {}
+    with contextlib.suppress(OSError), os.scandir(teams_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            stamp = _team_config_stamp(os.path.join(entry.path, "config.json"))
+            team = cached.get(entry.name)
+            if not isinstance(team, dict) or team.get("stamp") != stamp:
+                lead = _read_team_lead(os.path.join(entry.path, "config.json")) if stamp else None
+                team = {"stamp": stamp, "lead": lead}
+            teams[entry.name] = team
+    return teams
+
+
+def _current_team_index(index: dict, teams_dir: str, dir_mtime_ns: int, session_id: str) -> dict | None:
+    """Return the indexed teams if they are still current for this session, else None.
+
+    The teams directory's mtime covers teams being created or removed. The
+    only configs stat'ed are the ones not written yet and the ones naming
+    this session as lead, so a lead replaced in place is caught before it
+    is trusted.
+    """
+    teams = index.get("teams")
+    if index.get("teams_dir") != teams_dir or index.get("dir_mtime_ns") != dir_mtime_ns or not isinstance(teams, dict):
+        return None
+    for name, team in teams.items():
+        if not isinstance(team, dict):
+            return None
+        watched = team.get("stamp") is None or team.get("lead") == session_id
+        if watched and _team_config_stamp(os.path.join(teams_dir, name, "config.json")) != team.get("stamp"):
+            return None
+    return teams
 
 
 def _is_team_lead_session(session_id: str) -> bool:
@@ -222,34 +1562,102 @@ def _is_team_lead_session(session_id: str) -> bool:
     leadSessionId. When the lead session runs stop checks, it blocks the
     orchestrator from coordinating members. The members' own sessions still
     run their stop hooks independently, so skipping here is safe.
+
+    Each team's lead is cached in the state directory together with the
+    teams directory's mtime. While that mtime is unchanged the index is
+    read under a shared lock without scanning the configs; otherwise it is
+    rebuilt under an exclusive lock, parsing only new or rewritten configs.
+    A config rewritten in place to name a different lead is picked up the
+    next time a team is created or removed.
     """
     teams_dir = os.path.expanduser("~/.claude/teams")
-    if not os.path.isdir(teams_dir):
+    try:
+        teams_stat = os.stat(teams_dir)
+    except OSError:
         return False
-    for entry in os.listdir(teams_dir):
-        config_path = os.path.join(teams_dir, entry, "config.json")
-        if not os.path.isfile(config_path):
-            continue
-        try:
-            with open(config_path) as f:
-                team = json.load(f)
-            if team.get("leadSessionId") == session_id:
-                return True
-        except (json.JSONDecodeError, OSError):
+    if not stat.S_ISDIR(teams_stat.st_mode):
+        return False
+    index_path = _team_index_path()
+    try:
+        with _locked_state_file(index_path, exclusive=False) as f:
+            teams = _current_team_index(_read_state(f), teams_dir, teams_stat.st_mtime_ns, session_id)
+        if teams is None:
+            with _locked_state_file(index_path, exclusive=True) as f:
+                index = _read_state(f)
+                # Another hook may have rebuilt the index while we waited for the lock.
+                teams = _current_team_index(index, teams_dir, teams_stat.st_mtime_ns, session_id)
+                if teams is None:
+                    cached = index.get("teams") if index.get("teams_dir") == teams_dir else None
+                    teams = _refresh_team_index(teams_dir, cached if isinstance(cached, dict) else {})
+                    _write_state(f, {"teams_dir": teams_dir, "dir_mtime_ns": teams_stat.st_mtime_ns, "teams": teams})
+    except OSError:
+        teams = _refresh_team_index(teams_dir, {})
+    return any(team.get("lead") == session_id for team in teams.values())
+
+
+def _parse_porcelain(stdout: str) -> set[str]:
+    """Paths listed by ``git status --porcelain -z``."""
+    files = set()
+    entries = iter(stdout.split("\0"))
+    for entry in entries:
+        if not entry:
             continue
-    return False
+        files.add(entry[3:])  # Skip XY status codes and space
+        if entry[0] in "RC":
+            next(entries, None)  # Renames and copies are followed by the source path
+    return files
+
+
+def drop_ignored_files(project_dir: str, files: set[str]) -> set[str]:
+    """Remove the files git ignores (build output, virtualenvs, generated code).
+
+    Edited files come from the hook input rather than ``git status``, so
+    they are filtered with ``git check-ignore``. If git cannot answer, the
+    files are kept.
+    """
+    if not files:
+        return files
+    try:
+        with hook_trace.span("git check-ignore"):
+            result = subprocess.run(
+                ["git", "check-ignore", "-z", "--stdin"],
+                input="\0".join(sorted(files)) + "\0",
+                capture_output=True,
+                text=True,
+                cwd=project_dir,
+            )
+    except OSError:
+        return files
+    # Exit status 1 means none of the files are ignored.
+    if result.returncode != 0:
+        return files
+    return files - set(filter(None, result.stdout.split("\0")))
 
 
 def get_changed_files(project_dir: str) -> set[str]:
-    """Return the set of changed file paths from git status --porcelain."""
+    """Return the set of changed file paths from git status --porcelain.
+
+    Untracked directories are listed file by file (-uall), so ``paths``
+    globs and the file placeholders see the files inside a new package.
+
+    Inside a daemon started with ``--watch`` the live set kept by the
+    inotify watcher is returned instead.
+    """
+    watcher = _change_watcher
+    if watcher is not None and watcher.project_dir == os.path.realpath(project_dir):
+        changed = watcher.changed_files()
+        if changed is not None:
+            return changed
+
     try:
-        result = subprocess.run(
-            "git status --porcelain",
-            shell=True,
-            capture_output=True,
-            text=True,
-            cwd=project_dir,
-        )
+        with hook_trace.span("git status"):
+            result = subprocess.run(
+                "git status --porcelain -z -uall",
+                shell=True,
+                capture_output=True,
+                text=True,
+                cwd=project_dir,
+            )
     except Exception as e:
         print(f"Error getting git status: {e}", file=sys.stderr)
         sys.exit(BLOCKING_ERROR_CODE)
@@ -258,41 +1666,901 @@ def get_changed_files(project_dir: str) -> set[str]:
         print(f"Error getting git status: {result.stderr}", file=sys.stderr)
         sys.exit(BLOCKING_ERROR_CODE)
 
-    files = set()
-    for line in result.stdout.split("\n"):
-        if line:
-            files.add(line[3:])  # Skip XY status codes and space
+    return _parse_porcelain(result.stdout)
+
+
+# inotify(7) event bits
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_ISDIR = 0x40000000
+_TREE_EVENTS = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+)
+_GIT_DIR_EVENTS = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_DELETE | _IN_ONLYDIR
+# Above this many touched paths one full git status beats passing them all as pathspecs.
+MAX_WATCH_PATHSPECS = 512
+
+
+class _ChangeWatcher:
+    """Live set of changed files for one project, kept current with inotify.
+
+    It starts from one full ``git status`` and then only records which paths
+    inotify reports as touched; a query re-runs git status limited to those
+    paths, so git stats a handful of files instead of the whole tree. Writes
+    to .git itself (staging, commits, checkouts) and a lost event queue fall
+    back to one full git status. Directories git ignores are not watched.
+    """
+
+    def __init__(self, project_dir: str) -> None:
+        import ctypes
+
+        self.project_dir = os.path.realpath(project_dir)
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._changed: set[str] = set()
+        self._touched: set[str] = set()
+        self._stale = True
+        # Set when a watch could not be added (e.g. the inotify watch limit);
+        # from then on callers fall back to plain git status.
+        self._broken = False
+        self._git_wd = self._add_watch(".git", _GIT_DIR_EVENTS)
+        self._watch_tree("")
+
+    def _add_watch(self, directory: str, mask: int) -> int:
+        path = os.path.join(self.project_dir, directory)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self._dirs[wd] = directory
+        return wd
+
+    def _watch_tree(self, directory: str) -> None:
+        """Watch directory and every non-ignored directory below it."""
+        result = subprocess.run(
+            [
+                "git",
+                "ls-files",
+                "--others",
+                "--ignored",
+                "--exclude-standard",
+                "--directory",
+                "-z",
+                "--",
+                directory or ".",
+            ],
+            capture_output=True,
+            text=True,
+            cwd=self.project_dir,
+        )
+        ignored = {entry.rstrip("/") for entry in result.stdout.split("\0") if entry.endswith("/")}
+        if directory in ignored:
+            return
+        for root, subdirs, _ in os.walk(os.path.join(self.project_dir, directory)):
+            relative = os.path.relpath(root, self.project_dir)
+            relative = "" if relative == "." else relative
+            subdirs[:] = [d for d in subdirs if d != ".git" and os.path.join(relative, d) not in ignored]
+            try:
+                self._add_watch(relative, _TREE_EVENTS)
+            except FileNotFoundError:
+                subdirs[:] = []  # Removed while walking; the delete event marks it touched
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & _IN_Q_OVERFLOW:
+            self._stale = True
+            return
+        if mask & _IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return
+        if wd == self._git_wd:
+            if not name.endswith(".lock"):
+                self._stale = True
+            return
+        directory = self._dirs.get(wd)
+        if directory is None:
+            return
+        path = os.path.join(directory, name)
+        self._touched.add(path)
+        if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+            self._watch_tree(path)
+        elif mask & _IN_ISDIR and mask & _IN_MOVED_FROM:
+            # Watches below a moved directory still report its old path.
+            for watched, watched_dir in list(self._dirs.items()):
+                if watched_dir == path or watched_dir.startswith(path + "/"):
+                    self._libc.inotify_rm_watch(self._fd, watched)
+                    self._dirs.pop(watched, None)
+
+    def _drain(self) -> None:
+        """Handle every event already queued on the inotify fd. Caller holds the lock."""
+        import select
+        import struct
+
+        header = struct.Struct("iIII")
+        while select.select([self._fd], [], [], 0)[0]:
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = header.unpack_from(data, offset)
+                offset += header.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                try:
+                    self._handle(wd, mask, name)
+                except OSError:
+                    self._broken = True
+
+    def run(self) -> None:
+        """Handle inotify events as they arrive until the process exits.
+
+        Events are only read under the lock, so a query never misses events
+        this thread has read but not yet handled.
+        """
+        import select
+
+        while True:
+            select.select([self._fd], [], [])
+            with self._lock:
+                self._drain()
+
+    def _git_status(self, pathspecs: list[str]) -> set[str] | None:
+        result = subprocess.run(
+            # --no-optional-locks: don't refresh the index, which would write
+            # to .git and mark the set stale again.
+            ["git", "--no-optional-locks", "status", "--porcelain", "-z", "-uall", "--", *pathspecs],
+            capture_output=True,
+            text=True,
+            cwd=self.project_dir,
+        )
+        return _parse_porcelain(result.stdout) if result.returncode == 0 else None
+
+    def _refresh(self, touched: set[str]) -> set[str] | None:
+        """Re-run git status for the touched paths and merge it into the known set."""
+        # A touched directory covers everything below it, including files
+        # created before its watch was added.
+        query = {path for path in touched if not any(path.startswith(t + "/") for t in touched)}
+        update = self._git_status([f":(literal){path}" for path in sorted(query)])
+        if update is None:
+            return None
+        kept = {p for p in self._changed if p not in query and not any(p.startswith(q + "/") for q in query)}
+        return kept | update
+
+    def changed_files(self) -> set[str] | None:
+        """Return the changed files, or None when git status fails or events were lost."""
+        with self._lock:
+            # Events for writes that already returned are queued by now;
+            # handle them so the answer includes the file just edited.
+            self._drain()
+            if self._broken:
+                return None
+            touched, self._touched = self._touched, set()
+            if self._stale or len(touched) > MAX_WATCH_PATHSPECS:
+                self._stale = False
+                changed = self._git_status([])
+            elif touched:
+                changed = self._refresh(touched)
+            else:
+                changed = self._changed
+            if changed is None:
+                self._stale = True
+                return None
+            self._changed = changed
+            return set(changed)
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate a glob to a regex: ``*`` and ``?`` stay within a path segment, ``**`` spans segments."""
+    out: list[str] = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def _compile_glob(pattern: str, directory: str | None) -> tuple[list[str], re.Pattern[str]]:
+    """Compile a check glob into its literal directory prefix and a full-path regex.
+
+    Patterns are relative to the check's directory. A pattern without a slash
+    matches at any depth; a match on a directory covers everything below it.
+    """
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.strip("/")
+    if not anchored:
+        pattern = f"**/{pattern}"
+    if directory:
+        pattern = f"{directory}/{pattern}"
+    prefix: list[str] = []
+    for segment in pattern.split("/")[:-1]:
+        if any(c in segment for c in "*?["):
+            break
+        prefix.append(segment)
+    return prefix, re.compile(_glob_to_regex(pattern) + "(?:/.*)?")
+
+
+def _glob_list(check: dict, key: str) -> list[str]:
+    """Read a list of glob patterns from a check, accepting a single string."""
+    patterns = check.get(key, [])
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if not isinstance(patterns, list) or not all(isinstance(p, str) and p.strip("/") for p in patterns):
+        raise ValueError(f"check {check_name(check)!r}: `{key}` must be a list of glob patterns")
+    return patterns
+
+
+def compile_check_matcher(checks: list[dict]) -> dict:
+    """Index every check's scope in a trie keyed by literal directory segments.
+
+    Each node holds ``(check index, is_exclude, regex)`` rules; a regex of
+    None matches anything below the node. A file then only tests the rules
+    on its own directory path instead of every pattern of every check.
+    Raises ValueError on malformed ``paths`` / ``exclude``.
+    """
+    root: dict = {"children": {}, "rules": []}
+
+    def insert(prefix: list[str], rule: tuple[int, bool, re.Pattern[str] | None]) -> None:
+        node = root
+        for segment in prefix:
+            node = node["children"].setdefault(segment, {"children": {}, "rules": []})
+        node["rules"].append(rule)
+
+    for index, check in enumerate(checks):
+        directory = (check.get("directory") or "").strip("/") or None
+        paths = _glob_list(check, "paths")
+        if not paths:
+            insert(directory.split("/") if directory else [], (index, False, None))
+        for pattern in paths:
+            prefix, regex = _compile_glob(pattern, directory)
+            insert(prefix, (index, False, regex))
+        for pattern in _glob_list(check, "exclude"):
+            prefix, regex = _compile_glob(pattern, directory)
+            insert(prefix, (index, True, regex))
+    return root
+
+
+def match_checks(matcher: dict, files: set[str]) -> dict[int, list[str]]:
+    """Map each check index to the sorted files in its scope, in one pass over files."""
+    matches: dict[int, list[str]] = {}
+    for path in sorted(files):
+        node = matcher
+        rules = list(node["rules"])
+        for segment in path.split("/")[:-1]:
+            node = node["children"].get(segment)
+            if node is None:
+                break
+            rules.extend(node["rules"])
+        included: set[int] = set()
+        excluded: set[int] = set()
+        for index, exclude, regex in rules:
+            if regex is None or regex.fullmatch(path):
+                (excluded if exclude else included).add(index)
+        for index in included - excluded:
+            matches.setdefault(index, []).append(path)
+    return matches
+
+
+def _check_matcher(checks: list[dict]) -> dict:
+    """Compile the matcher once per loaded config (the config cache keeps ``checks`` identical)."""
+    global _matcher_cache
+    cached = _matcher_cache
+    if cached is not None and cached[0] is checks:
+        return cached[1]
+    matcher = compile_check_matcher(checks)
+    _matcher_cache = (checks, matcher)
+    return matcher
+
+
+def _edited_file(hook_input: dict | None, project_dir: str) -> str | None:
+    """Return the project-relative path named by tool_input.file_path, if any."""
+    if not hook_input:
+        return None
+    tool_input = hook_input.get("tool_input")
+    if not isinstance(tool_input, dict):
+        return None
+    file_path = tool_input.get("file_path")
+    if not isinstance(file_path, str) or not file_path:
+        return None
+    root = os.path.realpath(project_dir)
+    rel = os.path.relpath(os.path.realpath(os.path.join(root, file_path)), root)
+    if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+        return None
+    return rel
+
+
+def scoped_files(files: set[str], directory: str | None, project_dir: str) -> list[str]:
+    """Return existing files under directory, relative to it (or the project root)."""
+    prefix = f"{directory}/" if directory else ""
+    return sorted(
+        f[len(prefix) :] for f in files if f.startswith(prefix) and os.path.exists(os.path.join(project_dir, f))
+    )
+
+
+def _command_byte_limit() -> int:
+    """Largest command string that can safely be passed to ``sh -c``."""
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (ValueError, OSError):
+        arg_max = MAX_SINGLE_ARG_BYTES
+    # Leave room for the environment, which shares the ARG_MAX budget.
+    return min(arg_max // 2, MAX_SINGLE_ARG_BYTES) - 1024
+
+
+def expand_command(command: str, files: list[str], byte_limit: int | None = None) -> list[str]:
+    """Fill ``{file}`` / ``{files}`` placeholders with shell-quoted paths.
+
+    ``{file}`` produces one command per file. ``{files}`` produces as few
+    commands as possible, splitting the file list so that each command stays
+    under ``byte_limit``. Commands without placeholders are returned as-is.
+    """
+    if FILE_PLACEHOLDER in command:
+        return [command.replace(FILE_PLACEHOLDER, shlex.quote(f)) for f in files]
+    if FILES_PLACEHOLDER not in command:
+        return [command]
+
+    limit = byte_limit or _command_byte_limit()
+    base = len(command.encode()) - len(FILES_PLACEHOLDER)
+    commands: list[str] = []
+    chunk: list[str] = []
+    size = base
+    for f in files:
+        quoted = shlex.quote(f)
+        added = len(quoted.encode()) + 1
+        if chunk and size + added > limit:
+            commands.append(command.replace(FILES_PLACEHOLDER, " ".join(chunk)))
+            chunk, size = [], base
+        chunk.append(quoted)
+        size += added
+    if chunk:
+        commands.append(command.replace(FILES_PLACEHOLDER, " ".join(chunk)))
+    return commands
+
+
+def _uses_file_placeholders(command: str) -> bool:
+    return FILE_PLACEHOLDER in command or FILES_PLACEHOLDER in command
+
+
+def _is_test_module(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _module_names(path: str) -> list[str]:
+    """Dotted names a Python file can be imported as, from the check directory or its src/ layout."""
+    names = []
+    for root in IMPACT_SOURCE_ROOTS:
+        if not path.startswith(root) or not path.endswith(".py"):
+            continue
+        parts = path[len(root) : -len(".py")].split("/")
+        if parts[-1] == "__init__":
+            parts.pop()
+        if parts and all(part.isidentifier() for part in parts):
+            names.append(".".join(parts))
+    return names
+
+
+def _parse_imports(path: str, source_path: str) -> list[str] | None:
+    """Absolute module names a file imports, including the parent packages they execute.
+
+    Returns None when the file cannot be parsed.
+    """
+    import ast
+
+    try:
+        with open(source_path, "rb") as f:
+            tree = ast.parse(f.read(), source_path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    module_names = _module_names(path)
+    module = module_names[-1] if module_names else ""
+    package = module if path.endswith("__init__.py") else module.rpartition(".")[0]
+
+    imports: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parts = package.split(".") if package else []
+                if node.level - 1 > len(parts):
+                    continue
+                base = ".".join([*parts[: len(parts) - node.level + 1], *([base] if base else [])])
+            # `from pkg import name` may name a submodule as well as an attribute.
+            names = [base, *(f"{base}.{alias.name}" if base else alias.name for alias in node.names)]
+        else:
+            continue
+        for name in names:
+            parts = name.split(".")
+            imports.update(".".join(parts[:i]) for i in range(1, len(parts) + 1) if parts[0])
+    return sorted(imports)
+
+
+def _impact_graph(cwd: str) -> dict[str, dict] | None:
+    """Map each Python file under cwd to its imports.
+
+    The graph is cached in the state directory; only files whose mtime or
+    size changed since the last run are parsed again. Returns None when the
+    files cannot be listed.
+    """
+    try:
+        listed = subprocess.run(
+            ["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z", "--", "*.py"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    digest = hashlib.sha256(os.path.realpath(cwd).encode()).hexdigest()[:16]
+    cache_path = os.path.join(_state_dir(), "impact", f"{digest}.json")
+
+    def refresh(cached: dict) -> tuple[dict[str, dict], bool]:
+        files: dict[str, dict] = {}
+        changed = False
+        for path in filter(None, listed.split("\0")):
+            source_path = os.path.join(cwd, path)
+            try:
+                stat = os.stat(source_path)
+            except OSError:
+                continue
+            stamp = [stat.st_mtime_ns, stat.st_size]
+            entry = cached.get(path)
+            if not isinstance(entry, dict) or entry.get("stamp") != stamp:
+                entry = {"stamp": stamp, "imports": _parse_imports(path, source_path)}
+                changed = True
+            files[path] = entry
+        return files, changed or files.keys() != cached.keys()
+
+    try:
+        with _locked_state_file(cache_path, exclusive=True) as f:
+            files, changed = refresh(_read_state(f).get("files", {}))
+            if changed:
+                _write_state(f, {"files": files})
+    except OSError:
+        files, _ = refresh({})
     return files
 
 
-def directory_has_changes(changed_files: set[str], directory: str) -> bool:
-    """Check if any changed file is under the given directory."""
-    prefix = f"{directory}/"
-    return any(f.startswith(prefix) for f in changed_files)
+def affected_tests(cwd: str, changed_files: list[str]) -> list[str] | None:
+    """Test files under cwd that import any changed file, directly or transitively.
+
+    Paths are relative to cwd. Returns None when the full suite must run: a
+    changed file is not a plain Python module (conftest.py, data, config),
+    a conftest.py imports it (tests reach it through fixtures, not imports),
+    or some file in the graph could not be parsed.
+    """
+    if any(not path.endswith(".py") or os.path.basename(path) == "conftest.py" for path in changed_files):
+        return None
+    graph = _impact_graph(cwd)
+    if graph is None or any(entry["imports"] is None for entry in graph.values()):
+        return None
+
+    importers: dict[str, set[str]] = {}
+    for path, entry in graph.items():
+        for name in entry["imports"]:
+            importers.setdefault(name, set()).add(path)
+
+    seen = set(changed_files)
+    queue = list(changed_files)
+    while queue:
+        path = queue.pop()
+        for name in _module_names(path):
+            for importer in importers.get(name, ()):
+                if importer not in seen:
+                    seen.add(importer)
+                    queue.append(importer)
+    if any(os.path.basename(path) == "conftest.py" for path in seen):
+        return None
+    return sorted(path for path in seen if path in graph and _is_test_module(path))
+
+
+def _expand_tests(command: str, tests: list[str] | None) -> str:
+    """Fill {tests} with the affected test files, or nothing (the full suite) if they do not fit."""
+    selected = " ".join(shlex.quote(test) for test in tests or [])
+    expanded = command.replace(TESTS_PLACEHOLDER, selected)
+    if len(expanded.encode()) > _command_byte_limit():
+        return command.replace(TESTS_PLACEHOLDER, "")
+    return expanded
+
+
+def _has_exited(process: subprocess.Popen) -> bool:
+    """Whether a command's shell has exited, without reaping it."""
+    if process.returncode is not None:
+        return True
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _peak_rss_kb(usage: resource.struct_rusage) -> int:
+    """Peak resident set size in KiB (macOS reports bytes)."""
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+def _kill_process_group(process: subprocess.Popen) -> None:
+    """Terminate a command's whole process group, escalating to SIGKILL."""
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(process.pid, signal.SIGTERM)
+    # Poll without reaping: the thread running the command reaps it with wait4.
+    grace_ends = time.monotonic() + KILL_GRACE_S
+    while not _has_exited(process) and time.monotonic() < grace_ends:
+        time.sleep(0.05)
+    # Children may outlive the shell or ignore SIGTERM; make sure they go too.
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(process.pid, signal.SIGKILL)
+
 
+class _RequestProcesses:
+    """Check processes started for one daemon request.
 
-def run_check(command: str, cwd: str, action: str, runtime: str) -> tuple[bool, str]:
-    """Run a command in the given directory. Returns True on success."""
-    _emit(runtime, f"Running `{command}` in {cwd}")
+    The daemon kills them when the hook process that forwarded the request
+    goes away, e.g. because the agent killed it at its hook timeout.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._processes: set[subprocess.Popen] = set()
+        self._cancelled = False
+
+    def add(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            if not self._cancelled:
+                self._processes.add(process)
+                return
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(process.pid, signal.SIGKILL)
+
+    def discard(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+    def kill_all(self) -> None:
+        """Kill every running process group; ones started later are killed on start."""
+        with self._lock:
+            self._cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(process.pid, signal.SIGKILL)
+
+
+def _kill_active_process_groups(signum: int, frame: object) -> None:
+    """SIGTERM handler: take running checks down with the hook."""
+    with _active_processes_lock:
+        processes = list(_active_processes)
+    for process in processes:
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(process.pid, signal.SIGKILL)
+    sys.exit(BLOCKING_ERROR_CODE)
+
+
+class _OutputCapture:
+    """Keep the head and tail of a command's output within a byte budget.
+
+    Output is held in memory until it outgrows the budget. From then on the
+    complete output is streamed to a log file on disk, and only the first and
+    last bytes are kept for the report.
+    """
 
+    def __init__(self, budget: int) -> None:
+        self.head_limit = budget // 4
+        self.tail_limit = budget - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.log: BinaryIO | None = None
+        self.log_path: str | None = None
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        if self.log:
+            self.log.write(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        self.tail += data
+        if len(self.tail) > self.tail_limit:
+            if self.log is None:
+                self._spill()
+            del self.tail[: len(self.tail) - self.tail_limit]
+
+    def _spill(self) -> None:
+        import tempfile
+
+        log_dir = os.path.join(_state_dir(), "logs")
+        try:
+            _make_state_dirs(log_dir)
+            fd, self.log_path = tempfile.mkstemp(prefix="check-", suffix=".log", dir=log_dir)
+        except OSError:
+            return
+        self.log = os.fdopen(fd, "wb")
+        self.log.write(self.head)
+        self.log.write(self.tail)
+
+    def close(self) -> None:
+        if self.log:
+            self.log.close()
+
+    def getvalue(self) -> str:
+        head = self.head.decode(errors="replace")
+        tail = self.tail.decode(errors="replace")
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return head + tail
+        location = f"full log: {self.log_path}" if self.log_path else "full log unavailable"
+        return f"{head}\n… {omitted} bytes omitted ({location}) …\n{tail}"
+
+
+def _run_command(
+    command: str,
+    cwd: str,
+    timeout: float | None = None,
+    output_budget: int = DEFAULT_OUTPUT_BUDGET_BYTES,
+    request_processes: _RequestProcesses | None = None,
+) -> tuple[int, str, bool, int]:
+    """Run a shell command in its own process group.
+
+    Returns its exit code, combined output, whether it was killed for
+    exceeding ``timeout`` seconds and its peak RSS in KiB. Output produced
+    before the kill is kept; output beyond ``output_budget`` bytes is
+    trimmed to its head and tail. Inside the daemon the process is also
+    registered in ``request_processes``.
+    """
+    if timeout is not None and timeout <= 0:
+        return 1, "", True, 0
     process = subprocess.Popen(
         command,
         shell=True,
         cwd=cwd,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-        universal_newlines=True,
+        start_new_session=True,
     )
-    output_lines = []
-    if process.stdout:
-        for line in process.stdout:
-            output_lines.append(line)
-    process.wait()
-    output = "".join(output_lines)
-
-    if process.returncode == 0:
+    with _active_processes_lock:
+        _active_processes.add(process)
+    if request_processes is not None:
+        request_processes.add(process)
+    timed_out = threading.Event()
+
+    def expire() -> None:
+        timed_out.set()
+        _kill_process_group(process)
+
+    timer = threading.Timer(timeout, expire) if timeout is not None else None
+    capture = _OutputCapture(output_budget)
+    try:
+        if timer:
+            timer.start()
+        if process.stdout:
+            while chunk := process.stdout.read1(READ_CHUNK_BYTES):
+                capture.write(chunk)
+        # wait4 rather than wait() to get the command's own resource usage,
+        # which stays per-check even when checks run in parallel threads.
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        if timer:
+            timer.cancel()
+        capture.close()
+        with _active_processes_lock:
+            _active_processes.discard(process)
+        if request_processes is not None:
+            request_processes.discard(process)
+    return process.returncode, capture.getvalue(), timed_out.is_set(), _peak_rss_kb(usage)
+
+
+def _job_timeout(job: dict) -> float | None:
+    """Seconds a job's command may run: its own timeout capped by the hook deadline."""
+    limits = []
+    if job.get("timeout") is not None:
+        limits.append(job["timeout"])
+    if job.get("deadline") is not None:
+        limits.append(job["deadline"] - time.monotonic())
+    return min(limits) if limits else None
+
+
+def run_check(job: dict) -> dict:
+    """Run every command of a job in its directory and capture the output.
+
+    Placeholder expansion can split one check into several commands; those
+    touch disjoint files, so they run in parallel.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    commands = job["commands"]
+    # Split the output budget across batches so the whole check stays within it.
+    output_budget = max(
+        job.get("output_budget", DEFAULT_OUTPUT_BUDGET_BYTES) // len(commands), MIN_OUTPUT_BUDGET_BYTES
+    )
+
+    def run(command: str) -> tuple[int, str, bool, int]:
+        return _run_command(command, job["cwd"], _job_timeout(job), output_budget, job.get("request_processes"))
+
+    started = time.monotonic()
+    started_us = hook_trace.now_us()
+    if len(commands) == 1:
+        runs = [run(commands[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(commands), os.cpu_count() or 1)) as executor:
+            runs = list(executor.map(run, commands))
+    returncode = next((code for code, _, _, _ in runs if code != 0), 0)
+    output = "".join(output for _, output, _, _ in runs)
+    timed_out = any(expired for _, _, expired, _ in runs)
+    duration = time.monotonic() - started
+    if timed_out:
+        output += f"Timed out after {duration:.0f}s; killed the check's process group.\n"
+    return {
+        **job,
+        "returncode": returncode,
+        "output": output,
+        "timed_out": timed_out,
+        "duration": duration,
+        "peak_rss_kb": max(rss for _, _, _, rss in runs),
+        "started_us": started_us,
+        "thread_id": threading.get_native_id(),
+    }
+
+
+def check_name(check: dict) -> str:
+    """Name a check for ``needs`` references: its name, else its directory."""
+    return check.get("name") or check.get("directory") or "."
+
+
+def link_needs(jobs: list[dict], checks: list[dict]) -> None:
+    """Resolve each job's ``needs`` to the indices of the jobs it waits for.
+
+    Names are validated against every configured check. A needed check that
+    was not selected (nothing changed in it) does not hold its dependents
+    back. Raises ValueError on unknown names and dependency cycles.
+    """
+    graph: dict[str, set[str]] = {}
+    for check in checks:
+        needs = check.get("needs", [])
+        if isinstance(needs, str):
+            needs = [needs]
+        graph.setdefault(check_name(check), set()).update(needs)
+    for name, needs in graph.items():
+        unknown = needs - graph.keys()
+        if unknown:
+            raise ValueError(f"check {name!r} needs unknown check {sorted(unknown)[0]!r}")
+
+    visiting: set[str] = set()
+    done: set[str] = set()
+
+    def visit(name: str, path: list[str]) -> None:
+        if name in done:
+            return
+        if name in visiting:
+            cycle = [*path[path.index(name) :], name]
+            raise ValueError(f"dependency cycle: {' -> '.join(cycle)}")
+        visiting.add(name)
+        for need in sorted(graph[name]):
+            visit(need, [*path, name])
+        visiting.discard(name)
+        done.add(name)
+
+    for name in graph:
+        visit(name, [])
+
+    indices: dict[str, list[int]] = {}
+    for index, job in enumerate(jobs):
+        indices.setdefault(check_name(job["check"]), []).append(index)
+    for job in jobs:
+        job["needs"] = sorted({i for need in graph[check_name(job["check"])] for i in indices.get(need, [])})
+
+
+def run_checks(jobs: list[dict], max_parallel: int) -> Iterator[dict]:
+    """Run jobs on a bounded worker pool, honouring their ``needs``.
+
+    A job starts as soon as every job it needs has passed; if one of them
+    fails or is skipped, the job is skipped too. Results are yielded in job
+    order regardless of completion order, so the report stays stable while
+    independent checks overlap.
+    """
+    from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+    results: dict[int, dict] = {}
+    pending = list(range(len(jobs)))
+    running: dict[Future, int] = {}
+    next_to_yield = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(jobs)))) as executor:
+        while pending or running:
+            for index in list(pending):
+                needs = jobs[index].get("needs", [])
+                blocked = [i for i in needs if i in results and results[i]["returncode"] != 0]
+                if blocked:
+                    upstream = check_name(jobs[blocked[0]]["check"])
+                    results[index] = {**jobs[index], "returncode": None, "skipped": upstream, "duration": 0.0}
+                    pending.remove(index)
+                elif all(i in results for i in needs):
+                    running[executor.submit(run_check, jobs[index])] = index
+                    pending.remove(index)
+            while next_to_yield in results:
+                yield results[next_to_yield]
+                next_to_yield += 1
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+    while next_to_yield in results:
+        yield results[next_to_yield]
+        next_to_yield += 1
+
+
+def critical_path(results: list[dict]) -> tuple[list[str], float]:
+    """Return the chain of check names with the longest summed duration."""
+    finish: dict[int, tuple[float, list[int]]] = {}
+
+    def finish_of(index: int) -> tuple[float, list[int]]:
+        if index not in finish:
+            before = max((finish_of(i) for i in results[index].get("needs", [])), default=(0.0, []))
+            finish[index] = (before[0] + results[index].get("duration", 0.0), [*before[1], index])
+        return finish[index]
+
+    total, chain = max((finish_of(i) for i in range(len(results))), default=(0.0, []))
+    return [check_name(results[i]["check"]) for i in chain], total
+
+
+def _describe_job(job: dict) -> str:
+    commands = job["commands"]
+    if len(commands) == 1:
+        return f"Running `{commands[0]}` in {job['cwd']}"
+    return f"Running `{job['command']}` in {job['cwd']} ({len(job['files'])} files, {len(commands)} batches)"
+
+
+# Lines run_check adds to a check's output about how it was captured.
+_OUTPUT_NOTE_RE = re.compile(
+    r"^(?:… \d+ bytes omitted \(full log[^)]*\) …|Timed out after \d+s; killed the check's process group\.)$",
+    re.MULTILINE,
+)
+
+
+def report_check(result: dict, action: str, runtime: str) -> tuple[bool, str]:
+    """Print one check's captured output. Returns (passed, failure feedback)."""
+    description = _describe_job(result)
+    if result.get("skipped"):
+        _emit(runtime, f"Skipping `{result['command']}`: needs `{result['skipped']}`, which did not pass")
+        return False, ""
+
+    output = result["output"]
+    _emit(runtime, description)
+
+    if result["returncode"] == 0:
         if output and runtime == RUNTIME_CLAUDE:
             print(output, end="")
         if action == "slow":
@@ -301,6 +2569,11 @@ def run_check(command: str, cwd: str, action: str, runtime: str) -> tuple[bool,
             _emit(runtime, "Fast check completed successfully.")
         return True, ""
     else:
+        summary = summarize_failure(output, result["check"].get("parser"))
+        if summary:
+            # Keep the timeout and truncated-output notes the summary would drop.
+            notes = "".join(f"{note}\n" for note in _OUTPUT_NOTE_RE.findall(output))
+            output = summary + notes
         if output and runtime == RUNTIME_CLAUDE:
             print(output, end="", file=sys.stderr)
         if action == "slow":
@@ -308,20 +2581,323 @@ def run_check(command: str, cwd: str, action: str, runtime: str) -> tuple[bool,
         else:
             _emit(runtime, "Fast check failed. You must fix the issues.", file=sys.stderr)
 
-        failure = f"Running `{command}` in {cwd}"
+        failure = description
         if output:
             failure = f"{failure}\n{output.rstrip()}"
         return False, failure
 
 
-def main() -> None:
+def _positive_float(value: object) -> float | None:
+    """Parse a positive number of seconds from config, or None if unset/invalid."""
+    if isinstance(value, bool) or not isinstance(value, int | float) or value <= 0:
+        return None
+    return float(value)
+
+
+def _output_budget(config: dict) -> int:
+    """Bytes of output kept in memory per check (head and tail combined)."""
+    budget = config.get("output_budget", DEFAULT_OUTPUT_BUDGET_BYTES)
+    if isinstance(budget, bool) or not isinstance(budget, int):
+        return DEFAULT_OUTPUT_BUDGET_BYTES
+    return max(budget, MIN_OUTPUT_BUDGET_BYTES)
+
+
+def _hook_deadline_s(config: dict, action: str) -> float:
+    """Seconds this hook may spend running checks before they are killed."""
+    return _positive_float(config.get(f"{action}_deadline")) or DEFAULT_DEADLINE_S[action]
+
+
+def _debounce_ms(config: dict) -> int:
+    """Read fast_debounce_ms from config, treating invalid values as disabled."""
+    try:
+        return max(0, int(config.get("fast_debounce_ms", 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _fast_budget_ms(config: dict) -> float:
+    """Per-edit latency budget for the adaptive fast throttle."""
+    return _positive_float(config.get("fast_budget_ms")) or DEFAULT_FAST_BUDGET_MS
+
+
+def _max_parallel(config: dict) -> int:
+    """Read max_parallel from config, treating missing/invalid values as serial."""
+    try:
+        return max(1, int(config.get("max_parallel", DEFAULT_MAX_PARALLEL)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_PARALLEL
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    """Text stream that writes to a per-thread buffer when one is installed.
+
+    The daemon serves requests concurrently, so each handler thread captures
+    its own stdout/stderr instead of sharing the process-wide streams.
+    """
+
+    def __init__(self, fallback: TextIO) -> None:
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def set_buffer(self, buffer: io.StringIO | None) -> None:
+        self._local.buffer = buffer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self._fallback).write(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buffer", None) is None:
+            self._fallback.flush()
+
+
+def _runtime_dir() -> str:
+    """Base directory of the state directory, per-user when XDG_RUNTIME_DIR is set."""
+    return os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+
+
+def _daemon_socket_path(project_dir: str) -> str:
+    """Return the Unix socket path of the hook daemon for a project, inside the private state directory."""
+    digest = hashlib.sha256(os.path.realpath(project_dir).encode()).hexdigest()[:16]
+    return os.path.join(_state_dir(), f"daemon-{digest}.sock")
+
+
+def _is_own_socket(socket_path: str) -> bool:
+    """Whether socket_path is a socket owned by this user, so hook input is never sent to another user's."""
+    try:
+        st = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+def _forward_to_daemon(socket_path: str, request: dict) -> dict | None:
+    """Send a hook invocation to a running daemon.
+
+    Returns the daemon's response, or None when no daemon is reachable so the
+    caller can fall back to running in-process.
+    """
+    if not _is_own_socket(socket_path):
+        return None
+    import socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as reader:
+                data = reader.read()
+        response = json.loads(data)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(response, dict) or not isinstance(response.get("code"), int):
+        return None
+    return response
+
+
+def _daemon_is_running(socket_path: str) -> bool:
+    """Return True when something is accepting connections on socket_path."""
+    import socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+    except OSError:
+        return False
+    return True
+
+
+def _serve_socket(
+    socket_path: str,
+    project_dir: str,
+    stdout: _ThreadLocalStream,
+    stderr: _ThreadLocalStream,
+    idle_timeout: float,
+) -> None:
+    """Serve requests on socket_path until idle; socketserver is only imported by the daemon."""
+    import socketserver
+
+    class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+        """Threaded Unix socket server that keeps hook state across requests."""
+
+        daemon_threads = True
+
+        def __init__(
+            self,
+            socket_path: str,
+            project_dir: str,
+            stdout: _ThreadLocalStream,
+            stderr: _ThreadLocalStream,
+        ) -> None:
+            super().__init__(socket_path, _DaemonHandler)
+            self.project_dir = os.path.realpath(project_dir)
+            self.stdout = stdout
+            self.stderr = stderr
+            self.last_request = time.monotonic()
+            self.active_requests = 0
+            self._activity_lock = threading.Lock()
+
+        def is_idle(self, idle_timeout: float) -> bool:
+            with self._activity_lock:
+                return self.active_requests == 0 and time.monotonic() - self.last_request >= idle_timeout
+
+        def dispatch(self, request: dict, request_processes: _RequestProcesses) -> dict:
+            project_dir = request.get("project_dir")
+            if not isinstance(project_dir, str) or os.path.realpath(project_dir) != self.project_dir:
+                return {"code": None}
+
+            with self._activity_lock:
+                self.active_requests += 1
+            stdout, stderr = io.StringIO(), io.StringIO()
+            self.stdout.set_buffer(stdout)
+            self.stderr.set_buffer(stderr)
+            code = SUCCESS_CODE
+            try:
+                argv = request.get("argv", [])
+                stdin_data = request.get("stdin", "")
+                args = _build_parser().parse_args(argv)
+                if args.action == "serve":
+                    raise SystemExit(BLOCKING_ERROR_CODE)
+                hook_input = _parse_hook_input(stdin_data)
+                trace_path = request.get("trace")
+                with hook_trace.trace(
+                    trace_path if isinstance(trace_path, str) else None,
+                    "ox-hooks daemon",
+                    action=args.action,
+                    **hook_trace.hook_ids(hook_input),
+                ):
+                    run_hook(
+                        args,
+                        hook_input,
+                        project_dir,
+                        argv=argv,
+                        stdin_data=stdin_data,
+                        request_processes=request_processes,
+                    )
+            except SystemExit as e:
+                if e.code is None:
+                    code = SUCCESS_CODE
+                else:
+                    code = e.code if isinstance(e.code, int) else BLOCKING_ERROR_CODE
+            except Exception:
+                import traceback
+
+                traceback.print_exc()
+                code = BLOCKING_ERROR_CODE
+            finally:
+                self.stdout.set_buffer(None)
+                self.stderr.set_buffer(None)
+                with self._activity_lock:
+                    self.active_requests -= 1
+                    self.last_request = time.monotonic()
+            return {"code": code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+    class _DaemonHandler(socketserver.StreamRequestHandler):
+        """Run one forwarded hook invocation and reply with its exit code and output."""
+
+        server: _DaemonServer
+
+        def handle(self) -> None:
+            try:
+                request = json.loads(self.rfile.readline())
+            except json.JSONDecodeError:
+                return
+            request_processes = _RequestProcesses()
+            done = threading.Event()
+            threading.Thread(target=self._watch_client, args=(request_processes, done), daemon=True).start()
+            try:
+                response = self.server.dispatch(request, request_processes)
+            finally:
+                done.set()
+            with contextlib.suppress(OSError):
+                self.wfile.write(json.dumps(response).encode())
+
+        def _watch_client(self, request_processes: _RequestProcesses, done: threading.Event) -> None:
+            """Kill the request's checks once the hook process on the other end has exited."""
+            import select
+
+            # The client only shuts down its write side, so POLLHUP means it closed the socket.
+            poller = select.poll()
+            poller.register(self.connection, select.POLLHUP)
+            while not done.is_set():
+                if poller.poll(100):
+                    request_processes.kill_all()
+                    return
+
+    old_umask = os.umask(0o077)
+    try:
+        server = _DaemonServer(socket_path, project_dir, stdout, stderr)
+    finally:
+        os.umask(old_umask)
+
+    def shutdown_when_idle() -> None:
+        while not server.is_idle(idle_timeout):
+            time.sleep(min(1.0, idle_timeout))
+        server.shutdown()
+
+    threading.Thread(target=shutdown_when_idle, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        with contextlib.suppress(OSError):
+            os.remove(socket_path)
+
+
+def serve(project_dir: str, idle_timeout: float, *, watch: bool = False) -> int:
+    """Serve hook invocations for one project over a Unix socket.
+
+    Config, throttle counters and other per-session state stay in memory
+    between requests. With ``watch``, changed files come from an inotify
+    watcher instead of a full git status per request. The daemon exits after
+    ``idle_timeout`` seconds without requests.
+    """
+    global _daemon_sessions, _change_watcher
+
+    socket_path = _daemon_socket_path(project_dir)
+    try:
+        _make_state_dirs(os.path.dirname(socket_path))
+    except OSError as e:
+        print(f"ox-hooks daemon cannot use {os.path.dirname(socket_path)}: {e}", file=sys.stderr)
+        return BLOCKING_ERROR_CODE
+    if os.path.exists(socket_path):
+        if _daemon_is_running(socket_path):
+            print(f"ox-hooks daemon already running on {socket_path}", file=sys.stderr)
+            return BLOCKING_ERROR_CODE
+        with contextlib.suppress(OSError):
+            os.remove(socket_path)
+
+    _daemon_sessions = {}
+    if watch:
+        try:
+            _change_watcher = _ChangeWatcher(project_dir)
+        except (OSError, AttributeError) as e:
+            print(f"inotify watcher unavailable ({e}), using git status", file=sys.stderr)
+        else:
+            threading.Thread(target=_change_watcher.run, daemon=True).start()
+    stdout = _ThreadLocalStream(sys.stdout)
+    stderr = _ThreadLocalStream(sys.stderr)
+    sys.stdout = stdout
+    sys.stderr = stderr
+
+    signal.signal(signal.SIGTERM, _kill_active_process_groups)
+    print(f"ox-hooks daemon serving {project_dir} on {socket_path}", file=sys.stderr)
+    _serve_socket(socket_path, project_dir, stdout, stderr, idle_timeout)
+    return SUCCESS_CODE
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Run fast/slow checks when files change")
     parser.add_argument("--project-dir", help="Project root directory")
     parser.add_argument(
         "--action",
         required=True,
-        choices=["fast", "slow"],
-        help="Action to run",
+        choices=["fast", "slow", "serve", "stats"],
+        help="Action to run (serve starts the per-project hook daemon, stats reports check timings)",
     )
     parser.add_argument(
         "--runtime",
@@ -329,91 +2905,414 @@ def main() -> None:
         choices=[RUNTIME_CLAUDE, RUNTIME_CODEX],
         help="Hook runtime output semantics",
     )
-    args = parser.parse_args()
+    parser.add_argument("--trailing-edit", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--background", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=DEFAULT_DAEMON_IDLE_TIMEOUT_S,
+        help="Seconds without requests before the daemon exits (serve only)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Track changed files with inotify instead of running git status per hook (serve only, Linux)",
+    )
+    return parser
 
-    # Read hook input from stdin before resolving Codex's project directory.
-    hook_input = None
-    session_id = ""
+
+def _parse_hook_input(stdin_data: str) -> dict | None:
+    """Parse hook JSON from stdin. Returns None when missing or malformed."""
     try:
-        stdin_data = sys.stdin.read()
         if stdin_data:
             parsed_input = json.loads(stdin_data)
             if isinstance(parsed_input, dict):
-                hook_input = parsed_input
-                session_id = hook_input.get("session_id", "")
+                return parsed_input
     except (json.JSONDecodeError, Exception):
         pass
+    return None
+
 
+def _resolve_project_dir(args: argparse.Namespace, hook_input: dict | None) -> str | None:
     project_dir = args.project_dir
     if not project_dir and args.runtime == RUNTIME_CODEX:
         project_dir = _codex_project_dir(hook_input)
+    return project_dir
+
+
+def main(argv: list[str] | None = None, stdin_data: str | None = None) -> None:
+    """Run the script; ox_hook.py passes the arguments and the stdin it already read."""
+    argv = sys.argv[1:] if argv is None else argv
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    # Read hook input from stdin before resolving Codex's project directory.
+    if stdin_data is None:
+        stdin_data = ""
+        if args.action not in ("serve", "stats"):
+            with contextlib.suppress(Exception):
+                stdin_data = sys.stdin.read()
+    hook_input = _parse_hook_input(stdin_data)
+
+    if args.action == "stats":
+        records = list(_read_ledger(os.path.realpath(args.project_dir or os.getcwd())))
+        if not records:
+            print("No hook runs recorded for this project yet")
+            sys.exit(SUCCESS_CODE)
+        print(format_stats(records), end="")
+        sys.exit(SUCCESS_CODE)
+
+    project_dir = _resolve_project_dir(args, hook_input)
     if not project_dir:
         parser.error("--project-dir is required unless --runtime codex can derive cwd")
 
+    if args.action == "serve":
+        sys.exit(serve(project_dir, args.idle_timeout, watch=args.watch))
+
+    signal.signal(signal.SIGTERM, _kill_active_process_groups)
+    with hook_trace.trace(
+        os.environ.get(hook_trace.TRACE_ENV),
+        f"run_if_changed.py --action {args.action}",
+        action=args.action,
+        **hook_trace.hook_ids(hook_input),
+    ):
+        with hook_trace.span("forward to daemon"):
+            response = _forward_to_daemon(
+                _daemon_socket_path(project_dir),
+                {"argv": argv, "stdin": stdin_data, "project_dir": project_dir, "trace": hook_trace.active_path()},
+            )
+        if response is not None:
+            sys.stdout.write(response["stdout"])
+            sys.stderr.write(response["stderr"])
+            sys.exit(response["code"])
+
+        run_hook(args, hook_input, project_dir, argv=argv, stdin_data=stdin_data)
+
+
+def _ledger_check(result: dict) -> dict:
+    """The timing ledger's view of one check result."""
+    return {
+        "check": check_name(result["check"]),
+        "directory": result["check"].get("directory"),
+        "duration": round(result["duration"], 4),
+        "exit_code": result["returncode"],
+        "timed_out": result.get("timed_out", False),
+        "skipped": "needs" if result.get("skipped") else None,
+        "peak_rss_kb": result.get("peak_rss_kb", 0),
+    }
+
+
+def _select_jobs(
+    args: argparse.Namespace,
+    config: dict,
+    hook_input: dict | None,
+    project_dir: str,
+) -> list[dict] | None:
+    """Build the jobs for this action. Returns None when nothing has changed."""
+    edited_file = _edited_file(hook_input, project_dir) if args.action == "fast" else None
+    session_id = hook_input.get("session_id", "") if hook_input else ""
+    # Include files whose edits were throttled or debounced since the last run.
+    edited_files = {edited_file, *(_take_pending_edits(session_id) if session_id else ())} if edited_file else set()
+    edited_files = drop_ignored_files(project_dir, edited_files)
+    if edited_file and config.get("fast_scope", FAST_SCOPE_EDITED) == FAST_SCOPE_EDITED:
+        # The hook input already names the edited files; skip git status.
+        changed_files = edited_files
+    else:
+        changed_files = get_changed_files(project_dir)
+    if not changed_files:
+        return None
+
+    # Placeholders are filled from the files edited since the last run on
+    # PostToolUse, and from the full change set otherwise.
+    placeholder_files = edited_files if edited_file else changed_files
+
+    checks = config.get("checks", [])
+    matcher = _check_matcher(checks)
+    changed_matches = match_checks(matcher, changed_files)
+    placeholder_matches = (
+        changed_matches if placeholder_files is changed_files else match_checks(matcher, placeholder_files)
+    )
+
+    jobs: list[dict] = []
+    for index, check in enumerate(checks):
+        command = check.get(args.action)
+        if not command:
+            continue
+
+        directory = check.get("directory")
+
+        if index not in changed_matches:
+            if check.get("paths") or check.get("exclude"):
+                _emit(args.runtime, f"No files matching `{check_name(check)}` modified, skipping")
+            elif directory:
+                _emit(args.runtime, f"No {directory}/ files modified, skipping")
+            continue
+        # Checks without a directory run at the project root.
+        cwd = os.path.join(project_dir, directory) if directory else project_dir
+
+        if TESTS_PLACEHOLDER in command:
+            prefix = f"{directory}/" if directory else ""
+            with hook_trace.span("impact analysis", check=check_name(check)):
+                tests = affected_tests(cwd, [path[len(prefix) :] for path in changed_matches[index]])
+            if tests == []:
+                _emit(args.runtime, f"No tests affected by the change, skipping `{command}`")
+                continue
+            if tests is None:
+                _emit(args.runtime, f"Impact analysis unavailable for `{command}`, running the full suite")
+            else:
+                _emit(args.runtime, f"Impact analysis selected {len(tests)} test file(s) for `{command}`")
+            command = _expand_tests(command, tests)
+
+        files: list[str] = []
+        if _uses_file_placeholders(command):
+            files = scoped_files(set(placeholder_matches.get(index, [])), directory, project_dir)
+            if not files:
+                _emit(args.runtime, f"No existing files to pass to `{command}`, skipping")
+                continue
+
+        jobs.append(
+            {
+                "check": check,
+                "command": command,
+                "cwd": cwd,
+                "files": files,
+                "commands": expand_command(command, files),
+                "timeout": _positive_float(check.get("timeout")),
+                "output_budget": _output_budget(config),
+            }
+        )
+    return jobs
+
+
+def run_hook(
+    args: argparse.Namespace,
+    hook_input: dict | None,
+    project_dir: str,
+    *,
+    argv: list[str],
+    stdin_data: str,
+    request_processes: _RequestProcesses | None = None,
+) -> None:
+    """Run the fast or slow action for one hook invocation. Always exits.
+
+    ``argv`` and ``stdin_data`` are the raw invocation, used to re-launch the
+    hook in the background for trailing debounce and async fast checks.
+    ``request_processes`` collects the check processes of a daemon request.
+    Every invocation in a configured project is appended to the timing ledger.
+    """
+    started = time.monotonic()
+    ledger: dict = {
+        "ts": round(time.time(), 3),
+        "project": os.path.realpath(project_dir),
+        "session": hook_input.get("session_id", "") if hook_input else "",
+        "action": args.action,
+        "background": args.background or args.trailing_edit is not None,
+        "skipped": None,
+        "exit_code": None,
+        "checks": [],
+    }
+    try:
+        _run_hook(
+            args,
+            hook_input,
+            project_dir,
+            ledger,
+            argv=argv,
+            stdin_data=stdin_data,
+            request_processes=request_processes,
+        )
+    except SystemExit as e:
+        ledger["exit_code"] = e.code
+        raise
+    finally:
+        if ledger["skipped"] != "no-config":
+            ledger["duration"] = round(time.monotonic() - started, 4)
+            # The daemon's own peak RSS says nothing about this request.
+            if _daemon_sessions is None:
+                ledger["peak_rss_kb"] = _peak_rss_kb(resource.getrusage(resource.RUSAGE_SELF))
+            _append_ledger(ledger)
+
+
+def _run_hook(
+    args: argparse.Namespace,
+    hook_input: dict | None,
+    project_dir: str,
+    ledger: dict,
+    *,
+    argv: list[str],
+    stdin_data: str,
+    request_processes: _RequestProcesses | None,
+) -> None:
+    """Body of run_hook; records skip reasons and check results in ``ledger``."""
+    hook_started = time.monotonic()
+    session_id = hook_input.get("session_id", "") if hook_input else ""
+    # Detached runs record their result in the session state for the next
+    # hook invocation to report.
+    detached = args.background or args.trailing_edit is not None
+
     # Read config
     config_file = os.path.join(project_dir, CONFIG_PATH)
-    if not os.path.exists(config_file):
+    with hook_trace.span("load config"):
+        config = _load_config(config_file)
+    if config is None:
+        ledger["skipped"] = "no-config"
         _emit(args.runtime, f"No {CONFIG_PATH} found, skipping")
         sys.exit(SUCCESS_CODE)
 
-    with open(config_file) as f:
-        config = json.load(f)
-
     checks = config.get("checks", [])
     if not checks:
+        ledger["skipped"] = "no-checks"
         _emit(args.runtime, f"No checks configured in {CONFIG_PATH}, skipping")
         sys.exit(SUCCESS_CODE)
 
     if hook_input and hook_input.get("permission_mode") == "plan":
+        ledger["skipped"] = "plan-mode"
         _emit(args.runtime, "Plan mode active, skipping")
         sys.exit(SUCCESS_CODE)
     if hook_input and args.action == "slow" and _is_team_lead_session(session_id):
+        ledger["skipped"] = "team-lead"
         _emit(args.runtime, "Agent team lead session, skipping stop checks")
         sys.exit(SUCCESS_CODE)
 
-    # Skip fast checks for import-only edits
-    if args.action == "fast" and hook_input and is_import_only_edit(hook_input):
-        _emit(args.runtime, "Import-only edit detected, skipping fast check")
+    # Report failures of fast checks that finished in the background since
+    # the last hook. Stop waits for a still-running one first.
+    background_failures: list[str] = []
+    if session_id and not detached:
+        wait_s = BACKGROUND_WAIT_S if args.action == "slow" else 0
+        background_failures = _collect_background_result(session_id, wait_s)
+        if background_failures and args.action == "fast":
+            _report_background_failures(args.runtime, background_failures)
+            sys.exit(BLOCKING_ERROR_CODE)
+
+    # Skip fast checks for import-, whitespace- and comment-only edits
+    trivial_kind = None
+    if args.action == "fast" and hook_input:
+        with hook_trace.span("classify edit"):
+            trivial_kind = classify_trivial_edit(hook_input)
+    if trivial_kind and not args.background:
+        if session_id:
+            _record_trivial_skip(session_id, trivial_kind)
+        ledger["skipped"] = f"{trivial_kind}-only"
+        _emit(args.runtime, f"{trivial_kind.capitalize()}-only edit detected, skipping fast check")
         sys.exit(SUCCESS_CODE)
 
-    # Throttle fast checks — only run every Nth edit
-    if args.action == "fast" and session_id:
+    if args.background:
+        pass
+    elif args.trailing_edit is not None:
+        # Trailing debounce run: wait out the window, then run only if no
+        # newer edit has been recorded in the meantime.
+        time.sleep(_debounce_ms(config) / 1000)
+        if _load_session_state(session_id).get("edit_count") != args.trailing_edit:
+            ledger["skipped"] = "superseded"
+            sys.exit(SUCCESS_CODE)
+        hook_started = time.monotonic()
+        _emit(args.runtime, f"Edit burst ended after edit {args.trailing_edit}, running trailing fast check")
+    elif args.action == "fast" and session_id and "fast_debounce_ms" in config:
+        # Debounce fast checks — coalesce bursts of edits
+        debounce_ms = _debounce_ms(config)
+        now_ms = time.time_ns() // 1_000_000
+        edit_count, last_edit_ms = _record_edit(session_id, now_ms, _edited_file(hook_input, project_dir))
+        if should_skip_debounced(now_ms, last_edit_ms, debounce_ms):
+            _spawn_detached(argv, stdin_data, ["--trailing-edit", str(edit_count)])
+            ledger["skipped"] = "debounced"
+            _emit(
+                args.runtime, f"Debounced: edit {edit_count} within {debounce_ms}ms of the last, deferring fast check"
+            )
+            sys.exit(SUCCESS_CODE)
+    elif args.action == "fast" and session_id and config.get("fast_every") == FAST_EVERY_AUTO:
+        # Adaptive throttle — spread the measured check cost over enough edits
+        # to stay within the per-edit latency budget
+        budget_ms = _fast_budget_ms(config)
+        cost_ms = _load_fast_cost_ms(project_dir)
+        fast_every = adaptive_fast_every(cost_ms, budget_ms)
+        edit_count, skip = _record_adaptive_edit(session_id, fast_every, _edited_file(hook_input, project_dir))
+        if skip:
+            ledger["skipped"] = "throttled"
+            _emit(
+                args.runtime,
+                f"Throttled: edit {edit_count} (runs every {fast_every} for ~{cost_ms:.0f}ms checks "
+                f"within a {budget_ms:.0f}ms budget), skipping fast check",
+            )
+            sys.exit(SUCCESS_CODE)
+    elif args.action == "fast" and session_id:
+        # Throttle fast checks — only run every Nth edit
         fast_every = config.get("fast_every", DEFAULT_FAST_EVERY)
-        state_file = _get_state_file_path(session_id)
-        edit_count = _load_edit_count(state_file) + 1
-        _save_edit_count(state_file, edit_count)
-        if should_skip_throttled(edit_count, fast_every):
+        edit_count, _ = _record_edit(session_id, time.time_ns() // 1_000_000, _edited_file(hook_input, project_dir))
+        # Without stored state every edit would count as the first; run instead.
+        if edit_count is not None and should_skip_throttled(edit_count, fast_every):
+            ledger["skipped"] = "throttled"
             _emit(args.runtime, f"Throttled: edit {edit_count} (runs every {fast_every}), skipping fast check")
             sys.exit(SUCCESS_CODE)
 
-    changed_files = get_changed_files(project_dir)
-    if not changed_files:
+    # Async fast checks — hand off to a detached run and return immediately
+    if args.action == "fast" and session_id and not detached and config.get("fast_async"):
+        _start_background_check(session_id, argv, stdin_data)
+        ledger["skipped"] = "backgrounded"
+        _emit(args.runtime, "Fast check started in background; failures are reported on the next hook")
+        sys.exit(SUCCESS_CODE)
+
+    try:
+        jobs = _select_jobs(args, config, hook_input, project_dir)
+    except ValueError as e:
+        print(f"Invalid check scope in {CONFIG_PATH}: {e}", file=sys.stderr)
+        sys.exit(BLOCKING_ERROR_CODE)
+    if jobs is None and not background_failures:
+        if detached:
+            _record_background_result(session_id, [])
+        ledger["skipped"] = "no-changes"
         _emit(args.runtime, "No files changed, skipping")
         sys.exit(SUCCESS_CODE)
 
     any_failed = False
     failure_outputs = []
 
-    for check in checks:
-        command = check.get(args.action)
-        if not command:
-            continue
-
-        directory = check.get("directory")
+    if background_failures:
+        _report_background_failures(args.runtime, background_failures)
+        any_failed = True
+        failure_outputs.extend(background_failures)
 
-        if directory:
-            if not directory_has_changes(changed_files, directory):
-                _emit(args.runtime, f"No {directory}/ files modified, skipping")
-                continue
-            cwd = os.path.join(project_dir, directory)
-        else:
-            # Whole-project check — run at project root on any change
-            cwd = project_dir
+    jobs = jobs or []
+    try:
+        link_needs(jobs, checks)
+    except ValueError as e:
+        print(f"Invalid `needs` in {CONFIG_PATH}: {e}", file=sys.stderr)
+        sys.exit(BLOCKING_ERROR_CODE)
 
-        passed, failure_output = run_check(command, cwd, args.action, args.runtime)
+    deadline = hook_started + _hook_deadline_s(config, args.action)
+    for job in jobs:
+        job["deadline"] = deadline
+        job["request_processes"] = request_processes
+    results = []
+    checks_started = time.monotonic()
+    for result in run_checks(jobs, _max_parallel(config)):
+        results.append(result)
+        ledger["checks"].append(_ledger_check(result))
+        if "started_us" in result:
+            hook_trace.add_span(
+                f"check {check_name(result['check'])}",
+                result["started_us"],
+                result["started_us"] + round(result["duration"] * 1_000_000),
+                tid=result["thread_id"],
+                command=result["command"],
+                exit_code=result["returncode"],
+                timed_out=result["timed_out"],
+            )
+        passed, failure_output = report_check(result, args.action, args.runtime)
         if not passed:
             any_failed = True
-            failure_outputs.append(failure_output)
+            if failure_output:
+                failure_outputs.append(failure_output)
+
+    if args.action == "fast" and jobs and config.get("fast_every") == FAST_EVERY_AUTO:
+        _record_fast_cost(project_dir, (time.monotonic() - checks_started) * 1000)
+
+    if any(job["needs"] for job in jobs):
+        chain, seconds = critical_path(results)
+        _emit(args.runtime, f"Critical path: {' -> '.join(chain)} ({seconds:.1f}s)")
+
+    if detached:
+        _record_background_result(session_id, failure_outputs)
+        sys.exit(SUCCESS_CODE)
 
     if any_failed:
         if args.runtime == RUNTIME_CODEX:
@@ -422,11 +3321,15 @@ def main() -> None:
 
     if args.action == "slow" and not any_failed:
         _emit(args.runtime, "All checks passed. Stop working.")
+        trivial_skips = _format_trivial_skips(session_id) if session_id else None
+        if trivial_skips:
+            _emit(args.runtime, trivial_skips)
 
-    # Clean up throttle state file after slow checks
+    # Clean up session state after slow checks
     if args.action == "slow" and session_id:
-        with contextlib.suppress(OSError):
-            os.remove(_get_state_file_path(session_id))
+        _clear_session_state(session_id)
+    if args.action == "slow":
+        _prune_session_states()
 
     sys.exit(SUCCESS_CODE)
 
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Benchmark ox hook latency on synthetic repositories.
+
+Every scenario runs a hook script as Claude Code does: a fresh interpreter
+reading the hook input from stdin, so startup and import costs are included.
+Timings are compared against a committed baseline, scaled by the measured
+interpreter startup so slower machines do not report false regressions.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "plugins" / "ox" / "scripts"
+BASELINE_PATH = Path(__file__).resolve().parent / "bench_hooks_baseline.json"
+DEFAULT_REPEAT = 7
+# A scenario regresses when it is both this much slower relative to the
+# baseline and slower by at least MIN_REGRESSION_MS.
+REGRESSION_TOLERANCE = 0.5
+MIN_REGRESSION_MS = 25.0
+
+SCENARIOS = [
+    {"name": "fast-small", "action": "fast", "files": 50, "checks": 1, "changed": 1},
+    {"name": "fast-large", "action": "fast", "files": 2000, "checks": 10, "changed": 20},
+    {"name": "slow-small", "action": "slow", "files": 50, "checks": 1, "changed": 1},
+    {"name": "slow-large", "action": "slow", "files": 2000, "checks": 10, "changed": 20},
+    # Trivial-edit classification of a 5k-line Python edit at its start, its
+    # end and inside its last function.
+    {"name": "classify-import-top", "action": "fast", "files": 50, "checks": 1, "changed": 1, "edit": "import-top"},
+    {"name": "classify-import-end", "action": "fast", "files": 50, "checks": 1, "changed": 1, "edit": "import-end"},
+    {"name": "classify-last-function", "action": "fast", "files": 50, "checks": 1, "changed": 1, "edit": "last-def"},
+    {"name": "ban-redundant-cd", "tool": "Bash"},
+    {"name": "ban-lint-suppressions", "tool": "Edit"},
+]
+
+
+def make_repo(root: Path, files: int, checks: int, changed: int) -> None:
+    """Create a git repo with `files` modules spread over `checks` packages, `changed` of them modified."""
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    for i in range(files):
+        path = root / f"pkg{i % checks}" / f"mod{i}.py"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"VALUE_{i} = {i}\n")
+    config = {
+        "fast_every": 1,
+        "checks": [{"directory": f"pkg{j}", "fast": "true", "slow": "true"} for j in range(checks)],
+    }
+    (root / ".claude").mkdir()
+    (root / ".claude" / "ox-hooks.json").write_text(json.dumps(config))
+    subprocess.run(["git", "add", "."], cwd=root, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "init"],
+        cwd=root,
+        check=True,
+    )
+    for i in range(changed):
+        with (root / f"pkg{i % checks}" / f"mod{i}.py").open("a") as f:
+            f.write(f"CHANGED_{i} = True\n")
+
+
+def large_edit(kind: str) -> tuple[str, str]:
+    """A 5k-line Python module before and after an edit of the given kind."""
+    header = "import os\n"
+    old = header + "".join(f"def f{i}(a, b):\n    return a + b * {i}\n\n" for i in range(1700))
+    if kind == "import-top":
+        return old, header + "import sys\n" + old[len(header) :]
+    if kind == "import-end":
+        return old, old + "import sys\n"
+    # An import added inside the last function.
+    return old, old.replace("    return a + b * 1699\n", "    import sys\n    return a + b * 1699\n")
+
+
+def hook_input(scenario: dict, root: Path) -> dict:
+    """Build the stdin payload for one invocation; every run gets its own session."""
+    payload: dict = {"session_id": f"bench-{uuid.uuid4().hex}", "cwd": str(root)}
+    if "edit" in scenario:
+        old, new = large_edit(scenario["edit"])
+        payload |= {
+            "tool_name": "Edit",
+            "tool_input": {"file_path": str(root / "pkg0" / "mod0.py"), "old_string": old, "new_string": new},
+        }
+    elif scenario.get("tool") == "Bash":
+        payload |= {"tool_name": "Bash", "tool_input": {"command": "git status"}}
+    elif scenario.get("action") == "fast" or scenario.get("tool") == "Edit":
+        payload |= {
+            "tool_name": "Edit",
+            "tool_input": {"file_path": str(root / "pkg0" / "mod0.py"), "old_string": "= 0", "new_string": "= 1"},
+        }
+    return payload
+
+
+def hook_env() -> dict[str, str]:
+    """Environment for hook runs; bytecode caching stays on as it is for real hooks."""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def time_command(command: list[str], stdins: list[str], cwd: Path, env: dict[str, str]) -> float:
+    """Median wall time of `command` in milliseconds, one run per stdin; the first run is a warm-up."""
+    samples = []
+    for stdin in stdins:
+        started = time.perf_counter()
+        subprocess.run(command, input=stdin, cwd=cwd, env=env, capture_output=True, text=True, check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples[1:])
+
+
+def run_scenario(scenario: dict, repeat: int) -> float:
+    with tempfile.TemporaryDirectory(prefix="ox-bench-") as tmp:
+        root = Path(tmp) / "repo"
+        root.mkdir()
+        env = {**hook_env(), "XDG_RUNTIME_DIR": tmp}
+        # Launch the way hooks.json does.
+        command = [sys.executable, "-S", str(SCRIPTS_DIR / "ox_hook.py")]
+        if "action" in scenario:
+            make_repo(root, scenario["files"], scenario["checks"], scenario["changed"])
+            event = "PostToolUse" if scenario["action"] == "fast" else "Stop"
+            command += ["--event", event, "--project-dir", str(root)]
+        else:
+            command += ["--event", "PreToolUse"]
+        stdins = [json.dumps(hook_input(scenario, root)) for _ in range(repeat + 1)]
+        return time_command(command, stdins, root, env)
+
+
+def measure(repeat: int, names: list[str] | None = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        startup = time_command([sys.executable, "-S", "-c", "pass"], [""] * (repeat + 1), Path(tmp), hook_env())
+    results = {"python_startup_ms": round(startup, 1), "scenarios": {}}
+    for scenario in SCENARIOS:
+        if names and scenario["name"] not in names:
+            continue
+        results["scenarios"][scenario["name"]] = round(run_scenario(scenario, repeat), 1)
+    return results
+
+
+def find_regressions(baseline: dict, current: dict) -> list[str]:
+    """Describe every scenario that is meaningfully slower than its startup-scaled baseline."""
+    scale = current["python_startup_ms"] / baseline["python_startup_ms"]
+    regressions = []
+    for name, ms in current["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        expected = baseline["scenarios"][name] * scale
+        if ms > expected * (1 + REGRESSION_TOLERANCE) and ms - expected >= MIN_REGRESSION_MS:
+            regressions.append(f"{name}: {ms:.1f}ms vs {expected:.1f}ms baseline ({ms / expected - 1:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ox hook latency")
+    parser.add_argument("--check", action="store_true", help="Fail if a scenario regressed against the baseline")
+    parser.add_argument("--update", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per scenario (median is kept)")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario (repeatable)")
+    args = parser.parse_args()
+
+    current = measure(args.repeat, args.scenario)
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else None
+    print(f"{'scenario':<24} {'median':>9} {'baseline':>9}")
+    print(f"{'python-startup':<24} {current['python_startup_ms']:>7.1f}ms", end="")
+    print(f" {baseline['python_startup_ms']:>7.1f}ms" if baseline else "")
+    for name, ms in current["scenarios"].items():
+        print(f"{name:<24} {ms:>7.1f}ms", end="")
+        print(f" {baseline['scenarios'][name]:>7.1f}ms" if baseline and name in baseline["scenarios"] else "")
+
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Wrote {BASELINE_PATH.name}")
+        return 0
+    if args.check:
+        if baseline is None:
+            print(f"Error: {BASELINE_PATH.name} is missing, run with --update", file=sys.stderr)
+            return 1
+        regressions = find_regressions(baseline, current)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@
 """Generate Codex-compatible skills from Claude Code SKILL.md files."""
 
 import argparse
+import fnmatch
 import json
 import re
 import shutil
@@ -17,6 +18,9 @@ CODEX_MARKETPLACE = REPO_ROOT / ".agents" / "plugins" / "marketplace.json"
 CLAUDE_MARKETPLACE = REPO_ROOT / ".claude-plugin" / "marketplace.json"
 DEFAULT_PLUGINS = "ox,oxgh"
 DEFAULT_OWNER = "oxidian"
+# Bytecode caches are neither copied into nor checked in generated plugins;
+# running hooks from a checkout writes them next to the scripts.
+IGNORED_PATTERNS = ("__pycache__", "*.pyc")
 
 TOOL_CALL_PATTERN = re.compile(
     r"You have the capability to call multiple tools in a single response\."
@@ -331,7 +335,7 @@ def generate_plugin_package(plugin_name: str, output_dir: Path = CODEX_PLUGINS_D
             shutil.copytree(
                 scripts_dir,
                 plugin_out / "scripts",
-                ignore=shutil.ignore_patterns("__pycache__", "*.pyc"),
+                ignore=shutil.ignore_patterns(*IGNORED_PATTERNS),
             )
 
     write_json(plugin_out / ".codex-plugin" / "plugin.json", codex_plugin_manifest(plugin_name))
@@ -376,8 +380,13 @@ def generate(plugins: list[str], *, include_plugins: bool = True) -> None:
             write_marketplace(plugins)
 
 
+def is_ignored(rel: Path) -> bool:
+    """Whether a path inside a generated tree matches IGNORED_PATTERNS."""
+    return any(fnmatch.fnmatch(part, pattern) for part in rel.parts for pattern in IGNORED_PATTERNS)
+
+
 def compare_tree(expected_root: Path, actual_root: Path, display_root: Path) -> list[str]:
-    """Compare a generated tree against the checked-in tree."""
+    """Compare a generated tree against the checked-in tree, skipping IGNORED_PATTERNS."""
     mismatches: list[str] = []
     if not expected_root.exists():
         return mismatches
@@ -400,6 +409,8 @@ def compare_tree(expected_root: Path, actual_root: Path, display_root: Path) ->
         if actual_file.is_dir():
             continue
         rel = actual_file.relative_to(actual_root)
+        if is_ignored(rel):
+            continue
         expected_file = expected_root / rel
         display = display_root / rel
         if not expected_file.exists():
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_user_dirs(tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point HOME and XDG_RUNTIME_DIR at fresh directories for every test.
+
+    Hooks spawned by the tests inherit them, so session state, the timing
+    ledger and team configs never touch (or depend on) the real ones. The
+    directories are kept apart from ``tmp_path``, which tests use as a git
+    project whose status the state files would otherwise show up in.
+    """
+    home = tmp_path_factory.mktemp("home")
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path_factory.mktemp("run")))
+    monkeypatch.delenv("XDG_STATE_HOME", raising=False)
+    return home
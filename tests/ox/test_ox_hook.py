@@ -0,0 +1,215 @@
+"""Tests for the ox_hook.py dispatcher, its tracing and hook startup import budgets."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+_scripts_dir = Path(__file__).parent.parent.parent / "plugins" / "ox" / "scripts"
+_dispatcher_path = _scripts_dir / "ox_hook.py"
+HOOK_SCRIPTS = {"run_if_changed", "ban_redundant_cd", "ban_lint_suppressions", "hook_trace"}
+
+# Modules only some hook runs need; importing them at startup costs every run.
+LAZY_MODULES = {
+    "ast",
+    "concurrent",
+    "logging",
+    "socket",
+    "socketserver",
+    "tempfile",
+    "traceback",
+    "typing",
+}
+# Cumulative import time of all modules besides the hook scripts themselves,
+# in microseconds, as reported by -X importtime. Roughly twice what a typical
+# machine measures.
+IMPORT_BUDGETS_US = {"PreToolUse": 50_000, "PostToolUse": 100_000}
+
+
+def _dispatch(
+    args: list[str],
+    payload: dict | str,
+    cwd: Path,
+    *,
+    flags: tuple[str, ...] = (),
+    trace: Path | None = None,
+) -> subprocess.CompletedProcess[str]:
+    env = {key: value for key, value in os.environ.items() if key != "OX_HOOKS_TRACE"}
+    if trace:
+        env["OX_HOOKS_TRACE"] = str(trace)
+    return subprocess.run(
+        [sys.executable, "-S", *flags, str(_dispatcher_path), *args],
+        input=payload if isinstance(payload, str) else json.dumps(payload),
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env=env,
+        check=False,
+    )
+
+
+def _trace_events(path: Path) -> list[dict]:
+    """Load a trace file, closing the array the hooks leave open."""
+    return json.loads(path.read_text().rstrip().rstrip(",") + "]")
+
+
+def _imports(stderr: str) -> dict[str, tuple[int, int]]:
+    """Parse -X importtime output into {module: (self_us, cumulative_us)}."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        imports[name.strip()] = (int(self_us), int(cumulative_us))
+    return imports
+
+
+def _edit(file_path: str, new_string: str) -> dict:
+    return {"tool_name": "Edit", "tool_input": {"file_path": file_path, "old_string": "", "new_string": new_string}}
+
+
+class TestDispatcher:
+    """Tests for routing hook events to the ox scripts."""
+
+    def test_bash_guard_blocks_redundant_cd(self, tmp_path: Path) -> None:
+        payload = {"tool_name": "Bash", "tool_input": {"command": "cd backend && ls"}, "cwd": "/repo/backend"}
+
+        result = _dispatch(["--event", "PreToolUse"], payload, tmp_path)
+
+        assert result.returncode == 2
+        assert "Remove the 'cd backend' prefix" in result.stderr
+
+    def test_suppression_guard_only_applies_to_python_files(self, tmp_path: Path) -> None:
+        blocked = _dispatch(["--event", "PreToolUse"], _edit("a.py", "x = 1  # noqa"), tmp_path)
+        allowed = _dispatch(["--event", "PreToolUse"], _edit("README.md", "Avoid `# noqa`."), tmp_path)
+
+        assert blocked.returncode == 2
+        assert "BLOCKED: Code contains '# noqa' comment" in blocked.stderr
+        assert allowed.returncode == 0, allowed.stderr
+
+    def test_invalid_json_is_reported(self, tmp_path: Path) -> None:
+        result = _dispatch(["--event", "PreToolUse"], "not json", tmp_path)
+
+        assert result.returncode == 1
+        assert "Invalid JSON input" in result.stderr
+
+    @pytest.mark.parametrize(
+        ("event", "payload"),
+        [
+            ("PreToolUse", {"tool_name": "Read", "tool_input": {"file_path": "a.py"}}),
+            ("PreToolUse", _edit("a.md", "text")),
+            ("PostToolUse", {"tool_name": "Bash", "tool_input": {"command": "ls"}}),
+        ],
+    )
+    def test_irrelevant_tool_calls_exit_before_importing_scripts(
+        self, tmp_path: Path, event: str, payload: dict
+    ) -> None:
+        result = _dispatch(
+            ["--event", event, "--project-dir", str(tmp_path)], payload, tmp_path, flags=("-X", "importtime")
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert not HOOK_SCRIPTS & _imports(result.stderr).keys()
+
+    @pytest.mark.parametrize(("event", "action"), [("PostToolUse", "fast"), ("Stop", "slow")])
+    def test_check_events_run_if_changed(self, tmp_path: Path, event: str, action: str) -> None:
+        (tmp_path / ".claude").mkdir()
+        (tmp_path / ".claude" / "ox-hooks.json").write_text(
+            json.dumps({"fast_every": 1, "checks": [{"fast": "echo fast-check", "slow": "echo slow-check"}]})
+        )
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        payload = {"session_id": "dispatch", **_edit(str(tmp_path / "a.py"), "x = 2")}
+
+        result = _dispatch(["--event", event, "--project-dir", str(tmp_path)], payload, tmp_path)
+
+        assert result.returncode == 0, result.stderr
+        assert f"{action}-check" in result.stdout
+
+    @pytest.mark.parametrize("args", [[], ["--event", "Notification"], ["--event", "Stop", "--verbose", "1"]])
+    def test_rejects_bad_arguments(self, tmp_path: Path, args: list[str]) -> None:
+        result = _dispatch(args, {}, tmp_path)
+
+        assert result.returncode == 2
+        assert "Usage: ox_hook.py" in result.stderr
+
+
+class TestTrace:
+    """Tests for OX_HOOKS_TRACE Chrome trace export."""
+
+    def test_post_tool_use_spans_cover_the_whole_hook(self, tmp_path: Path) -> None:
+        (tmp_path / ".claude").mkdir()
+        (tmp_path / ".claude" / "ox-hooks.json").write_text(
+            json.dumps({"fast_every": 1, "checks": [{"name": "fmt", "fast": "echo formatted"}]})
+        )
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        trace = tmp_path / "trace.json"
+        payload = {"session_id": "traced", "tool_use_id": "toolu_1", **_edit(str(tmp_path / "a.py"), "x = 2")}
+
+        result = _dispatch(["--event", "PostToolUse", "--project-dir", str(tmp_path)], payload, tmp_path, trace=trace)
+
+        assert result.returncode == 0, result.stderr
+        events = _trace_events(trace)
+        spans = {event["name"]: event for event in events if event["ph"] == "X"}
+        assert {"PostToolUse", "import run_if_changed", "load config", "classify edit", "check fmt"} <= spans.keys()
+        if sys.platform.startswith("linux"):
+            assert spans["interpreter start"]["ts"] <= spans["PostToolUse"]["ts"]
+        for span in spans.values():
+            assert span["args"]["session_id"] == "traced"
+            assert span["args"]["tool_use_id"] == "toolu_1"
+        hook = spans["PostToolUse"]
+        check = spans["check fmt"]
+        assert hook["ts"] <= check["ts"] <= check["ts"] + check["dur"] <= hook["ts"] + hook["dur"]
+        assert check["args"]["exit_code"] == 0
+
+    def test_hooks_append_to_one_trace(self, tmp_path: Path) -> None:
+        trace = tmp_path / "trace.json"
+        bash = {"tool_name": "Bash", "tool_input": {"command": "cd backend && ls"}, "cwd": "/repo/backend"}
+
+        blocked = _dispatch(["--event", "PreToolUse"], bash, tmp_path, trace=trace)
+        allowed = _dispatch(["--event", "PreToolUse"], _edit("a.py", "x = 1"), tmp_path, trace=trace)
+
+        assert blocked.returncode == 2
+        assert allowed.returncode == 0, allowed.stderr
+        assert trace.read_text().count("[") == 1
+        events = _trace_events(trace)
+        guards = [event for event in events if event["name"].startswith("ban_")]
+        assert [(event["name"], event["args"]["exit_code"]) for event in guards] == [
+            ("ban_redundant_cd", 2),
+            ("ban_lint_suppressions", 0),
+        ]
+        assert len({event["pid"] for event in events}) == 2
+
+    def test_unwritable_trace_does_not_fail_the_hook(self, tmp_path: Path) -> None:
+        payload = {"tool_name": "Bash", "tool_input": {"command": "ls"}}
+
+        result = _dispatch(["--event", "PreToolUse"], payload, tmp_path, trace=tmp_path / "missing" / "trace.json")
+
+        assert result.returncode == 0, result.stderr
+        assert not result.stderr
+
+
+class TestImportBudgets:
+    """Hook startup must not import modules it does not use."""
+
+    @pytest.mark.parametrize(
+        ("event", "payload", "script"),
+        [
+            ("PostToolUse", {"session_id": "budget", **_edit("a.py", "x = 1")}, "run_if_changed"),
+            ("PreToolUse", {"tool_name": "Bash", "tool_input": {"command": "ls"}}, "ban_redundant_cd"),
+            ("PreToolUse", _edit("a.py", "x = 1"), "ban_lint_suppressions"),
+        ],
+    )
+    def test_startup_imports_stay_within_budget(self, tmp_path: Path, event: str, payload: dict, script: str) -> None:
+        result = _dispatch(
+            ["--event", event, "--project-dir", str(tmp_path)], payload, tmp_path, flags=("-X", "importtime")
+        )
+
+        assert result.returncode == 0, result.stderr
+        imports = _imports(result.stderr)
+        assert script in imports
+        assert not LAZY_MODULES & imports.keys()
+        dependencies_us = sum(self_us for name, (self_us, _) in imports.items() if name not in HOOK_SCRIPTS)
+        assert dependencies_us < IMPORT_BUDGETS_US[event]
@@ -1,15 +1,30 @@
 """Tests for run_if_changed.py import detection logic."""
 
+import ast
+import contextlib
 import importlib.util
 import json
+import os
+import random
 import shlex
+import socket
 import subprocess
 import sys
+import threading
+import time
+import tokenize
+import uuid
+from collections.abc import Callable, Iterator
 from pathlib import Path
 from types import ModuleType
+from typing import TextIO
 
-# Load the module dynamically since it's not in a proper package
+import pytest
+
+# Load the module dynamically since it's not in a proper package; its
+# sibling hook_trace.py is imported from the scripts directory.
 _script_path = Path(__file__).parent.parent.parent / "plugins" / "ox" / "scripts" / "run_if_changed.py"
+sys.path.insert(0, str(_script_path.parent))
 _spec = importlib.util.spec_from_file_location("run_if_changed", _script_path)
 assert _spec is not None
 assert _spec.loader is not None
@@ -19,11 +34,11 @@ _spec.loader.exec_module(run_if_changed)
 
 _is_python_import_only = run_if_changed._is_python_import_only
 _is_js_import_only = run_if_changed._is_js_import_only
-is_import_only_edit = run_if_changed.is_import_only_edit
+_is_python_whitespace_only = run_if_changed._is_python_whitespace_only
+classify_trivial_edit = run_if_changed.classify_trivial_edit
 should_skip_throttled = run_if_changed.should_skip_throttled
+should_skip_debounced = run_if_changed.should_skip_debounced
 _get_state_file_path = run_if_changed._get_state_file_path
-_load_edit_count = run_if_changed._load_edit_count
-_save_edit_count = run_if_changed._save_edit_count
 
 
 def _command_for_script(script: Path) -> str:
@@ -133,8 +148,191 @@ class TestJsImportOnly:
         assert _is_js_import_only(old, new) is False
 
 
-class TestIsImportOnlyEdit:
-    """Tests for is_import_only_edit() routing logic."""
+# Tricky edits the line heuristics used to get wrong: (old, new, import-only?)
+_PY_IMPORT_CORPUS = [
+    (
+        "from x import (\n    A,  # keep\n)\ny = 1",
+        "from x import (\n    A,  # keep\n    # more\n    B,\n)\ny = 1",
+        True,
+    ),
+    ("from __future__ import annotations\n\nx = 1", "from __future__ import annotations\nimport os\n\nx = 1", True),
+    ("def f():\n    import os\n    return 1", "def f():\n    import os\n    import sys\n    return 1", True),
+    ("from x import (\n    A,", "from x import (\n    A,\n    B,", True),
+    ('s = """\nimport os\n"""', 's = """\nimport os\nimport sys\n"""', False),
+    ("x = 1  # import os", "x = 1  # import sys", False),
+    ("import os; x = 1", "import os, sys; x = 1", False),
+    ("mod = __import__('os')", "mod = __import__('sys')", False),
+    ("    A,\n", "    A,\n    B,\n", False),
+]
+_JS_IMPORT_CORPUS = [
+    ("import type { A } from './a'\nconst x = 1", "import type { A, B } from './a'\nconst x = 1", True),
+    ("import {\n  A, // c\n} from 'x';\nfoo()", "import {\n  A, // c\n  B,\n} from 'x';\nfoo()", True),
+    ("export * from './b'\nx()", "export * as c from './c'\nexport * from './b'\nx()", True),
+    ("import x = require('y')\nfoo()", "import x = require('y')\nimport z = require('w')\nfoo()", True),
+    ("import d from './d.json' with { type: 'json' }\nf()", "import e from 'e'\nimport d from './d.json'\nf()", True),
+    ("import 'polyfill'\nf()", "import 'polyfill'\nimport './styles.css'\nf()", True),
+    ("const m = await import('./a')", "const m = await import('./b')", False),
+    ("const s = `\nimport a from 'a'\n`", "const s = `\nimport b from 'b'\n`", False),
+    ("// import a from 'a'\nx()", "// import b from 'b'\nx()", False),
+    ("const r = /import a/g", "const r = /import b/g", False),
+    ("export type Foo = { a: 1 }", "export type Foo = { a: 2 }", False),
+    ("const url = import.meta.url", "const url = import.meta.resolve('x')", False),
+]
+
+_PY_IMPORT_BLOCKS = [
+    "import os",
+    "import os.path as osp",
+    "from . import sibling",
+    "from x import (\n    a,  # import y\n    b,\n)",
+    "from x import a, \\\n    b",
+]
+_PY_CONTENT_BLOCKS = [
+    "x = 1",
+    's = """\nimport os\n"""',
+    "y = f(  # import z\n    1,\n)",
+    "def f():\n    return 2",
+    "mod = __import__('os')",
+    "class A:\n    import_count = 0",
+]
+_JS_IMPORT_BLOCKS = [
+    "import a from 'a'",
+    "import type { T } from './t'",
+    "import {\n  b, // note\n  c,\n} from 'bc';",
+    "import 'side-effect'",
+    "export * from './all'",
+    "export { d } from './d'",
+]
+_JS_CONTENT_BLOCKS = [
+    "const x = 1",
+    "const m = await import('./m')",
+    "const s = `import e from 'e'`",
+    "// import f from 'f'",
+    "export const g = { h: 1 }",
+    "const r = /import/.test(s)",
+]
+
+
+def _fuzz_edits(seed: int, imports: list[str], content: list[str]) -> list[tuple[str, str, bool]]:
+    """Random modules with one import added/removed (True) or one content block replaced (False)."""
+    rng = random.Random(seed)
+    edits = []
+    for _ in range(200):
+        blocks = rng.sample(imports, 2) + rng.sample(content, 3)
+        old = "\n\n".join(blocks)
+        if rng.random() < 0.5:
+            added = blocks[:]
+            added.insert(rng.randrange(len(added) + 1), rng.choice(imports))
+            pair = (old, "\n\n".join(added)) if rng.random() < 0.5 else ("\n\n".join(added), old)
+            edits.append((*pair, True))
+        else:
+            index = rng.randrange(2, len(blocks))
+            replacement = rng.choice([c for c in content if c not in blocks])
+            edits.append((old, "\n\n".join([*blocks[:index], replacement, *blocks[index + 1 :]]), False))
+    return edits
+
+
+def _strip_imports(source: str) -> str:
+    tree = ast.parse(source)
+    tree.body = [node for node in tree.body if not isinstance(node, ast.Import | ast.ImportFrom)]
+    return ast.dump(tree)
+
+
+class TestImportOnlyCorpus:
+    """Corpus, fuzz and timing tests for the import-only classifiers."""
+
+    @pytest.mark.parametrize(("old", "new", "expected"), _PY_IMPORT_CORPUS)
+    def test_python_corpus(self, old: str, new: str, expected: bool) -> None:
+        assert _is_python_import_only(old, new) is expected
+
+    @pytest.mark.parametrize(("old", "new", "expected"), _JS_IMPORT_CORPUS)
+    def test_js_corpus(self, old: str, new: str, expected: bool) -> None:
+        assert _is_js_import_only(old, new) is expected
+
+    def test_python_fuzz_agrees_with_ast(self) -> None:
+        for old, new, expected in _fuzz_edits(0, _PY_IMPORT_BLOCKS, _PY_CONTENT_BLOCKS):
+            assert _is_python_import_only(old, new) is expected, (old, new)
+            assert (_strip_imports(old) == _strip_imports(new)) is expected
+
+    def test_js_fuzz(self) -> None:
+        for old, new, expected in _fuzz_edits(0, _JS_IMPORT_BLOCKS, _JS_CONTENT_BLOCKS):
+            assert _is_js_import_only(old, new) is expected, (old, new)
+
+    def test_truncated_fragments_never_raise(self) -> None:
+        rng = random.Random(1)
+        for old, new, _ in _fuzz_edits(2, _PY_IMPORT_BLOCKS + _JS_IMPORT_BLOCKS, _PY_CONTENT_BLOCKS)[:50]:
+            cut_old, cut_new = old[rng.randrange(len(old)) :], new[: rng.randrange(len(new))]
+            assert isinstance(_is_python_import_only(cut_old, cut_new), bool)
+            assert isinstance(_is_js_import_only(cut_old, cut_new), bool)
+
+    @pytest.mark.parametrize(
+        ("file_path", "header", "added", "body"),
+        [
+            ("a.py", "import os\n", "import sys\n", "def f{i}(a, b):\n    return a + b * {i}\n\n"),
+            (
+                "a.ts",
+                "import { a } from 'a'\n",
+                "import type { B } from './b'\n",
+                "export function f{i}(a, b) {{\n  return a + b * {i}\n}}\n",
+            ),
+        ],
+    )
+    def test_5k_line_edits_classify_within_1ms(
+        self, monkeypatch: pytest.MonkeyPatch, file_path: str, header: str, added: str, body: str
+    ) -> None:
+        old = header + "".join(body.format(i=i) for i in range(1700))
+        assert old.count("\n") > 5000
+        last = body.format(i=1699)
+        edits = [
+            (header + added + old[len(header) :], "import"),
+            (old + added, "import"),
+            (old.replace(last, last.replace("b * 1699", "b  *  1699")), "whitespace"),
+            (old.replace(last, last.replace("return", "return -")), None),
+            (old.replace("* 1000\n", "* 1001\n"), None),
+        ]
+        # Only the statements around the edit are tokenized.
+        tokenized: list[int] = []
+        generate_tokens, lex = tokenize.generate_tokens, run_if_changed._lex
+
+        def counting_generate_tokens(readline: Callable[[], str]) -> Iterator[tokenize.TokenInfo]:
+            tokenized.append(0)
+
+            def counting_readline() -> str:
+                tokenized[-1] += 1
+                return readline()
+
+            return generate_tokens(counting_readline)
+
+        monkeypatch.setattr(tokenize, "generate_tokens", counting_generate_tokens)
+        monkeypatch.setattr(run_if_changed, "_lex", lambda source: tokenized.append(source.count("\n")) or lex(source))
+        for after, expected in edits:
+            hook_input = {"tool_input": {"file_path": file_path, "old_string": old, "new_string": after}}
+            assert classify_trivial_edit(hook_input) == expected
+        assert tokenized
+        assert max(tokenized) <= run_if_changed.CLASSIFY_MAX_LINES + 1
+        monkeypatch.undo()
+
+        for after, _ in edits:
+            hook_input = {"tool_input": {"file_path": file_path, "old_string": old, "new_string": after}}
+            timings = []
+            for _ in range(20):
+                started = time.perf_counter()
+                classify_trivial_edit(hook_input)
+                timings.append(time.perf_counter() - started)
+            assert min(timings) < 0.001
+
+    def test_window_does_not_start_inside_a_docstring(self) -> None:
+        old = 'x = 1\n"""\ndef f():\n    a  b\n"""\n'
+        assert not _is_python_whitespace_only(old, old.replace("a  b", "a b"))
+        assert _is_python_whitespace_only(old, old.replace("x = 1", "x  =  1"))
+
+    def test_windows_past_the_line_limit_are_not_trivial(self) -> None:
+        old = "".join(f"x{i} = {i}\n" for i in range(run_if_changed.CLASSIFY_MAX_LINES * 2))
+        assert not _is_python_whitespace_only(old, old + "\n\n")
+        assert _is_python_whitespace_only(old[:100], old[:100] + "\n\n")
+
+
+class TestClassifyTrivialEdit:
+    """Tests for classify_trivial_edit() routing logic."""
 
     def test_routes_to_python(self) -> None:
         """Python files use Python detection."""
@@ -145,7 +343,7 @@ class TestIsImportOnlyEdit:
                 "new_string": "import os\nimport sys",
             }
         }
-        assert is_import_only_edit(hook_input) is True
+        assert classify_trivial_edit(hook_input) == "import"
 
     def test_routes_to_js(self) -> None:
         """JS/TS files use JS detection."""
@@ -157,18 +355,158 @@ class TestIsImportOnlyEdit:
                     "new_string": "import { A, B } from 'mod'",
                 }
             }
-            assert is_import_only_edit(hook_input) is True
+            assert classify_trivial_edit(hook_input) == "import"
 
-    def test_other_extensions_return_false(self) -> None:
-        """Non-Python/JS files return False."""
+    def test_unregistered_extensions_only_skip_whitespace(self) -> None:
+        """Files without a classifier only skip whitespace-only edits."""
         hook_input = {
             "tool_input": {
-                "file_path": "/path/to/file.go",
+                "file_path": "/path/to/file.md",
                 "old_string": "import os",
                 "new_string": "import os\nimport sys",
             }
         }
-        assert is_import_only_edit(hook_input) is False
+        assert classify_trivial_edit(hook_input) is None
+        hook_input["tool_input"]["new_string"] = "import  os\n\n"
+        assert classify_trivial_edit(hook_input) == "whitespace"
+
+    def test_edits_without_old_text_are_not_trivial(self) -> None:
+        assert classify_trivial_edit({"tool_input": {"file_path": "a.py", "new_string": "x = 1"}}) is None
+        created = {"tool_input": {"file_path": "a.py", "content": "x = 1"}, "tool_response": {"type": "create"}}
+        assert classify_trivial_edit(created) is None
+
+    def test_multiedit_is_trivial_only_when_every_edit_is(self) -> None:
+        edits = [
+            {"old_string": "import os", "new_string": "import os\nimport sys"},
+            {"old_string": "x = 1  # one", "new_string": "x = 1  # uno"},
+        ]
+        hook_input = {"tool_name": "MultiEdit", "tool_input": {"file_path": "a.py", "edits": edits}}
+        assert classify_trivial_edit(hook_input) == "comment/import"
+
+        edits[1] = {"old_string": "x = 1", "new_string": "x = 2"}
+        assert classify_trivial_edit(hook_input) is None
+
+        hook_input["tool_input"]["edits"] = edits[:1]
+        assert classify_trivial_edit(hook_input) == "import"
+        assert classify_trivial_edit({"tool_input": {"file_path": "a.py", "edits": []}}) is None
+        assert classify_trivial_edit({"tool_input": {"file_path": "a.py", "edits": [{"new_string": ""}]}}) is None
+
+    def test_write_is_compared_with_the_replaced_content(self) -> None:
+        hook_input = {
+            "tool_name": "Write",
+            "tool_input": {"file_path": "a.py", "content": "import os\nimport sys\n\nx = 1\n"},
+            "tool_response": {"type": "update", "originalFile": "import os\n\nx = 1\n"},
+        }
+        assert classify_trivial_edit(hook_input) == "import"
+
+        hook_input["tool_response"]["originalFile"] = "import os\n\nx = 2\n"
+        assert classify_trivial_edit(hook_input) is None
+
+    def test_write_without_the_replaced_content_is_not_trivial(self, tmp_path: Path) -> None:
+        # The committed file may predate uncommitted edits the Write replaced.
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        (tmp_path / "a.py").write_text("x = 1\n")
+        subprocess.run(["git", "add", "a.py"], cwd=tmp_path, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "c"], cwd=tmp_path, check=True
+        )
+        (tmp_path / "a.py").write_text("x = 1  # set\n")
+        hook_input = {"tool_input": {"file_path": str(tmp_path / "a.py"), "content": "x = 1  # set\n"}}
+
+        assert classify_trivial_edit(hook_input) is None
+        hook_input["tool_response"] = {"type": "update"}
+        assert classify_trivial_edit(hook_input) is None
+
+    @pytest.mark.parametrize(
+        ("file_path", "old", "new", "expected"),
+        [
+            (
+                "a.go",
+                'import (\n\t"fmt"\n)\n\nfunc main() {}',
+                'import (\n\t"fmt"\n\t"os"\n)\n\nfunc main() {}',
+                "import",
+            ),
+            ("a.go", 'import "fmt"\nfunc main() {}', 'import "fmt"\nimport str "strings"\nfunc main() {}', "import"),
+            ("a.go", 'var s = `\nimport "os"\n`', 'var s = `\nimport "io"\n`', None),
+            (
+                "a.rs",
+                "use std::io;\nfn main() {}",
+                "use std::io;\nuse std::collections::{\n    HashMap,\n};\nfn main() {}",
+                "import",
+            ),
+            (
+                "a.rs",
+                "pub(crate) use a::b;\nfn f() {}",
+                "pub(crate) use a::{b, c};\nextern crate d;\nfn f() {}",
+                "import",
+            ),
+            (
+                "A.java",
+                "import java.util.List;\nclass A {}",
+                "import java.util.List;\nimport static a.B.c;\nclass A {}",
+                "import",
+            ),
+            ("A.kt", "import a.B\nclass A", "import a.B\nimport a.C as D\nclass A", "import"),
+            ("A.kt", "import a.B\nval x = 1", "import a.B\nval x = 2", None),
+            ("a.py", "x = 1  # one", "x = 1  # two\n# three", "comment"),
+            ("a.py", "if x:\n    y = 1", "if x:\n  y = 1", None),
+            ("a.ts", "const x = 1 /* a */", "// b\nconst x = 1", "comment"),
+            ("a.ts", "const s = '// a'", "const s = '// b'", None),
+            ("a.yaml", "a: 1 # x\nb: '#keep'", "a: 1 # y\nb: '#keep'", "comment"),
+            ("a.yaml", "b: '#keep'", "b: '#kept'", None),
+            ("a.py", "x  =  f( 1 )  # a  b", "\nx = f(1)  # a b\n\n", "whitespace"),
+            ("a.py", 'x = "a  b"', 'x = "a b"', None),
+            ("a.py", 'x = """\na  b\n"""', 'x = """\na b\n"""', None),
+            ("a.ts", "const x=1;", "const x = 1;\n\n", "whitespace"),
+            ("a.ts", "const s = `a  b`", "const s = `a b`", None),
+            ("a.ts", "return\nx", "return x", None),
+            ("a.sh", 'echo "a  b"', 'echo "a b"', None),
+            ("a.sh", "echo  a   b", "echo a b", "whitespace"),
+        ],
+    )
+    def test_registered_languages(self, file_path: str, old: str, new: str, expected: str | None) -> None:
+        hook_input = {"tool_input": {"file_path": file_path, "old_string": old, "new_string": new}}
+        assert classify_trivial_edit(hook_input) == expected
+
+    def test_c_comment_check_only_lexes_edits_touching_comment_markers(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        lexed = []
+        lex = run_if_changed._lex
+        monkeypatch.setattr(run_if_changed, "_lex", lambda source: lexed.append(source) or lex(source))
+
+        assert not run_if_changed._is_c_comment_only("x = a + b", "x = a * b")
+        assert lexed == []
+        assert run_if_changed._is_c_comment_only("x = a // b", "x = a // c")
+        assert lexed
+
+    def test_skips_are_counted_and_reported_at_stop(self, tmp_path: Path) -> None:
+        _init_repo_with_config(tmp_path, {"fast_every": 1, "checks": [{"fast": "echo fast", "slow": "echo slow"}]})
+        session_id = f"trivial-{uuid.uuid4()}"
+        edits = [("import os", "import os\nimport sys"), ("x = 1", "x = 1  # why"), ("x = 1", "x = 1\n\n")]
+        for old, new in edits:
+            payload = {
+                "session_id": session_id,
+                "tool_input": {"file_path": str(tmp_path / "a.py"), "old_string": old, "new_string": new},
+            }
+            result = _run_claude_hook(tmp_path, "fast", payload)
+            assert result.returncode == 0, result.stderr
+            assert "-only edit detected, skipping fast check" in result.stdout
+
+        result = _run_claude_hook(tmp_path, "slow", {"session_id": session_id})
+
+        assert result.returncode == 0, result.stderr
+        assert "Skipped 3 fast checks for trivial edits (1 comment, 1 import, 1 whitespace)" in result.stdout
+
+    def test_multiedit_batches_are_skipped_as_a_whole(self, tmp_path: Path) -> None:
+        _init_repo_with_config(tmp_path, {"fast_every": 1, "checks": [{"fast": "echo fast"}]})
+        edits = [{"old_string": "import os", "new_string": "import os\nimport sys"}]
+        payload = {"session_id": f"multi-{uuid.uuid4()}", "tool_input": {"file_path": "a.py", "edits": edits}}
+
+        result = _run_claude_hook(tmp_path, "fast", payload)
+        assert "Import-only edit detected, skipping fast check" in result.stdout
+
+        edits.append({"old_string": "x = 1", "new_string": "x = 2"})
+        result = _run_claude_hook(tmp_path, "fast", payload)
+        assert "fast\n" in result.stdout
 
 
 class TestShouldSkipThrottled:
@@ -203,25 +541,242 @@ class TestShouldSkipThrottled:
 
 
 class TestEditCountStateFile:
-    """Tests for state file I/O helpers."""
+    """Tests for the session state file."""
 
-    def test_missing_file_returns_zero(self, tmp_path: Path) -> None:
-        assert _load_edit_count(str(tmp_path / "nonexistent.json")) == 0
+    def test_first_edit_counts_one(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        assert run_if_changed._record_edit("s", 1_000) == (1, None)
 
-    def test_save_load_roundtrip(self, tmp_path: Path) -> None:
-        state_file = str(tmp_path / "state.json")
-        _save_edit_count(state_file, 7)
-        assert _load_edit_count(state_file) == 7
+    def test_edits_persist_across_calls(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        run_if_changed._record_edit("s", 1_000)
+        assert run_if_changed._record_edit("s", 2_000) == (2, 1_000)
+        assert run_if_changed._load_session_state("s")["edit_count"] == 2
 
-    def test_corrupt_file_returns_zero(self, tmp_path: Path) -> None:
-        state_file = tmp_path / "bad.json"
-        state_file.write_text("not json{{{")
-        assert _load_edit_count(str(state_file)) == 0
+    def test_corrupt_file_starts_over(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        (tmp_path / "ox-hooks").mkdir(mode=0o700)
+        Path(_get_state_file_path("s")).write_text("not json{{{")
+        assert run_if_changed._record_edit("s", 1_000) == (1, None)
 
-    def test_path_includes_session_id(self) -> None:
+    def test_path_includes_session_id(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
         path = _get_state_file_path("abc-123")
         assert "abc-123" in path
-        assert path.startswith("/tmp/")
+        assert path.startswith("/run/user/1000/ox-hooks/")
+
+    def test_path_falls_back_to_a_per_user_tmp_dir(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        assert _get_state_file_path("abc-123").startswith(f"/tmp/ox-hooks-{os.getuid()}/")
+
+    @pytest.mark.parametrize("planted", ["symlink", "shared"])
+    def test_state_dir_not_private_is_refused(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, planted: str
+    ) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        target = tmp_path / "elsewhere"
+        target.mkdir()
+        if planted == "symlink":
+            (tmp_path / "ox-hooks").symlink_to(target)
+        else:
+            (tmp_path / "ox-hooks").mkdir(mode=0o777)
+            (tmp_path / "ox-hooks").chmod(0o777)
+
+        with pytest.raises(PermissionError, match="not private"):
+            run_if_changed._make_state_dirs(run_if_changed._state_dir())
+        run_if_changed._save_state(_get_state_file_path("s"), {"edit_count": 1})
+        assert list(target.iterdir()) == []
+        assert not Path(_get_state_file_path("s")).exists()
+
+    def test_unwritable_state_does_not_throttle(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        (tmp_path / "ox-hooks").write_text("")  # A file where the state directory should be
+
+        assert run_if_changed._record_edit("s", 0) == (None, None)
+
+    def test_session_id_cannot_escape_state_dir(self) -> None:
+        path = _get_state_file_path("../../etc/passwd")
+        assert os.path.dirname(path) == run_if_changed._state_dir()
+
+    def test_concurrent_updates_are_not_lost(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+        def bump() -> None:
+            for _ in range(25):
+                run_if_changed._record_edit("concurrent", 0)
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert run_if_changed._load_session_state("concurrent")["edit_count"] == 200
+
+    def test_prune_removes_only_stale_sessions(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        run_if_changed._record_edit("old", 0)
+        run_if_changed._record_edit("new", 0)
+        os.utime(_get_state_file_path("old"), (0, 0))
+
+        run_if_changed._prune_session_states(max_age_s=60)
+
+        assert not Path(_get_state_file_path("old")).exists()
+        assert Path(_get_state_file_path("new")).exists()
+
+
+class TestTeamLeadIndex:
+    """Tests for the cached agent-team lead index."""
+
+    @pytest.fixture
+    def teams_dir(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+        monkeypatch.setenv("HOME", str(tmp_path / "home"))
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+        teams = tmp_path / "home" / ".claude" / "teams"
+        teams.mkdir(parents=True)
+        return teams
+
+    def _add_team(self, teams_dir: Path, name: str, lead: str) -> None:
+        (teams_dir / name).mkdir(exist_ok=True)
+        (teams_dir / name / "config.json").write_text(json.dumps({"leadSessionId": lead}))
+
+    def test_missing_teams_dir(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("HOME", str(tmp_path))
+        assert not run_if_changed._is_team_lead_session("lead")
+
+    def test_configs_are_reread_only_when_they_change(self, teams_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        self._add_team(teams_dir, "alpha", "lead-a")
+        assert run_if_changed._is_team_lead_session("lead-a")
+        assert not run_if_changed._is_team_lead_session("member")
+
+        reads = []
+        read = run_if_changed._read_team_lead
+        monkeypatch.setattr(run_if_changed, "_read_team_lead", lambda path: reads.append(path) or read(path))
+        assert run_if_changed._is_team_lead_session("lead-a")
+        assert reads == []
+
+        self._add_team(teams_dir, "beta", "lead-b")
+        assert run_if_changed._is_team_lead_session("lead-b")
+        assert reads == [str(teams_dir / "beta" / "config.json")]
+
+    def test_unchanged_teams_dir_is_not_rescanned(self, teams_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        for name in ("alpha", "beta", "gamma"):
+            self._add_team(teams_dir, name, f"lead-{name}")
+        assert not run_if_changed._is_team_lead_session("member")
+
+        locks = []
+        locked_state_file = run_if_changed._locked_state_file
+
+        def record_lock(path: str, *, exclusive: bool) -> contextlib.AbstractContextManager[TextIO]:
+            locks.append(exclusive)
+            return locked_state_file(path, exclusive=exclusive)
+
+        monkeypatch.setattr(run_if_changed, "_locked_state_file", record_lock)
+        monkeypatch.setattr(run_if_changed, "_refresh_team_index", pytest.fail)
+        assert not run_if_changed._is_team_lead_session("member")
+        assert run_if_changed._is_team_lead_session("lead-beta")
+        assert locks == [False, False]
+
+    def test_config_rewritten_in_place(self, teams_dir: Path) -> None:
+        self._add_team(teams_dir, "alpha", "lead-a")
+        assert run_if_changed._is_team_lead_session("lead-a")
+
+        # Rewriting config.json does not change the teams directory's mtime,
+        # but the old lead's config is re-checked before it is trusted.
+        self._add_team(teams_dir, "alpha", "lead-new")
+        assert not run_if_changed._is_team_lead_session("lead-a")
+        assert run_if_changed._is_team_lead_session("lead-new")
+
+    def test_team_config_written_after_indexing(self, teams_dir: Path) -> None:
+        (teams_dir / "alpha").mkdir()
+        assert not run_if_changed._is_team_lead_session("lead-a")
+
+        (teams_dir / "alpha" / "config.json").write_text(json.dumps({"leadSessionId": "lead-a"}))
+        assert run_if_changed._is_team_lead_session("lead-a")
+
+    def test_unwritable_state_dir_still_answers(self, teams_dir: Path, tmp_path: Path) -> None:
+        self._add_team(teams_dir, "alpha", "lead-a")
+        (tmp_path / "run").write_text("")  # A file where the state directory should be
+
+        assert run_if_changed._is_team_lead_session("lead-a")
+        assert not run_if_changed._is_team_lead_session("member")
+
+
+class TestTimingLedger:
+    """Tests for the timing ledger and the stats action."""
+
+    def test_percentiles_use_nearest_rank(self) -> None:
+        values = [float(v) for v in range(1, 101)]
+        assert [run_if_changed._percentile(values, p) for p in (50, 95, 99)] == [50.0, 95.0, 99.0]
+        assert run_if_changed._percentile([3.0], 99) == 3.0
+
+    def test_format_stats_groups_checks_and_skip_reasons(self) -> None:
+        records = [
+            {"action": "fast", "skipped": None, "checks": [{"check": "backend", "duration": d, "exit_code": 0}]}
+            for d in (0.1, 0.2, 0.3)
+        ]
+        records.append({"action": "fast", "skipped": "throttled", "duration": 0.01, "checks": []})
+        records.append(
+            {
+                "action": "slow",
+                "checks": [
+                    {"check": "api", "duration": 2.0, "exit_code": 1, "peak_rss_kb": 204800},
+                    {"check": "e2e", "duration": 0.0, "exit_code": None, "skipped": "needs"},
+                ],
+            }
+        )
+
+        table = run_if_changed.format_stats(records).splitlines()
+
+        assert table[0].split() == ["action", "check", "runs", "p50", "p95", "p99", "fail", "peak", "RSS"]
+        assert table[1].split() == ["fast", "backend", "3", "0.20s", "0.30s", "0.30s", "0", "0", "MB"]
+        assert table[2].split() == ["slow", "api", "1", "2.00s", "2.00s", "2.00s", "1", "200", "MB"]
+        assert [line.split()[:3] for line in table[5:]] == [["fast", "throttled", "1"], ["slow", "needs", "1"]]
+
+    def test_ledger_defaults_to_the_user_state_dir(self, isolated_user_dirs: Path) -> None:
+        expected = isolated_user_dirs / ".local" / "state" / "ox-hooks" / "ledger.jsonl"
+        assert run_if_changed._ledger_path() == str(expected)
+
+    def test_hook_runs_are_recorded_and_reported(self, tmp_path: Path) -> None:
+        project = tmp_path / "project"
+        project.mkdir()
+        _init_repo_with_config(
+            project, {"fast_every": 2, "checks": [{"name": "lint", "fast": "true", "slow": "true"}]}
+        )
+        env = {**os.environ, "XDG_STATE_HOME": str(tmp_path / "state")}
+        payload = {
+            "session_id": f"ledger-{uuid.uuid4()}",
+            "tool_input": {"file_path": str(project / "a.py"), "old_string": "x = 1", "new_string": "x = 2"},
+        }
+
+        def run(action: str) -> subprocess.CompletedProcess[str]:
+            return subprocess.run(
+                [sys.executable, str(_script_path), "--project-dir", str(project), "--action", action],
+                input=json.dumps(payload),
+                capture_output=True,
+                text=True,
+                env=env,
+                check=False,
+            )
+
+        for _ in range(3):
+            assert run("fast").returncode == 0
+
+        records = [
+            json.loads(line) for line in (tmp_path / "state" / "ox-hooks" / "ledger.jsonl").read_text().splitlines()
+        ]
+        assert [r["skipped"] for r in records] == ["throttled", None, "throttled"]
+        assert all(r["peak_rss_kb"] > 0 for r in records)
+        assert records[1]["project"] == os.path.realpath(project)
+        check = records[1]["checks"][0]
+        assert check["check"] == "lint"
+        assert check["exit_code"] == 0
+        assert check["peak_rss_kb"] > 0
+
+        stats = run("stats")
+        assert stats.returncode == 0, stats.stderr
+        assert "lint" in stats.stdout
+        assert "throttled" in stats.stdout
 
 
 class TestCodexRuntime:
@@ -249,3 +804,1048 @@ class TestCodexRuntime:
         assert result.stdout == ""
         assert "Final checks failed. Fix these issues before finishing." in result.stderr
         assert "bad check output" in result.stderr
+
+
+def _init_repo_with_config(tmp_path: Path, config: dict) -> None:
+    subprocess.run(["git", "init"], cwd=tmp_path, check=True, capture_output=True, text=True)
+    (tmp_path / ".claude").mkdir()
+    (tmp_path / ".claude" / "ox-hooks.json").write_text(json.dumps(config) + "\n")
+    (tmp_path / "changed.txt").write_text("changed\n")
+
+
+def _run_claude_hook(project_dir: Path, action: str, payload: dict | None = None) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, str(_script_path), "--project-dir", str(project_dir), "--action", action],
+        input=json.dumps(payload or {"session_id": f"test-{action}", "permission_mode": "default"}),
+        capture_output=True,
+        text=True,
+        cwd=project_dir,
+        check=False,
+    )
+
+
+class TestParallelChecks:
+    """Tests for max_parallel check execution."""
+
+    def test_checks_overlap_and_report_in_config_order(self, tmp_path: Path) -> None:
+        # Each check signals that it started, then waits for the other one;
+        # this only finishes when both run at the same time.
+        wait_script = tmp_path / "wait.py"
+        wait_script.write_text(
+            "import pathlib, sys, time\n"
+            "me, other = sys.argv[1], sys.argv[2]\n"
+            "pathlib.Path(me).touch()\n"
+            "deadline = time.monotonic() + 10\n"
+            "while not pathlib.Path(other).exists():\n"
+            "    if time.monotonic() > deadline:\n"
+            "        sys.exit(1)\n"
+            "    time.sleep(0.01)\n"
+            "print(f'done {pathlib.Path(me).name}')\n"
+        )
+        a, b = tmp_path / "a.marker", tmp_path / "b.marker"
+        command = _command_for_script(wait_script)
+        _init_repo_with_config(
+            tmp_path,
+            {
+                "max_parallel": 2,
+                "checks": [
+                    {"slow": f"{command} {a} {b}"},
+                    {"slow": f"{command} {b} {a}"},
+                ],
+            },
+        )
+
+        result = _run_claude_hook(tmp_path, "slow")
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.index("done a.marker") < result.stdout.index("done b.marker")
+
+    def test_invalid_max_parallel_falls_back_to_serial(self) -> None:
+        assert run_if_changed._max_parallel({}) == 1
+        assert run_if_changed._max_parallel({"max_parallel": 0}) == 1
+        assert run_if_changed._max_parallel({"max_parallel": "many"}) == 1
+        assert run_if_changed._max_parallel({"max_parallel": 4}) == 4
+
+
+def _pid_is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestHookDaemon:
+    """Tests for the optional per-project hook daemon."""
+
+    def _start_daemon(self, project_dir: Path, runtime_dir: Path, *extra_args: str) -> subprocess.Popen[str]:
+        env = {**os.environ, "XDG_RUNTIME_DIR": str(runtime_dir)}
+        daemon = subprocess.Popen(
+            [sys.executable, str(_script_path), "--project-dir", str(project_dir), "--action", "serve", *extra_args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=env,
+        )
+        socket_path = runtime_dir / "ox-hooks" / Path(run_if_changed._daemon_socket_path(str(project_dir))).name
+        deadline = time.monotonic() + 10
+        while not socket_path.exists():
+            assert daemon.poll() is None, "daemon exited early"
+            assert time.monotonic() < deadline, "daemon did not start"
+            time.sleep(0.02)
+        return daemon
+
+    def _run_hook(self, project_dir: Path, runtime_dir: Path, session_id: str) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [sys.executable, str(_script_path), "--project-dir", str(project_dir), "--action", "fast"],
+            input=json.dumps({"session_id": session_id, "permission_mode": "default"}),
+            capture_output=True,
+            text=True,
+            env={**os.environ, "XDG_RUNTIME_DIR": str(runtime_dir)},
+            check=False,
+        )
+
+    def test_forwards_to_daemon_and_keeps_throttle_in_memory(self, tmp_path: Path) -> None:
+        project_dir = tmp_path / "p"
+        runtime_dir = tmp_path / "r"
+        project_dir.mkdir()
+        runtime_dir.mkdir()
+        _init_repo_with_config(project_dir, {"fast_every": 2, "checks": [{"fast": "echo formatted"}]})
+        session_id = f"daemon-{uuid.uuid4()}"
+        daemon = self._start_daemon(project_dir, runtime_dir)
+        try:
+            first = self._run_hook(project_dir, runtime_dir, session_id)
+            second = self._run_hook(project_dir, runtime_dir, session_id)
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+        assert first.returncode == 0
+        assert "Throttled: edit 1" in first.stdout
+        assert second.returncode == 0
+        assert "formatted" in second.stdout
+        assert not Path(_get_state_file_path(session_id)).exists()
+        # Daemon-served records carry the checks' peak RSS, not the daemon's.
+        records = [json.loads(line) for line in Path(run_if_changed._ledger_path()).read_text().splitlines()]
+        assert [r["skipped"] for r in records] == ["throttled", None]
+        assert all("peak_rss_kb" not in r for r in records)
+        assert records[1]["checks"][0]["peak_rss_kb"] > 0
+
+    def test_killing_the_hook_kills_checks_running_in_the_daemon(self, tmp_path: Path) -> None:
+        project_dir = tmp_path / "p"
+        runtime_dir = tmp_path / "r"
+        project_dir.mkdir()
+        runtime_dir.mkdir()
+        pid_file = tmp_path / "check.pid"
+        command = f"echo $$ > {shlex.quote(str(pid_file))}; exec sleep 60"
+        _init_repo_with_config(project_dir, {"fast_every": 1, "checks": [{"fast": command}]})
+        (project_dir / "a.py").write_text("")
+        daemon = self._start_daemon(project_dir, runtime_dir)
+        try:
+            hook = subprocess.Popen(
+                [sys.executable, str(_script_path), "--project-dir", str(project_dir), "--action", "fast"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                env={**os.environ, "XDG_RUNTIME_DIR": str(runtime_dir)},
+            )
+            assert hook.stdin is not None
+            hook.stdin.write(json.dumps({"session_id": f"kill-{uuid.uuid4()}"}))
+            hook.stdin.close()
+            deadline = time.monotonic() + 10
+            while not pid_file.exists() or not pid_file.read_text().strip():
+                assert time.monotonic() < deadline, "check did not start"
+                time.sleep(0.02)
+            check_pid = int(pid_file.read_text())
+
+            hook.terminate()
+            hook.wait(timeout=10)
+
+            deadline = time.monotonic() + 5
+            while _pid_is_running(check_pid):
+                assert time.monotonic() < deadline, "check kept running in the daemon"
+                time.sleep(0.05)
+            assert daemon.poll() is None
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+    def test_forwarded_runs_trace_into_the_callers_trace_file(self, tmp_path: Path) -> None:
+        project_dir = tmp_path / "p"
+        runtime_dir = tmp_path / "r"
+        project_dir.mkdir()
+        runtime_dir.mkdir()
+        _init_repo_with_config(project_dir, {"fast_every": 1, "checks": [{"name": "fmt", "fast": "echo formatted"}]})
+        (project_dir / "a.py").write_text("")
+        trace_path = tmp_path / "trace.json"
+        # The daemon is started without OX_HOOKS_TRACE; the request carries it.
+        daemon = self._start_daemon(project_dir, runtime_dir)
+        try:
+            result = subprocess.run(
+                [sys.executable, str(_script_path), "--project-dir", str(project_dir), "--action", "fast"],
+                input=json.dumps({"session_id": "traced", "tool_use_id": "toolu_1"}),
+                capture_output=True,
+                text=True,
+                env={**os.environ, "XDG_RUNTIME_DIR": str(runtime_dir), "OX_HOOKS_TRACE": str(trace_path)},
+                check=False,
+            )
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+        assert result.returncode == 0, result.stderr
+        events = json.loads(trace_path.read_text().rstrip().rstrip(",") + "]")
+        spans = {event["name"]: event for event in events if event["ph"] == "X"}
+        assert spans["forward to daemon"]["pid"] != daemon.pid
+        assert spans["git status"]["pid"] == daemon.pid
+        assert spans["check fmt"]["pid"] == daemon.pid
+        assert spans["check fmt"]["args"]["tool_use_id"] == "toolu_1"
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+    def test_watching_daemon_sees_changes_made_after_start(self, tmp_path: Path) -> None:
+        project_dir = tmp_path / "p"
+        runtime_dir = tmp_path / "r"
+        project_dir.mkdir()
+        runtime_dir.mkdir()
+        _init_repo_with_config(
+            project_dir, {"fast_every": 1, "checks": [{"directory": "src", "fast": "echo formatted"}]}
+        )
+        daemon = self._start_daemon(project_dir, runtime_dir, "--watch")
+        try:
+            before = self._run_hook(project_dir, runtime_dir, f"watch-{uuid.uuid4()}")
+            (project_dir / "src").mkdir()
+            (project_dir / "src" / "a.py").write_text("")
+            after = self._run_hook(project_dir, runtime_dir, f"watch-{uuid.uuid4()}")
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+        assert "No src/ files modified, skipping" in before.stdout
+        assert "formatted" in after.stdout
+
+    def test_socket_lives_in_the_private_state_dir(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        assert os.path.dirname(run_if_changed._daemon_socket_path(str(tmp_path))) == run_if_changed._state_dir()
+
+    def test_only_own_sockets_receive_hook_input(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        path = tmp_path / "d.sock"
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(str(path))
+            server.listen()
+            assert run_if_changed._is_own_socket(str(path))
+            uid = os.getuid()
+            monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+            assert not run_if_changed._is_own_socket(str(path))
+            assert run_if_changed._forward_to_daemon(str(path), {"stdin": "secret"}) is None
+        (tmp_path / "file.sock").write_text("")
+        assert not run_if_changed._is_own_socket(str(tmp_path / "file.sock"))
+
+    def test_stale_socket_falls_back_to_in_process(self, tmp_path: Path) -> None:
+        project_dir = tmp_path / "p"
+        runtime_dir = tmp_path / "r"
+        project_dir.mkdir()
+        runtime_dir.mkdir()
+        _init_repo_with_config(project_dir, {"fast_every": 1, "checks": [{"fast": "echo formatted"}]})
+        socket_name = Path(run_if_changed._daemon_socket_path(str(project_dir))).name
+        (runtime_dir / "ox-hooks").mkdir(mode=0o700)
+        (runtime_dir / "ox-hooks" / socket_name).write_text("")
+
+        result = self._run_hook(project_dir, runtime_dir, f"stale-{uuid.uuid4()}")
+
+        assert result.returncode == 0
+        assert "formatted" in result.stdout
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+class TestChangeWatcher:
+    """Tests for the daemon's inotify-backed changed-file tracking."""
+
+    @pytest.fixture
+    def repo(self, tmp_path: Path) -> Path:
+        repo = tmp_path / "repo"
+        (repo / "pkg").mkdir(parents=True)
+        (repo / "node_modules" / "dep").mkdir(parents=True)
+        (repo / ".gitignore").write_text("node_modules/\n")
+        (repo / "pkg" / "a.py").write_text("a = 1\n")
+        subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+        self._commit(repo)
+        return repo
+
+    def _commit(self, repo: Path) -> None:
+        subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "c"], cwd=repo, check=True
+        )
+
+    def test_matches_git_status_as_files_change(self, repo: Path) -> None:
+        watcher = run_if_changed._ChangeWatcher(str(repo))
+        threading.Thread(target=watcher.run, daemon=True).start()
+        assert watcher.changed_files() == set()
+
+        # Queries follow writes without waiting: queued events are handled first.
+        (repo / "pkg" / "a.py").write_text("a = 2\n")
+        assert watcher.changed_files() == {"pkg/a.py"}
+
+        (repo / "new" / "sub").mkdir(parents=True)
+        (repo / "new" / "sub" / "b.py").write_text("")
+        assert watcher.changed_files() == {"pkg/a.py", "new/sub/b.py"}
+
+        (repo / "pkg" / "a.py").write_text("a = 1\n")
+        assert watcher.changed_files() == {"new/sub/b.py"}
+        assert watcher.changed_files() == run_if_changed._parse_porcelain(
+            subprocess.run(
+                ["git", "status", "--porcelain", "-z", "-uall"], cwd=repo, capture_output=True, text=True
+            ).stdout
+        )
+
+    def test_commits_trigger_a_full_rescan(self, repo: Path) -> None:
+        watcher = run_if_changed._ChangeWatcher(str(repo))
+        threading.Thread(target=watcher.run, daemon=True).start()
+        (repo / "pkg" / "a.py").write_text("a = 2\n")
+        assert watcher.changed_files() == {"pkg/a.py"}
+
+        self._commit(repo)
+
+        assert watcher.changed_files() == set()
+
+    def test_query_right_after_write_sees_the_write(self, repo: Path) -> None:
+        watcher = run_if_changed._ChangeWatcher(str(repo))
+        threading.Thread(target=watcher.run, daemon=True).start()
+        watcher.changed_files()
+
+        for i in range(100):
+            path = repo / "pkg" / f"m{i % 10}.py"
+            path.write_text(str(i))
+            assert path.relative_to(repo).as_posix() in (watcher.changed_files() or set())
+
+    def test_ignored_directories_are_not_watched(self, repo: Path) -> None:
+        watcher = run_if_changed._ChangeWatcher(str(repo))
+        threading.Thread(target=watcher.run, daemon=True).start()
+
+        assert "pkg" in watcher._dirs.values()
+        assert not any(d.startswith("node_modules") for d in watcher._dirs.values())
+
+    def test_hook_uses_watcher_inside_daemon(self, repo: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        watcher = run_if_changed._ChangeWatcher(str(repo))
+        threading.Thread(target=watcher.run, daemon=True).start()
+        watcher.changed_files()
+        monkeypatch.setattr(run_if_changed, "_change_watcher", watcher)
+        # With nothing touched since the last query, no git process is needed.
+        monkeypatch.setattr(run_if_changed.subprocess, "run", None)
+
+        assert run_if_changed.get_changed_files(str(repo)) == set()
+
+    def test_missing_git_dir_fails_so_daemon_falls_back(self, tmp_path: Path) -> None:
+        with pytest.raises(FileNotFoundError, match=r"\.git"):
+            run_if_changed._ChangeWatcher(str(tmp_path))
+
+
+class TestFilePlaceholders:
+    """Tests for {file}/{files} command expansion."""
+
+    def test_command_without_placeholders_is_unchanged(self) -> None:
+        assert run_if_changed.expand_command("make format", ["a.py"]) == ["make format"]
+
+    def test_files_are_shell_quoted(self) -> None:
+        assert run_if_changed.expand_command("ruff format {files}", ["a.py", "b c.py"]) == [
+            "ruff format a.py 'b c.py'"
+        ]
+
+    def test_file_placeholder_runs_once_per_file(self) -> None:
+        assert run_if_changed.expand_command("fmt {file}", ["a.py", "b.py"]) == ["fmt a.py", "fmt b.py"]
+
+    def test_files_split_into_chunks_under_limit(self) -> None:
+        files = [f"file{i:03}.py" for i in range(100)]
+        commands = run_if_changed.expand_command("fmt {files}", files, byte_limit=200)
+        assert len(commands) > 1
+        assert all(len(command.encode()) <= 200 for command in commands)
+        assert " ".join(command.removeprefix("fmt ") for command in commands).split() == files
+
+    def test_scoped_files_are_relative_to_directory_and_exist(self, tmp_path: Path) -> None:
+        (tmp_path / "backend").mkdir()
+        (tmp_path / "backend" / "a.py").write_text("")
+        changed = {"backend/a.py", "backend/deleted.py", "frontend/b.ts"}
+        assert run_if_changed.scoped_files(changed, "backend", str(tmp_path)) == ["a.py"]
+
+    def test_renames_report_new_path(self, tmp_path: Path) -> None:
+        subprocess.run(["git", "init"], cwd=tmp_path, check=True, capture_output=True)
+        (tmp_path / "old name.py").write_text("x = 1\n")
+        subprocess.run(["git", "add", "."], cwd=tmp_path, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], cwd=tmp_path, check=True
+        )
+        subprocess.run(["git", "mv", "old name.py", "new name.py"], cwd=tmp_path, check=True)
+        assert run_if_changed.get_changed_files(str(tmp_path)) == {"new name.py"}
+
+    def test_fast_check_receives_only_edited_file(self, tmp_path: Path) -> None:
+        _init_repo_with_config(tmp_path, {"fast_every": 1, "checks": [{"fast": "echo formatting {files}"}]})
+        (tmp_path / "edited.py").write_text("")
+        payload = {
+            "session_id": f"files-{uuid.uuid4()}",
+            "tool_input": {"file_path": str(tmp_path / "edited.py"), "old_string": "x = 1", "new_string": "x = 2"},
+        }
+
+        result = _run_claude_hook(tmp_path, "fast", payload)
+
+        assert result.returncode == 0, result.stderr
+        assert "formatting edited.py\n" in result.stdout
+
+
+class TestEditedFileScope:
+    """Tests for selecting fast checks from the edited file (fast_scope)."""
+
+    def test_edited_file_is_made_project_relative(self, tmp_path: Path) -> None:
+        hook_input = {"tool_input": {"file_path": str(tmp_path / "backend" / "a.py")}}
+        assert run_if_changed._edited_file(hook_input, str(tmp_path)) == os.path.join("backend", "a.py")
+
+    def test_paths_outside_project_are_ignored(self, tmp_path: Path) -> None:
+        hook_input = {"tool_input": {"file_path": "/elsewhere/a.py"}}
+        assert run_if_changed._edited_file(hook_input, str(tmp_path)) is None
+        assert run_if_changed._edited_file({}, str(tmp_path)) is None
+
+    def test_selects_checks_without_git_by_default(self, tmp_path: Path) -> None:
+        # No git repo at all: git status would fail, so success proves it never ran.
+        for directory in (".claude", "backend", "frontend"):
+            (tmp_path / directory).mkdir()
+        (tmp_path / ".claude" / "ox-hooks.json").write_text(
+            json.dumps(
+                {
+                    "fast_every": 1,
+                    "checks": [
+                        {"directory": "backend", "fast": "echo backend-fast"},
+                        {"directory": "frontend", "fast": "echo frontend-fast"},
+                    ],
+                }
+            )
+        )
+        payload = {
+            "session_id": f"edited-{uuid.uuid4()}",
+            "tool_input": {"file_path": str(tmp_path / "backend" / "a.py"), "old_string": "x", "new_string": "y"},
+        }
+
+        result = _run_claude_hook(tmp_path, "fast", payload)
+
+        assert result.returncode == 0, result.stderr
+        assert "backend-fast" in result.stdout
+        assert "frontend-fast" not in result.stdout
+
+    def test_throttled_edits_are_checked_by_the_next_run(self, tmp_path: Path) -> None:
+        checks = [{"directory": "fe", "fast": "echo fe-fast"}, {"directory": "be", "fast": "echo be-fast"}]
+        _init_repo_with_config(tmp_path, {"fast_every": 5, "checks": checks})
+        for path in ("fe/a.js", "be/b.py"):
+            (tmp_path / path).parent.mkdir()
+            (tmp_path / path).write_text("")
+        session_id = f"throttled-{uuid.uuid4()}"
+
+        def edit(path: str) -> subprocess.CompletedProcess[str]:
+            tool_input = {"file_path": str(tmp_path / path), "old_string": "x", "new_string": "y"}
+            return _run_claude_hook(tmp_path, "fast", {"session_id": session_id, "tool_input": tool_input})
+
+        throttled = [edit("fe/a.js") for _ in range(4)]
+        fifth = edit("be/b.py")
+        sixth = edit("be/b.py")
+
+        assert all("Throttled" in result.stdout for result in throttled)
+        assert fifth.returncode == 0, fifth.stderr
+        assert "fe-fast" in fifth.stdout
+        assert "be-fast" in fifth.stdout
+        # The run consumed the pending edits.
+        assert "Throttled" in sixth.stdout
+        assert run_if_changed._load_session_state(session_id).get("pending_edits") == ["be/b.py"]
+
+    def test_unwritable_state_runs_every_edit(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+        (tmp_path / "run").write_text("")  # A file where the runtime directory should be
+        _init_repo_with_config(tmp_path, {"fast_every": 5, "checks": [{"fast": "echo fast-ran"}]})
+        (tmp_path / "a.py").write_text("")
+        tool_input = {"file_path": str(tmp_path / "a.py"), "old_string": "x", "new_string": "y"}
+
+        results = [_run_claude_hook(tmp_path, "fast", {"session_id": "s", "tool_input": tool_input}) for _ in range(2)]
+
+        assert all("fast-ran" in result.stdout for result in results), [r.stdout for r in results]
+
+    def test_ignored_edits_do_not_trigger_checks(self, tmp_path: Path) -> None:
+        checks = [{"directory": "build", "fast": "echo build-fast"}, {"fast": "echo formatting {files}"}]
+        _init_repo_with_config(tmp_path, {"fast_every": 1, "checks": checks})
+        (tmp_path / ".gitignore").write_text("build/\n")
+        (tmp_path / "build").mkdir()
+        (tmp_path / "build" / "out.py").write_text("")
+        (tmp_path / "a.py").write_text("")
+        session_id = f"ignored-{uuid.uuid4()}"
+
+        def edit(path: str) -> subprocess.CompletedProcess[str]:
+            tool_input = {"file_path": str(tmp_path / path), "old_string": "x", "new_string": "y"}
+            return _run_claude_hook(tmp_path, "fast", {"session_id": session_id, "tool_input": tool_input})
+
+        ignored = edit("build/out.py")
+        tracked = edit("a.py")
+
+        assert ignored.returncode == 0, ignored.stderr
+        assert "No files changed, skipping" in ignored.stdout
+        assert "build-fast" not in ignored.stdout + tracked.stdout
+        assert "formatting a.py\n" in tracked.stdout
+
+    def test_changed_scope_runs_every_dirty_check(self, tmp_path: Path) -> None:
+        checks = [
+            {"directory": "backend", "fast": "echo backend-fast"},
+            {"directory": "frontend", "fast": "echo frontend-fast"},
+        ]
+        _init_repo_with_config(tmp_path, {"fast_every": 1, "fast_scope": "changed", "checks": checks})
+        for directory in ("backend", "frontend"):
+            (tmp_path / directory).mkdir()
+            (tmp_path / directory / "a.py").write_text("")
+        payload = {
+            "session_id": f"changed-{uuid.uuid4()}",
+            "tool_input": {"file_path": str(tmp_path / "backend" / "a.py"), "old_string": "x", "new_string": "y"},
+        }
+
+        result = _run_claude_hook(tmp_path, "fast", payload)
+
+        assert result.returncode == 0, result.stderr
+        assert "backend-fast" in result.stdout
+        assert "frontend-fast" in result.stdout
+
+
+class TestCheckMatcher:
+    """Tests for paths/exclude glob scoping."""
+
+    def _match(self, checks: list[dict], files: set[str]) -> dict[int, list[str]]:
+        return run_if_changed.match_checks(run_if_changed.compile_check_matcher(checks), files)
+
+    def test_directory_and_whole_project_checks(self) -> None:
+        checks = [{"directory": "backend"}, {"directory": "frontend"}, {}]
+        files = {"backend/app/models.py", "backendish/a.py", "README.md"}
+        assert self._match(checks, files) == {
+            0: ["backend/app/models.py"],
+            2: ["README.md", "backend/app/models.py", "backendish/a.py"],
+        }
+
+    def test_paths_are_relative_to_directory(self) -> None:
+        checks = [{"directory": "backend", "paths": ["*.py", "docs/**/*.md"]}]
+        files = {"backend/a.py", "backend/app/b.py", "backend/docs/x/y.md", "backend/README.md", "other/c.py"}
+        assert self._match(checks, files) == {0: ["backend/a.py", "backend/app/b.py", "backend/docs/x/y.md"]}
+
+    def test_anchored_pattern_and_directory_match(self) -> None:
+        checks = [{"paths": ["src/*.ts", "/proto"]}]
+        files = {"src/a.ts", "src/lib/b.ts", "proto/api/v1.proto", "lib/proto/x"}
+        assert self._match(checks, files) == {0: ["proto/api/v1.proto", "src/a.ts"]}
+
+    def test_exclude_wins_over_include(self) -> None:
+        checks = [{"directory": "backend", "exclude": ["migrations", "*_pb2.py"]}]
+        files = {"backend/app.py", "backend/migrations/0001.py", "backend/api/foo_pb2.py"}
+        assert self._match(checks, files) == {0: ["backend/app.py"]}
+
+    def test_character_classes(self) -> None:
+        checks = [{"paths": ["v[0-9].txt", "[!v]*.md"]}]
+        assert self._match(checks, {"v1.txt", "vx.txt", "a.md", "v.md"}) == {0: ["a.md", "v1.txt"]}
+
+    def test_malformed_patterns_raise(self) -> None:
+        with pytest.raises(ValueError, match="paths"):
+            run_if_changed.compile_check_matcher([{"name": "api", "paths": [1]}])
+
+    def test_hook_skips_checks_without_matching_files(self, tmp_path: Path) -> None:
+        _init_repo_with_config(
+            tmp_path,
+            {
+                "checks": [
+                    {"name": "docs", "paths": ["*.md"], "slow": "echo docs-slow"},
+                    {"name": "text", "paths": ["*.txt"], "exclude": ["changed.txt"], "slow": "echo text-slow"},
+                    {"name": "all", "slow": "echo all-slow"},
+                ]
+            },
+        )
+
+        result = _run_claude_hook(tmp_path, "slow")
+
+        assert result.returncode == 0, result.stderr
+        assert "No files matching `docs` modified, skipping" in result.stdout
+        assert "No files matching `text` modified, skipping" in result.stdout
+        assert "all-slow" in result.stdout
+
+    def test_files_inside_a_new_untracked_directory_match(self, tmp_path: Path) -> None:
+        _init_repo_with_config(tmp_path, {"checks": [{"name": "py", "paths": ["*.py"], "slow": "echo lint {files}"}]})
+        subprocess.run(["git", "add", "."], cwd=tmp_path, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], cwd=tmp_path, check=True
+        )
+        (tmp_path / "newpkg" / "sub").mkdir(parents=True)
+        (tmp_path / "newpkg" / "__init__.py").write_text("")
+        (tmp_path / "newpkg" / "sub" / "mod.py").write_text("")
+
+        result = _run_claude_hook(tmp_path, "slow")
+
+        assert result.returncode == 0, result.stderr
+        assert "lint newpkg/__init__.py newpkg/sub/mod.py\n" in result.stdout
+
+
+class TestAdaptiveThrottle:
+    """Tests for fast_every="auto"."""
+
+    def test_fast_every_follows_cost_over_budget(self) -> None:
+        assert run_if_changed.adaptive_fast_every(None, 500) == 1
+        assert run_if_changed.adaptive_fast_every(120, 500) == 1
+        assert run_if_changed.adaptive_fast_every(1800, 500) == 4
+        assert run_if_changed.adaptive_fast_every(60_000, 500) == run_if_changed.MAX_ADAPTIVE_FAST_EVERY
+
+    def test_skips_until_enough_edits_since_last_run(self) -> None:
+        assert not run_if_changed.should_skip_adaptive(1, None, 3)
+        assert run_if_changed.should_skip_adaptive(3, 1, 3)
+        assert not run_if_changed.should_skip_adaptive(4, 1, 3)
+
+    def test_cost_estimate_is_smoothed(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        assert run_if_changed._load_fast_cost_ms(str(tmp_path)) is None
+        run_if_changed._record_fast_cost(str(tmp_path), 1000)
+        run_if_changed._record_fast_cost(str(tmp_path), 2000)
+        assert run_if_changed._load_fast_cost_ms(str(tmp_path)) == 1300
+
+    def test_expensive_check_is_throttled_after_first_measurement(self, tmp_path: Path) -> None:
+        project = tmp_path / "project"
+        project.mkdir()
+        _init_repo_with_config(
+            project, {"fast_every": "auto", "fast_budget_ms": 1, "checks": [{"fast": "sleep 0.05 && echo ran"}]}
+        )
+        env = {**os.environ, "XDG_RUNTIME_DIR": str(tmp_path / "run")}
+        payload = {
+            "session_id": f"adaptive-{uuid.uuid4()}",
+            "tool_input": {"file_path": str(project / "a.py"), "old_string": "x = 1", "new_string": "x = 2"},
+        }
+        outputs = []
+        for _ in range(3):
+            result = subprocess.run(
+                [sys.executable, str(_script_path), "--project-dir", str(project), "--action", "fast"],
+                input=json.dumps(payload),
+                capture_output=True,
+                text=True,
+                env=env,
+                check=False,
+            )
+            assert result.returncode == 0, result.stderr
+            outputs.append(result.stdout)
+
+        assert "ran" in outputs[0]
+        assert all("Throttled: edit" in out and "runs every 10" in out for out in outputs[1:])
+
+
+class TestImpactAnalysis:
+    """Tests for {tests} Python impact analysis."""
+
+    @pytest.fixture
+    def project(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+        project = tmp_path / "project"
+        files = {
+            "pkg/__init__.py": "",
+            "pkg/a.py": "X = 1\n",
+            "pkg/b.py": "from . import a\n",
+            "pkg/c.py": "def f():\n    import json\n",
+            "src/lib/x.py": "",
+            "tests/conftest.py": "",
+            "tests/test_b.py": "from pkg.b import a\n",
+            "tests/test_c.py": "import pkg.c\n",
+            "tests/test_x.py": "from lib import x\n",
+        }
+        for path, source in files.items():
+            (project / path).parent.mkdir(parents=True, exist_ok=True)
+            (project / path).write_text(source)
+        subprocess.run(["git", "init"], cwd=project, check=True, capture_output=True)
+        return project
+
+    def test_maps_changes_to_transitive_importers(self, project: Path) -> None:
+        assert run_if_changed.affected_tests(str(project), ["pkg/a.py"]) == ["tests/test_b.py"]
+        assert run_if_changed.affected_tests(str(project), ["pkg/__init__.py"]) == [
+            "tests/test_b.py",
+            "tests/test_c.py",
+        ]
+        assert run_if_changed.affected_tests(str(project), ["src/lib/x.py"]) == ["tests/test_x.py"]
+        assert run_if_changed.affected_tests(str(project), ["tests/test_c.py"]) == ["tests/test_c.py"]
+
+    def test_deleted_module_still_selects_its_importers(self, project: Path) -> None:
+        (project / "pkg" / "c.py").unlink()
+        assert run_if_changed.affected_tests(str(project), ["pkg/c.py"]) == ["tests/test_c.py"]
+
+    def test_falls_back_to_full_suite(self, project: Path) -> None:
+        assert run_if_changed.affected_tests(str(project), ["tests/conftest.py"]) is None
+        assert run_if_changed.affected_tests(str(project), ["pyproject.toml"]) is None
+        (project / "pkg" / "broken.py").write_text("def (:\n")
+        assert run_if_changed.affected_tests(str(project), ["pkg/a.py"]) is None
+
+    def test_module_reached_through_conftest_runs_full_suite(self, project: Path) -> None:
+        (project / "pkg" / "db.py").write_text("")
+        (project / "tests" / "conftest.py").write_text("from pkg import db\n")
+
+        assert run_if_changed.affected_tests(str(project), ["pkg/db.py"]) is None
+
+    def test_graph_is_cached_and_refreshed_per_file(self, project: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        run_if_changed.affected_tests(str(project), ["pkg/a.py"])
+        parsed = []
+        parse = run_if_changed._parse_imports
+        monkeypatch.setattr(run_if_changed, "_parse_imports", lambda *a: parsed.append(a[0]) or parse(*a))
+
+        run_if_changed.affected_tests(str(project), ["pkg/a.py"])
+        assert parsed == []
+
+        (project / "tests" / "test_c.py").write_text("import pkg.a\n")
+        assert run_if_changed.affected_tests(str(project), ["pkg/a.py"]) == ["tests/test_b.py", "tests/test_c.py"]
+        assert parsed == ["tests/test_c.py"]
+
+    def test_slow_command_receives_affected_tests(self, project: Path) -> None:
+        (project / ".claude").mkdir()
+        (project / ".claude" / "ox-hooks.json").write_text(
+            json.dumps({"checks": [{"slow": "echo selected: {tests}"}]})
+        )
+
+        subprocess.run(["git", "add", "."], cwd=project, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], cwd=project, check=True
+        )
+        (project / "tests" / "conftest.py").write_text("import pytest\n")
+
+        result = _run_claude_hook(project, "slow")
+
+        assert result.returncode == 0, result.stderr
+        # A changed conftest.py can affect every test: full suite.
+        assert "running the full suite" in result.stdout
+        assert "Running `echo selected: `" in result.stdout
+
+        subprocess.run(["git", "checkout", "--", "tests/conftest.py"], cwd=project, check=True)
+        (project / "pkg" / "a.py").write_text("X = 2\n")
+
+        result = _run_claude_hook(project, "slow")
+
+        assert result.returncode == 0, result.stderr
+        assert "selected: tests/test_b.py\n" in result.stdout
+
+
+class TestShouldSkipDebounced:
+    """Tests for should_skip_debounced() pure logic."""
+
+    def test_first_edit_runs(self) -> None:
+        assert should_skip_debounced(1_000, None, 500) is False
+
+    def test_edit_within_window_skips(self) -> None:
+        assert should_skip_debounced(1_200, 1_000, 500) is True
+
+    def test_edit_after_quiet_period_runs(self) -> None:
+        assert should_skip_debounced(1_500, 1_000, 500) is False
+
+    def test_disabled_never_skips(self) -> None:
+        assert should_skip_debounced(1_001, 1_000, 0) is False
+
+
+class TestDebouncedFastChecks:
+    """Tests for the fast_debounce_ms hook flow."""
+
+    def test_burst_runs_leading_and_trailing_check(self, tmp_path: Path) -> None:
+        log = tmp_path / "runs.log"
+        _init_repo_with_config(
+            tmp_path, {"fast_debounce_ms": 1500, "checks": [{"fast": f"echo run >> {shlex.quote(str(log))}"}]}
+        )
+        session_id = f"debounce-{uuid.uuid4()}"
+        payload = {"session_id": session_id, "tool_input": {"old_string": "a", "new_string": "b"}}
+        try:
+            first = _run_claude_hook(tmp_path, "fast", payload)
+            second = _run_claude_hook(tmp_path, "fast", payload)
+            third = _run_claude_hook(tmp_path, "fast", payload)
+
+            assert first.returncode == 0
+            assert "Debounced" not in first.stdout
+            assert "Debounced: edit 2" in second.stdout
+            assert "Debounced: edit 3" in third.stdout
+            assert log.read_text().count("run") == 1
+
+            deadline = time.monotonic() + 10
+            while log.read_text().count("run") < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.5)
+            assert log.read_text().count("run") == 2
+        finally:
+            Path(_get_state_file_path(session_id)).unlink(missing_ok=True)
+
+    def test_trailing_check_expands_every_file_of_the_burst(self, tmp_path: Path) -> None:
+        log = tmp_path / "runs.log"
+        _init_repo_with_config(
+            tmp_path,
+            {"fast_debounce_ms": 500, "checks": [{"fast": f"echo {{files}} >> {shlex.quote(str(log))}"}]},
+        )
+        for name in ("a.py", "b.py", "c.py"):
+            (tmp_path / name).write_text("")
+        session_id = f"debounce-{uuid.uuid4()}"
+
+        def edit(name: str) -> subprocess.CompletedProcess[str]:
+            tool_input = {"file_path": str(tmp_path / name), "old_string": "x", "new_string": "y"}
+            return _run_claude_hook(tmp_path, "fast", {"session_id": session_id, "tool_input": tool_input})
+
+        try:
+            assert "Debounced" not in edit("a.py").stdout
+            assert "Debounced" in edit("b.py").stdout
+            assert "Debounced" in edit("c.py").stdout
+
+            deadline = time.monotonic() + 10
+            while len(log.read_text().splitlines()) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            leading, trailing = log.read_text().splitlines()
+            assert leading.split() == ["a.py"]
+            assert sorted(trailing.split()) == ["b.py", "c.py"]
+        finally:
+            Path(_get_state_file_path(session_id)).unlink(missing_ok=True)
+
+
+class TestAsyncFastChecks:
+    """Tests for fast_async background checks."""
+
+    def test_failure_is_reported_on_next_hook(self, tmp_path: Path) -> None:
+        check_script = tmp_path / "check.py"
+        check_script.write_text("import sys\nprint('needs formatting')\nsys.exit(1)\n")
+        _init_repo_with_config(
+            tmp_path,
+            {"fast_every": 1, "fast_async": True, "checks": [{"fast": _command_for_script(check_script)}]},
+        )
+        session_id = f"async-{uuid.uuid4()}"
+        payload = {"session_id": session_id, "tool_input": {"old_string": "a", "new_string": "b"}}
+        state_file = Path(_get_state_file_path(session_id))
+        try:
+            first = _run_claude_hook(tmp_path, "fast", payload)
+            assert first.returncode == 0
+            assert "started in background" in first.stdout
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                result = run_if_changed._load_state(str(state_file)).get("background_fast", {})
+                if result.get("status") == "failed":
+                    break
+                time.sleep(0.05)
+
+            second = _run_claude_hook(tmp_path, "fast", payload)
+            assert second.returncode == 2
+            assert "needs formatting" in second.stderr
+            assert "Background fast check failed" in second.stderr
+        finally:
+            state_file.unlink(missing_ok=True)
+
+    def test_collect_waits_for_running_result(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        state_file = tmp_path / "state.json"
+        monkeypatch.setattr(run_if_changed, "_get_state_file_path", lambda session_id: str(state_file))
+        run_if_changed._save_state(
+            str(state_file), {"background_fast": {"status": "running", "started_ms": time.time_ns() // 1_000_000}}
+        )
+        assert run_if_changed._collect_background_result("s", 0) == []
+
+        run_if_changed._record_background_result("s", ["boom"])
+        assert run_if_changed._collect_background_result("s", 0) == ["boom"]
+        assert "background_fast" not in run_if_changed._load_state(str(state_file))
+
+
+class TestCheckTimeouts:
+    """Tests for per-check timeouts and process-group cancellation."""
+
+    def test_timeout_kills_process_group_and_keeps_partial_output(self, tmp_path: Path) -> None:
+        marker = tmp_path / "orphan.marker"
+        check_script = tmp_path / "check.py"
+        check_script.write_text(
+            "import subprocess, sys, time\n"
+            f"subprocess.Popen(['sh', '-c', 'sleep 2 && touch {marker}'])\n"
+            "print('partial output', flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        _init_repo_with_config(tmp_path, {"checks": [{"slow": _command_for_script(check_script), "timeout": 0.5}]})
+
+        started = time.monotonic()
+        result = _run_claude_hook(tmp_path, "slow")
+
+        assert time.monotonic() - started < 20
+        assert result.returncode == 2
+        assert "partial output" in result.stderr
+        assert "Timed out after" in result.stderr
+        time.sleep(2.5)
+        assert not marker.exists()
+
+    def test_hook_deadline_caps_check_timeout(self) -> None:
+        job = {"timeout": 100.0, "deadline": time.monotonic() + 5}
+        timeout = run_if_changed._job_timeout(job)
+        assert timeout is not None
+        assert timeout <= 5
+
+    def test_deadline_defaults_and_overrides(self) -> None:
+        assert run_if_changed._hook_deadline_s({}, "fast") == 25
+        assert run_if_changed._hook_deadline_s({"slow_deadline": 60}, "slow") == 60
+        assert run_if_changed._hook_deadline_s({"slow_deadline": "soon"}, "slow") == 110
+
+
+class TestOutputCapture:
+    """Tests for bounded-memory check output capture."""
+
+    def test_small_output_is_kept_whole_without_log(self) -> None:
+        capture = run_if_changed._OutputCapture(4096)
+        capture.write(b"hello\n")
+        capture.close()
+        assert capture.getvalue() == "hello\n"
+        assert capture.log_path is None
+
+    def test_large_output_keeps_head_and_tail_and_spills_to_disk(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        lines = [f"line {i}\n".encode() for i in range(10_000)]
+        capture = run_if_changed._OutputCapture(4096)
+        for line in lines:
+            capture.write(line)
+        capture.close()
+
+        value = capture.getvalue()
+        assert len(capture.head) + len(capture.tail) <= 4096
+        assert value.startswith("line 0\n")
+        assert value.endswith("line 9999\n")
+        assert "bytes omitted" in value
+        assert capture.log_path is not None
+        assert Path(capture.log_path).read_bytes() == b"".join(lines)
+        assert capture.log_path in value
+
+
+class TestSummarizeFailure:
+    """Tests for per-tool failure summarization."""
+
+    def test_ruff_full_and_concise_output(self) -> None:
+        output = (
+            "F401 [*] `os` imported but unused\n"
+            " --> app/models.py:1:8\n"
+            "  |\n"
+            "1 | import os\n"
+            "  |        ^^\n"
+            "app/views.py:3:1: E402 Module level import not at top of file\n"
+            "Would reformat: app/urls.py\n"
+            "Found 2 errors.\n"
+        )
+        assert run_if_changed.summarize_failure(output, "ruff") == (
+            "app/models.py:1: F401 `os` imported but unused\n"
+            "app/views.py:3: E402 Module level import not at top of file\n"
+            "app/urls.py: would be reformatted\n"
+        )
+
+    def test_pytest_summary_is_deduplicated(self) -> None:
+        output = (
+            "tests/test_a.py:12: AssertionError\n"
+            "=========================== short test summary info ============================\n"
+            "FAILED tests/test_a.py::test_one - assert 1 == 2\n"
+            "FAILED tests/test_a.py::test_one - assert 1 == 2\n"
+            "ERROR tests/test_b.py\n"
+        )
+        assert run_if_changed.summarize_failure(output, "pytest") == (
+            "tests/test_a.py:12: AssertionError\ntests/test_a.py: test_one - assert 1 == 2\ntests/test_b.py: failed\n"
+        )
+
+    def test_tsc_plain_and_pretty(self) -> None:
+        output = (
+            "src/a.ts(12,5): error TS2322: Type 'string' is not assignable to type 'number'.\n"
+            "\x1b[96msrc/b.ts\x1b[0m:\x1b[93m3\x1b[0m:\x1b[93m1\x1b[0m - \x1b[91merror\x1b[0m TS2304: Cannot find name 'x'.\n"
+        )
+        assert run_if_changed.summarize_failure(output, "tsc") == (
+            "src/a.ts:12: error TS2322: Type 'string' is not assignable to type 'number'.\n"
+            "src/b.ts:3: error TS2304: Cannot find name 'x'.\n"
+        )
+
+    def test_eslint_stylish(self) -> None:
+        output = (
+            "\n/repo/src/app.js\n"
+            "  1:7   error    'unused' is assigned a value but never used  no-unused-vars\n"
+            "  4:1   warning  Unexpected console statement                 no-console\n"
+            "\n✖ 2 problems (1 error, 1 warning)\n"
+        )
+        assert run_if_changed.summarize_failure(output, "eslint") == (
+            "/repo/src/app.js:1: 'unused' is assigned a value but never used (no-unused-vars)\n"
+            "/repo/src/app.js:4: Unexpected console statement (no-console)\n"
+        )
+
+    def test_truncated_summary_keeps_the_log_location(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        command = "head -c 100000 /dev/zero | tr '\\0' x; printf '\\napp/a.py:1:1: F401 unused\\n'; exit 1"
+        job = {
+            "check": {"parser": "ruff"},
+            "command": command,
+            "commands": [command],
+            "cwd": str(tmp_path),
+            "files": [],
+            "output_budget": 4096,
+        }
+
+        result = run_if_changed.run_check(job)
+        passed, failure = run_if_changed.report_check(result, "slow", run_if_changed.RUNTIME_CODEX)
+
+        assert not passed
+        assert "app/a.py:1: F401 unused\n" in failure
+        assert "bytes omitted (full log: " in failure
+        assert "x" * 1000 not in failure
+
+    def test_unknown_parser_or_no_matches_falls_back(self) -> None:
+        assert run_if_changed.summarize_failure("boom", None) is None
+        assert run_if_changed.summarize_failure("boom", "nope") is None
+        assert run_if_changed.summarize_failure("boom", "ruff") is None
+
+
+class TestFairShareFeedback:
+    """Tests for splitting the Codex feedback budget between checks."""
+
+    def test_short_outputs_pass_unused_share_to_long_ones(self) -> None:
+        trimmed = run_if_changed._fair_share(["a" * 10, "b" * 1000, "c" * 1000], 310)
+        assert trimmed[0] == "a" * 10
+        assert len(trimmed[1]) == 150
+        assert len(trimmed[2]) == 150
+
+    def test_every_failing_check_is_represented(self) -> None:
+        feedback = run_if_changed._codex_failure_feedback("slow", ["x" * 50_000, "frontend failed"])
+        assert "frontend failed" in feedback
+        assert len(feedback) < run_if_changed.MAX_CODEX_FEEDBACK_CHARS + 200
+
+
+class TestCheckDependencies:
+    """Tests for the needs DAG between checks."""
+
+    def test_unknown_need_is_rejected(self) -> None:
+        checks = [{"name": "typecheck", "slow": "tsc", "needs": ["codegen"]}]
+        with pytest.raises(ValueError, match="unknown check 'codegen'"):
+            run_if_changed.link_needs([], checks)
+
+    def test_cycle_is_rejected(self) -> None:
+        checks = [{"name": "a", "needs": "b"}, {"name": "b", "needs": ["a"]}]
+        with pytest.raises(ValueError, match="dependency cycle"):
+            run_if_changed.link_needs([], checks)
+
+    def test_unselected_need_does_not_block(self) -> None:
+        checks = [{"name": "codegen"}, {"name": "typecheck", "needs": ["codegen"]}]
+        jobs = [{"check": checks[1]}]
+        run_if_changed.link_needs(jobs, checks)
+        assert jobs[0]["needs"] == []
+
+    def test_dependents_wait_and_are_skipped_after_failure(self, tmp_path: Path) -> None:
+        generated = tmp_path / "generated.txt"
+        _init_repo_with_config(
+            tmp_path,
+            {
+                "max_parallel": 4,
+                "checks": [
+                    {"name": "typecheck", "slow": f"cat {generated}", "needs": ["codegen"]},
+                    {"name": "codegen", "slow": f"sleep 0.3 && echo types > {generated}"},
+                    {"name": "lint", "slow": "exit 1"},
+                    {"name": "test", "slow": "echo never", "needs": ["lint"]},
+                ],
+            },
+        )
+
+        result = _run_claude_hook(tmp_path, "slow")
+
+        assert result.returncode == 2
+        assert "types" in result.stdout
+        assert "Skipping `echo never`: needs `lint`, which did not pass" in result.stdout
+        assert "never\n" not in result.stdout
+        assert "Critical path: codegen -> typecheck" in result.stdout
+
+    def test_critical_path_sums_the_longest_chain(self) -> None:
+        results = [
+            {"check": {"name": "a"}, "duration": 1.0, "needs": []},
+            {"check": {"name": "b"}, "duration": 5.0, "needs": []},
+            {"check": {"name": "c"}, "duration": 2.0, "needs": [0]},
+            {"check": {"name": "d"}, "duration": 1.0, "needs": [1, 2]},
+        ]
+        assert run_if_changed.critical_path(results) == (["b", "d"], 6.0)
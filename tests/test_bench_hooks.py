@@ -0,0 +1,52 @@
+"""Tests for bench_hooks.py."""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+
+_script_path = Path(__file__).parent.parent / "scripts" / "bench_hooks.py"
+_spec = importlib.util.spec_from_file_location("bench_hooks", _script_path)
+assert _spec is not None
+assert _spec.loader is not None
+bench_hooks: ModuleType = importlib.util.module_from_spec(_spec)
+sys.modules["bench_hooks"] = bench_hooks
+_spec.loader.exec_module(bench_hooks)
+
+find_regressions = bench_hooks.find_regressions
+make_repo = bench_hooks.make_repo
+
+
+def test_make_repo_spreads_files_over_checks_and_modifies_some(tmp_path: Path) -> None:
+    make_repo(tmp_path, files=12, checks=3, changed=4)
+
+    assert len(list(tmp_path.glob("pkg*/mod*.py"))) == 12
+    assert sorted(p.name for p in tmp_path.glob("pkg*")) == ["pkg0", "pkg1", "pkg2"]
+    status = subprocess.run(["git", "status", "--porcelain"], cwd=tmp_path, capture_output=True, text=True)
+    assert len(status.stdout.splitlines()) == 4
+
+
+def test_find_regressions_flags_only_meaningful_slowdowns() -> None:
+    baseline = {"python_startup_ms": 20.0, "scenarios": {"a": 100.0, "b": 10.0, "c": 100.0}}
+    current = {"python_startup_ms": 20.0, "scenarios": {"a": 200.0, "b": 30.0, "c": 140.0, "new": 500.0}}
+
+    regressions = find_regressions(baseline, current)
+
+    # b tripled but only by 20ms; c is within tolerance; new has no baseline.
+    assert len(regressions) == 1
+    assert regressions[0].startswith("a: 200.0ms vs 100.0ms baseline")
+
+
+def test_find_regressions_scales_baseline_by_interpreter_startup() -> None:
+    baseline = {"python_startup_ms": 20.0, "scenarios": {"a": 100.0}}
+    current = {"python_startup_ms": 40.0, "scenarios": {"a": 200.0}}
+
+    assert find_regressions(baseline, current) == []
+
+
+def test_baseline_covers_every_scenario() -> None:
+    baseline = json.loads(bench_hooks.BASELINE_PATH.read_text())
+
+    assert set(baseline["scenarios"]) == {scenario["name"] for scenario in bench_hooks.SCENARIOS}
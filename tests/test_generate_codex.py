@@ -34,6 +34,7 @@ render_hook_template = generate_codex.render_hook_template
 stamp_skill_script_paths = generate_codex.stamp_skill_script_paths
 generate_plugin_package = generate_codex.generate_plugin_package
 write_json = generate_codex.write_json
+compare_tree = generate_codex.compare_tree
 write_marketplace = generate_codex.write_marketplace
 install = generate_codex.install
 link = generate_codex.link
@@ -387,6 +388,34 @@ class TestPluginPackage:
         assert '"authentication": "ON_INSTALL"' in result
 
 
+class TestCompareTree:
+    def test_reports_stale_missing_and_unexpected_files(self, tmp_path: Path) -> None:
+        expected, actual = tmp_path / "expected", tmp_path / "actual"
+        for root in (expected, actual):
+            (root / "scripts").mkdir(parents=True)
+        (expected / "scripts" / "a.py").write_text("new\n")
+        (actual / "scripts" / "a.py").write_text("old\n")
+        (expected / "hooks.json").write_text("{}\n")
+        (actual / "stray.py").write_text("")
+
+        assert compare_tree(expected, actual, Path("out")) == [
+            "out/hooks.json: missing",
+            "out/scripts/a.py: out of date",
+            "out/stray.py: unexpected file",
+        ]
+
+    def test_ignores_bytecode_caches(self, tmp_path: Path) -> None:
+        expected, actual = tmp_path / "expected", tmp_path / "actual"
+        for root in (expected, actual):
+            (root / "scripts").mkdir(parents=True)
+            (root / "scripts" / "a.py").write_text("x = 1\n")
+        (actual / "scripts" / "__pycache__").mkdir()
+        (actual / "scripts" / "__pycache__" / "a.cpython-313.pyc").write_bytes(b"\x00")
+        (actual / "scripts" / "b.pyc").write_bytes(b"\x00")
+
+        assert compare_tree(expected, actual, Path("out")) == []
+
+
 class TestRenderHookTemplate:
     def test_substitutes_all_tokens(self) -> None:
         text = "cache/__PLUGIN_OWNER__/__PLUGIN_NAME__/__PLUGIN_VERSION__/foo"
@@ -559,10 +588,10 @@ class TestEndToEnd:
             'case "$bootstrap_dir" in /*) bootstrap_root="$bootstrap_dir" ;; '
             '*) bootstrap_root="$root/$bootstrap_dir" ;; esac'
         )
-        bootstrap_runner_path = "$bootstrap_root/codex/plugins/ox/scripts/run_if_changed.py"
-        repo_runner_path = "$root/codex/plugins/ox/scripts/run_if_changed.py"
+        bootstrap_runner_path = "$bootstrap_root/codex/plugins/ox/scripts/ox_hook.py"
+        repo_runner_path = "$root/codex/plugins/ox/scripts/ox_hook.py"
 
-        assert "./scripts/run_if_changed.py" not in hooks_text
+        assert "./scripts/ox_hook.py" not in hooks_text
         assert "~/.codex/plugins/cache" not in hooks_text
         assert fast_command.startswith("sh -c ")
         assert slow_command.startswith("sh -c ")
@@ -576,8 +605,8 @@ class TestEndToEnd:
         assert repo_runner_path in slow_command
         assert "exit 2" in fast_command
         assert "exit 2" in slow_command
-        assert "--runtime codex --action fast" in fast_command
-        assert "--runtime codex --action slow" in slow_command
+        assert '-S "$runner" --event PostToolUse --runtime codex' in fast_command
+        assert '-S "$runner" --event Stop --runtime codex' in slow_command
 
     @pytest.mark.parametrize("bootstrap_kind", ["relative", "absolute"])
     def test_ox_codex_hook_uses_custom_bootstrap_runner(self, tmp_path: Path, bootstrap_kind: str) -> None:
@@ -596,7 +625,7 @@ class TestEndToEnd:
             bootstrap_root = tmp_path / "custom-bootstrap"
             bootstrap_env = str(bootstrap_root)
 
-        runner = bootstrap_root / "codex" / "plugins" / "ox" / "scripts" / "run_if_changed.py"
+        runner = bootstrap_root / "codex" / "plugins" / "ox" / "scripts" / "ox_hook.py"
         self._write_runner(runner, bootstrap_kind)
 
         result = subprocess.run(
@@ -615,13 +644,13 @@ class TestEndToEnd:
 
         assert result.returncode == 0, result.stderr
         assert result.stdout == f"{bootstrap_kind} runner\n"
-        assert marker.read_text() == f"{bootstrap_kind} --runtime codex --action fast"
+        assert marker.read_text() == f"{bootstrap_kind} --event PostToolUse --runtime codex"
 
     def test_ox_codex_hook_falls_back_to_repo_local_runner(self, tmp_path: Path) -> None:
         fast_command = self._ox_fast_hook_command()
 
         repo = tmp_path / "repo"
-        runner = repo / "codex" / "plugins" / "ox" / "scripts" / "run_if_changed.py"
+        runner = repo / "codex" / "plugins" / "ox" / "scripts" / "ox_hook.py"
         workdir = repo / "nested" / "dir"
         marker = tmp_path / "marker.txt"
         workdir.mkdir(parents=True)
@@ -640,7 +669,7 @@ class TestEndToEnd:
 
         assert result.returncode == 0, result.stderr
         assert result.stdout == "repo-local runner\n"
-        assert marker.read_text() == "repo-local --runtime codex --action fast"
+        assert marker.read_text() == "repo-local --event PostToolUse --runtime codex"
 
     def test_commit_skill(self, tmp_path: Path) -> None:
         skill_dir = PLUGINS_DIR / "ox" / "skills" / "commit"